@@ -0,0 +1,179 @@
+from typing import Callable
+from corpus_index import CorpusIndex
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+### OPCODES ###
+# Une instruction est un triplet (opcode, a, b). Pour LEAF, a est l'identifiant du terme.
+# Pour les opérations, a et b sont les indices des instructions dont on prend le résultat.
+LEAF = 0
+NOT = 1
+AND = 2
+OR = 3
+
+OPCODES = {"NOT": NOT, "AND": AND, "OR": OR}
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class Program:
+    """
+    Programme plat d'opérations bit à bit partagé par plusieurs arbres.
+    Les sous-arbres identiques (à la commutativité de AND/OR près) ne sont
+    compilés qu'une seule fois, quel que soit le nombre d'arbres qui les contiennent.
+    """
+
+    def __init__(self):
+        self.terms: list[str] = []
+        self.term_ids: dict[str, int] = {}
+        self.instructions: list[tuple[int, int, int]] = []
+        self.slots: dict[tuple[int, int, int], int] = {}
+        self.roots: list[int] = []
+
+    def add_instruction(self, instruction: tuple[int, int, int]) -> int:
+        """
+        :pre: instruction est un triplet (opcode, a, b)
+        :return: L'indice de l'instruction (réutilisée si elle existe déjà)
+        """
+        slot = self.slots.get(instruction)
+        if slot is None:
+            slot = len(self.instructions)
+            self.instructions.append(instruction)
+            self.slots[instruction] = slot
+        return slot
+
+    def compile_node(self, node) -> int:
+        """
+        :pre: node est une Node valide
+        :return: L'indice de l'instruction qui calcule node
+        """
+        if node.is_leaf():
+            term_id = self.term_ids.get(node.value)
+            if term_id is None:
+                term_id = len(self.terms)
+                self.terms.append(node.value)
+                self.term_ids[node.value] = term_id
+            return self.add_instruction((LEAF, term_id, 0))
+        if node.value == "NOT":
+            return self.add_instruction((NOT, self.compile_node(node.children[0]), 0))
+        a = self.compile_node(node.children[0])
+        b = self.compile_node(node.children[1])
+        # AND et OR sont commutatifs : on ordonne les opérandes pour partager plus d'instructions
+        return self.add_instruction((OPCODES[node.value], min(a, b), max(a, b)))
+
+    def add_tree(self, tree):
+        """
+        Compile un arbre et l'ajoute aux racines du programme
+        :pre: tree est une Node valide
+        :return: None
+        """
+        self.roots.append(self.compile_node(tree))
+
+    def run(self, term_bitmaps: list[int], universe: int) -> list[int]:
+        """
+        :pre: term_bitmaps[i] est le bitmap du terme self.terms[i]. universe est le bitmap de tous les documents.
+        :return: Le bitmap de chaque racine, dans l'ordre d'ajout des arbres
+        """
+        results = []
+        append = results.append
+        releases = self.get_releases()
+        for i, (opcode, a, b) in enumerate(self.instructions):
+            if opcode == LEAF:
+                append(term_bitmaps[a])
+            elif opcode == AND:
+                append(results[a] & results[b])
+            elif opcode == OR:
+                append(results[a] | results[b])
+            else:
+                append(universe & ~results[a])
+            # On libère les résultats intermédiaires dès qu'ils ne servent plus,
+            # pour ne pas garder en mémoire un bitmap par instruction
+            for slot in releases[i]:
+                results[slot] = None
+        return [results[root] for root in self.roots]
+
+    def get_releases(self) -> list[list[int]]:
+        """
+        :pre: -
+        :return: Pour chaque instruction, la liste des résultats qui ne sont plus utilisés après elle
+        """
+        last_use = list(range(len(self.instructions)))
+        for i, (opcode, a, b) in enumerate(self.instructions):
+            if opcode != LEAF:
+                last_use[a] = i
+                if opcode != NOT:
+                    last_use[b] = i
+        roots = set(self.roots)
+        releases = [[] for _ in self.instructions]
+        for slot, i in enumerate(last_use):
+            if slot not in roots:
+                releases[i].append(slot)
+        return releases
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+class BatchEvaluator:
+    """ Évalue une population entière d'arbres sur un index en un seul appel """
+
+    def __init__(self, index: CorpusIndex, incremental=True):
+        """
+        :pre: si incremental, chaque arbre est évalué par CorpusIndex.evaluate, qui réutilise les bitmaps gardés
+        dans les nœuds non modifiés depuis la génération précédente (voir Node.cache).
+        Sinon, toute la population est compilée en un seul Program, sans cache entre deux appels.
+        """
+        self.index = index
+        self.incremental = incremental
+
+    def evaluate_population(self, trees: list) -> list[int]:
+        """
+        :pre: trees est une liste de Node valides
+        :return: Le bitmap des documents satisfaisant chaque arbre
+        """
+        if self.incremental:
+            return [self.index.evaluate(tree) for tree in trees]
+        program = compile_population(trees)
+        term_bitmaps = [self.index.get_term_bitmap(term) for term in program.terms]
+        return program.run(term_bitmaps, self.index.get_universe())
+
+    def count_population(self, trees: list) -> list[int]:
+        """
+        :pre: trees est une liste de Node valides
+        :return: Le nombre de documents satisfaisant chaque arbre
+        """
+        return [bitmap.bit_count() for bitmap in self.evaluate_population(trees)]
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def compile_population(trees: list) -> Program:
+    """
+    :pre: trees est une liste de Node valides
+    :return: Le programme qui calcule tous les arbres
+    """
+    program = Program()
+    for tree in trees:
+        program.add_tree(tree)
+    return program
+
+def make_batch_score_function(evaluator: BatchEvaluator, score_from_count: Callable[[object, int], float]) -> Callable[[list], list[float]]:
+    """
+    Crée une fonction de score par lot utilisable par generate_best_request_genetic_algorithm.
+    :pre: score_from_count prend un arbre et son nombre de résultats et renvoie un score
+    :return: Une fonction qui prend une population et renvoie la liste des scores
+    """
+    def batch_score_function(population: list) -> list[float]:
+        counts = evaluator.count_population(population)
+        return [score_from_count(tree, count) for tree, count in zip(population, counts)]
+    return batch_score_function
@@ -0,0 +1,95 @@
+"""
+Compare l'extraction des pages de résultats ACM :
+- full   : get_general_infos(BeautifulSoup(page, 'html.parser')), l'arbre de toute la page est construit
+- target : extract_general_infos(page), seuls le nombre de résultats et les articles sont construits
+
+Les pages utilisées sont celles de benchmarks/fixtures (pages synthétiques qui reprennent la structure HTML
+d'une page de résultats ACM) et, si elles existent, les pages réelles du cache de récolte (.page_cache).
+
+Usage (depuis la racine du dépôt) : python benchmarks/bench_parsing.py [-n REPEAT] [--cache DOSSIER]
+"""
+import argparse
+import glob
+import gzip
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup
+import requetes_articles as ra
+from page_cache import CACHE_DIRECTORY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+FIXTURES_DIRECTORY = os.path.join(ROOT, "benchmarks", "fixtures")
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def load_pages(cache_directory: str) -> dict[str, str]:
+    """
+    :pre: cache_directory est le dossier d'un PageCache (éventuellement inexistant)
+    :return: {nom de la page: contenu HTML}
+    """
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIRECTORY, "*.html"))):
+        with open(path, "r", encoding="utf-8") as file:
+            pages[os.path.basename(path)] = file.read()
+    for path in sorted(glob.glob(os.path.join(cache_directory, "*", "*.html.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            pages["cache/" + os.path.basename(path)[:12]] = file.read()
+    return pages
+
+def parse_full(page_content: str) -> dict:
+    return ra.get_general_infos(BeautifulSoup(page_content, "html.parser"))
+
+def measure(function, page_content: str, repeat: int) -> float:
+    """
+    :return: Le meilleur temps (en secondes) sur repeat exécutions
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(page_content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction des pages de résultats ACM.")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="nombre d'exécutions par page (le meilleur temps est gardé)")
+    parser.add_argument("--cache", default=os.path.join(ROOT, CACHE_DIRECTORY), help="dossier du cache de pages à inclure")
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.cache)
+    print(f"{'page':<28}{'Ko':>8}{'articles':>10}{'full (ms)':>12}{'target (ms)':>13}{'gain':>8}")
+    total_full = total_target = 0.0
+    for name, page_content in pages.items():
+        expected = parse_full(page_content)
+        # Les deux chemins doivent donner exactement les mêmes articles
+        assert ra.extract_general_infos(page_content) == expected, f"Résultats différents pour {name}"
+        full = measure(parse_full, page_content, args.repeat)
+        target = measure(ra.extract_general_infos, page_content, args.repeat)
+        total_full += full
+        total_target += target
+        print(f"{name:<28}{len(page_content)/1000:>8.0f}{len(expected['articles']):>10}{full*1000:>12.1f}{target*1000:>13.1f}{full/target:>7.1f}x")
+    if pages:
+        print(f"{'total':<46}{total_full*1000:>12.1f}{total_target*1000:>13.1f}{total_full/total_target:>7.1f}x")
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Suite de benchmarks reproductible (graine fixée) des chemins critiques :
+- alter_random_node, copy et serialize/unserialize en fonction de la taille des arbres
+- to_sympy et get_simplified_request (simplifier natif et sympy) en fonction de la taille des arbres
+- une génération de l'algorithme génétique en fonction de la taille de la population
+- l'extraction des pages de résultats ACM (benchmarks/fixtures)
+
+Les résultats sont écrits en JSON pour comparer deux commits :
+    python benchmarks/run_benchmarks.py -o avant.json
+    (changements)
+    python benchmarks/run_benchmarks.py -o apres.json --compare avant.json
+
+À lancer depuis la racine du dépôt (les vocabulaires sont chargés depuis data/).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import semantic_tree as st
+import requetes_articles as ra
+from bench_parsing import load_pages, parse_full
+from page_cache import CACHE_DIRECTORY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+SEED = 12345
+REPEAT = 5
+TREE_SIZES = [11, 51, 201, 801]
+# sympy.to_cnf est exponentiel en le nombre de termes : on se limite aux petits arbres
+SYMPY_TREE_SIZES = [7, 11, 15]
+POPULATION_SIZES = [50, 100, 200]
+NB_GA_GENERATIONS = 3
+NB_ALTERATIONS = 1000
+# Les altérations font grandir l'arbre : elles sont appliquées à une nouvelle copie toutes les ALTERATIONS_PER_COPY altérations
+ALTERATIONS_PER_COPY = 50
+RESULTS_DIRECTORY = os.path.join(ROOT, "benchmarks", "results")
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+### OUTILS ###
+
+def build_request(size: int) -> st.RequestTree:
+    """
+    :pre: size >= 5
+    :return: Une requête d'au moins size nœuds, dont les deux moitiés ont à peu près la même taille
+    """
+    request = st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY))
+    while len(request) < size:
+        half = random.choice([request.get_include_tree(), request.get_exclude_tree()])
+        random.choice(half.get_all_nodes()).alter_structure(grow_proba=1.0)
+    return request
+
+def measure(function: Callable, setup: Callable=None, repeat=REPEAT, number=1) -> dict:
+    """
+    :pre: setup (optionnel) renvoie l'argument de function ; il est rappelé avant chaque mesure et n'est pas chronométré.
+    :return: Le meilleur temps et le temps moyen d'un appel à function (en secondes), sur repeat mesures de number appels
+    """
+    timings = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        for _ in range(number):
+            function(argument)
+        timings.append((time.perf_counter() - start) / number)
+    return {"best_s": min(timings), "mean_s": sum(timings) / len(timings), "repeat": repeat, "number": number}
+
+def run_case(results: list, name: str, params: dict, function: Callable, setup: Callable=None, nb_operations=1, baseline: dict=None, **kwargs):
+    """
+    Mesure un cas avec la graine SEED et ajoute son résultat à results
+    :pre: params décrit le cas (taille d'arbre, de population...). function effectue nb_operations opérations.
+    baseline (optionnel) est une mesure dont les temps sont retranchés avant la division par nb_operations.
+    :return: None
+    """
+    random.seed(SEED)
+    result = {"name": name, "params": params}
+    result.update(measure(function, setup, **kwargs))
+    for key in ("best_s", "mean_s"):
+        if baseline is not None:
+            result[key] = max(0.0, result[key] - baseline[key])
+        result[key] /= nb_operations
+    results.append(result)
+    print(f"{name:<32}{json.dumps(params):<50}{result['best_s']*1000:>12.3f} ms")
+
+### CAS ###
+
+def bench_trees(results: list, sizes: list[int], repeat: int):
+    for size in sizes:
+        random.seed(SEED)
+        request = build_request(size)
+        params = {"size": len(request)}
+
+        def copy_all(_):
+            for _ in range(NB_ALTERATIONS // ALTERATIONS_PER_COPY):
+                request.copy()
+        def alter_all(_):
+            for _ in range(NB_ALTERATIONS // ALTERATIONS_PER_COPY):
+                tree = request.copy()
+                for _ in range(ALTERATIONS_PER_COPY):
+                    tree.alter_random_node()
+        # Temps par altération, sur des copies régulièrement renouvelées pour que la taille reste proche de size
+        # (le temps des copies est retranché)
+        copies = measure(copy_all, repeat=repeat)
+        run_case(results, "alter_random_node", params, alter_all, nb_operations=NB_ALTERATIONS, baseline=copies, repeat=repeat)
+        run_case(results, "copy", params, lambda _: request.copy(), repeat=repeat, number=20)
+        run_case(results, "serialize_unserialize", params, lambda _: st.unserialize(st.serialize(request), st.VOCABULARY), repeat=repeat, number=20)
+        # Conversion non chronométrée : le premier appel importe sympy
+        st.to_sympy(request)
+        run_case(results, "to_sympy", params, lambda _: st.to_sympy(request), repeat=repeat)
+        run_case(results, "get_simplified_request", params, lambda _: request.get_simplified_request(), repeat=repeat)
+
+def bench_sympy(results: list, sizes: list[int], repeat: int):
+    for size in sizes:
+        random.seed(SEED)
+        request = build_request(size)
+        # Conversion non chronométrée : le premier appel importe sympy
+        st.to_sympy(request)
+        run_case(results, "get_simplified_request_sympy", {"size": len(request)}, lambda _: request.get_simplified_request(use_sympy=True), repeat=repeat)
+
+def bench_genetic_algorithm(results: list, population_sizes: list[int], repeat: int):
+    initial_request = st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY))
+
+    def run(population_size, nb_generations):
+        # On ne mesure pas l'affichage console de la population
+        st.generate_best_request_genetic_algorithm(lambda request: -len(request), initial_request, nb_generations=nb_generations, population_size=population_size, verbose=False)
+
+    for population_size in population_sizes:
+        # Temps d'une génération = (temps avec NB_GA_GENERATIONS générations - temps de la population initiale seule) / NB_GA_GENERATIONS
+        random.seed(SEED)
+        initial = measure(lambda _: run(population_size, 0), repeat=repeat)
+        run_case(results, "ga_generation", {"population_size": population_size}, lambda _: run(population_size, NB_GA_GENERATIONS), nb_operations=NB_GA_GENERATIONS, baseline=initial, repeat=repeat)
+
+def bench_parsing(results: list, repeat: int):
+    for name, page_content in load_pages(os.path.join(ROOT, CACHE_DIRECTORY)).items():
+        params = {"page": name, "kb": len(page_content) // 1000}
+        run_case(results, "get_general_infos", params, lambda _: parse_full(page_content), repeat=repeat)
+        run_case(results, "extract_general_infos", params, lambda _: ra.extract_general_infos(page_content), repeat=repeat)
+
+### RÉSULTATS ###
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def get_key(result: dict) -> str:
+    return result["name"] + " " + json.dumps(result["params"], sort_keys=True)
+
+def compare(results: list, reference_path: str):
+    """
+    Affiche le rapport entre les temps de référence et les temps courants (> 1 : plus rapide qu'avant)
+    :pre: reference_path est un fichier JSON écrit par ce script
+    :return: None
+    """
+    with open(reference_path, "r", encoding="utf-8") as file:
+        reference = json.load(file)
+    reference_times = {get_key(result): result["best_s"] for result in reference["results"]}
+    print(f"\nComparaison avec {reference_path} (commit {reference['meta']['commit']}) :")
+    for result in results:
+        key = get_key(result)
+        if key in reference_times and result["best_s"] > 0:
+            print(f"{key:<82}{reference_times[key] / result['best_s']:>8.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de semantic_tree, de l'algorithme génétique et de l'extraction des pages ACM.")
+    parser.add_argument("-o", "--output", help="fichier JSON produit (par défaut benchmarks/results/<commit>.json)")
+    parser.add_argument("-n", "--repeat", type=int, default=REPEAT, help="nombre de mesures par cas (le meilleur temps est gardé)")
+    parser.add_argument("--quick", action="store_true", help="seulement les plus petites tailles")
+    parser.add_argument("--compare", help="fichier JSON d'une exécution précédente")
+    args = parser.parse_args(argv)
+
+    commit = get_commit()
+    tree_sizes, sympy_sizes, population_sizes = (TREE_SIZES[:2], SYMPY_TREE_SIZES[:1], POPULATION_SIZES[:1]) if args.quick else (TREE_SIZES, SYMPY_TREE_SIZES, POPULATION_SIZES)
+    results = []
+    bench_trees(results, tree_sizes, args.repeat)
+    bench_sympy(results, sympy_sizes, args.repeat)
+    bench_genetic_algorithm(results, population_sizes, args.repeat)
+    bench_parsing(results, args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {"commit": commit, "date": datetime.datetime.now().isoformat(timespec="seconds"), "seed": SEED, "repeat": args.repeat, "python": platform.python_version(), "platform": platform.platform()}
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"meta": meta, "results": results}, file, indent=2)
+    print(f"\nRésultats écrits dans {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import re
+from typing import Iterator
+from bib_reader import iter_raw_entries, extract_field
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# Préfixes des conférences à garder. L'espace est important pour ne pas garder "CHIIR" avec "CHI " par exemple
+VENUE_PREFIXES = ["CHI EA", "CHI PLAY", "UIST ", "ISMAR "]
+
+# Acronyme entre parenthèses à la fin d'un booktitle IEEE : "... Augmented Reality (ISMAR)"
+IEEE_ACRONYM_PATTERN = re.compile(r"\(([^()]+)\)\s*$")
+
+DESCRIPTION = "Garde les entrées BibTeX des conférences choisies."
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def compile_prefixes(prefixes: list[str]) -> re.Pattern:
+    """
+    Regroupe tous les préfixes dans une seule expression régulière, testée en une passe
+    (les plus longs d'abord pour que l'alternative la plus précise l'emporte).
+    :pre: prefixes est une liste non vide de str
+    :return: L'expression régulière compilée, à utiliser avec match()
+    """
+    alternatives = sorted(set(prefixes), key=len, reverse=True)
+    return re.compile("|".join(re.escape(prefix) for prefix in alternatives))
+
+def get_venue(raw: str) -> str:
+    """
+    Renvoie la conférence d'une entrée sous la forme utilisée par ACM dans le champ series ("CHI EA '24").
+    Les exports IEEE n'ont pas de series : on la reconstruit à partir de l'acronyme du booktitle et de l'année.
+    :pre: raw est le texte brut d'une entrée
+    :return: La conférence, None si elle est inconnue
+    """
+    series = extract_field(raw, "series")
+    if series is not None:
+        return series
+    booktitle = extract_field(raw, "booktitle")
+    if booktitle is None:
+        return None
+    acronym = IEEE_ACRONYM_PATTERN.search(booktitle)
+    year = extract_field(raw, "year")
+    if acronym is None or year is None:
+        return booktitle
+    return f"{acronym.group(1)} '{year[-2:]}"
+
+def filter_entries(paths: list[str], prefixes=VENUE_PREFIXES) -> Iterator[str]:
+    """
+    Parcourt les fichiers entrée par entrée (la mémoire utilisée ne dépend pas de leur taille).
+    :pre: paths est une liste de fichiers .bib (ACM ou IEEE)
+    :return: Un itérateur sur le texte brut des entrées dont la conférence commence par l'un des préfixes
+    """
+    pattern = compile_prefixes(prefixes)
+    for path in paths:
+        for raw in iter_raw_entries(path):
+            venue = get_venue(raw)
+            if venue is not None and pattern.match(venue):
+                yield raw
+
+def filter_files(paths: list[str], output_path: str, prefixes=VENUE_PREFIXES, mode="w", log=False) -> int:
+    """
+    Écrit au fur et à mesure les entrées gardées dans output_path.
+    :pre: mode vaut "w" (écraser le fichier) ou "a" (ajouter à la fin)
+    :return: Le nombre d'entrées gardées
+    """
+    nb_kept = 0
+    with open(output_path, mode, encoding="utf-8") as file:
+        for raw in filter_entries(paths, prefixes):
+            if log:
+                print("venue = {" + get_venue(raw) + "}")
+            file.write(raw.rstrip() + "\n\n")
+            nb_kept += 1
+    return nb_kept
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """ Ajoute les options du filtre à parser (utilisé aussi par la sous-commande filter de main.py) """
+    parser.add_argument("paths", nargs="+", help="fichiers .bib à filtrer (ACM et/ou IEEE)")
+    parser.add_argument("-o", "--output", required=True, help="fichier .bib produit")
+    parser.add_argument("-p", "--prefix", action="append", dest="prefixes", help=f"préfixe de conférence à garder (répétable, par défaut {VENUE_PREFIXES})")
+    parser.add_argument("-a", "--append", action="store_true", help="ajouter au fichier de sortie au lieu de l'écraser")
+    parser.add_argument("-v", "--verbose", action="store_true", help="afficher la conférence de chaque entrée gardée")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    return parser
+
+def run(args: argparse.Namespace):
+    nb_kept = filter_files(args.paths, args.output, args.prefixes or VENUE_PREFIXES, "a" if args.append else "w", args.verbose)
+    print(f"Kept {nb_kept} entries")
+
+def main(argv=None):
+    run(build_parser().parse_args(argv))
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
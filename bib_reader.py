@@ -0,0 +1,177 @@
+import re
+from typing import Iterator
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# Types de blocs BibTeX qui ne sont pas des articles
+NON_ENTRY_TYPES = {"comment", "preamble", "string"}
+
+ENTRY_HEADER = re.compile(r"@\s*([A-Za-z]+)\s*[{(]\s*([^,\s]*)\s*,?")
+# Accolade ou parenthèse qui ouvre une entrée
+ENTRY_DELIMITER = re.compile(r"[{(]")
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class BibEntry:
+    """ Une entrée d'un fichier BibTeX """
+
+    def __init__(self, entry_type: str, key: str, fields: dict[str, str], raw: str):
+        """
+        :pre: entry_type et key sont des str. fields associe le nom (en minuscules) de chaque champ à sa valeur. raw est le texte brut de l'entrée.
+        """
+        self.entry_type = entry_type
+        self.key = key
+        self.fields = fields
+        self.raw = raw
+
+    def get(self, field: str, default=None):
+        """
+        :pre: field est un str.
+        :return: La valeur du champ field (sans accolades), default s'il n'existe pas.
+        """
+        return self.fields.get(field.lower(), default)
+
+    def get_doi(self):
+        """
+        :pre: -
+        :return: Le DOI de l'entrée en minuscules, None s'il n'est pas renseigné.
+        """
+        doi = self.get("doi")
+        return doi.strip().lower() if doi else None
+
+    def __repr__(self):
+        return f"BibEntry({self.entry_type}, {self.key})"
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def parse_fields(body: str, first_only=False) -> dict[str, str]:
+    """
+    Extrait les champs d'une entrée BibTeX (seulement le premier si first_only).
+    :pre: body est le texte de l'entrée situé après "@type{clé,"
+    :return: Un dictionnaire {nom du champ en minuscules: valeur}
+    """
+    fields = {}
+    i, n = 0, len(body)
+    while i < n:
+        # On saute les séparateurs
+        while i < n and body[i] in " \t\r\n,":
+            i += 1
+        equal = body.find("=", i)
+        if equal == -1:
+            break
+        name = body[i:equal].strip().lower()
+        i = equal + 1
+        while i < n and body[i] in " \t\r\n":
+            i += 1
+        if i >= n:
+            break
+        # Valeur entre accolades (éventuellement imbriquées)
+        if body[i] == "{":
+            depth, start = 0, i + 1
+            while i < n:
+                if body[i] == "{":
+                    depth += 1
+                elif body[i] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            value = body[start:i]
+            i += 1
+        # Valeur entre guillemets
+        elif body[i] == '"':
+            end = body.find('"', i + 1)
+            end = n if end == -1 else end
+            value = body[i+1:end]
+            i = end + 1
+        # Valeur brute (nombre, macro...)
+        else:
+            start = i
+            while i < n and body[i] not in ",})\n":
+                i += 1
+            value = body[start:i]
+        if name:
+            fields[name] = " ".join(value.split())
+            if first_only:
+                break
+    return fields
+
+def extract_field(raw: str, name: str) -> str:
+    """
+    Extrait un seul champ du texte brut d'une entrée, sans analyser les autres.
+    :pre: raw est le texte d'une entrée, name le nom d'un champ
+    :return: La valeur du champ (sans accolades), None s'il n'existe pas
+    """
+    # Les noms de champs sont en début de ligne ou après une virgule, au niveau de l'entrée :
+    # un "year = " écrit dans un résumé est à l'intérieur des accolades de sa valeur
+    delimiter = ENTRY_DELIMITER.search(raw)
+    field_depth = 1 if delimiter is not None and delimiter.group() == "{" else 0
+    for match in re.finditer(r"(?:^|,)\s*" + re.escape(name) + r"\s*=", raw, re.IGNORECASE | re.MULTILINE):
+        if raw.count("{", 0, match.start()) - raw.count("}", 0, match.start()) == field_depth:
+            return parse_fields(raw[match.start():], first_only=True).get(name.lower())
+    return None
+
+def parse_entry(raw: str) -> BibEntry:
+    """
+    :pre: raw est le texte complet d'un bloc BibTeX commençant par '@'
+    :return: L'entrée correspondante, None si le bloc n'est pas un article
+    """
+    header = ENTRY_HEADER.match(raw)
+    if header is None or header.group(1).lower() in NON_ENTRY_TYPES:
+        return None
+    body = raw[header.end():].rstrip()
+    # On retire l'accolade fermante de l'entrée
+    if body.endswith("}") or body.endswith(")"):
+        body = body[:-1]
+    return BibEntry(header.group(1).lower(), header.group(2), parse_fields(body), raw)
+
+def iter_raw_entries(path: str) -> Iterator[str]:
+    """
+    Lit un fichier BibTeX bloc par bloc, sans jamais le charger entièrement en mémoire.
+    :pre: path est le chemin d'un fichier .bib
+    :return: Un itérateur sur le texte brut de chaque bloc
+    """
+    lines = []
+    depth = 0
+    opened = False
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            if not lines:
+                # On attend le début du prochain bloc
+                start = line.find("@")
+                if start == -1:
+                    continue
+                line = line[start:]
+            lines.append(line)
+            opening = line.count("{") - line.count("\\{")
+            opened = opened or opening > 0
+            depth += opening - line.count("}") + line.count("\\}")
+            if opened and depth <= 0:
+                yield "".join(lines)
+                lines = []
+                depth = 0
+                opened = False
+    if lines:
+        yield "".join(lines)
+
+def iter_entries(path: str) -> Iterator[BibEntry]:
+    """
+    :pre: path est le chemin d'un fichier .bib
+    :return: Un itérateur sur les entrées (articles) du fichier
+    """
+    for raw in iter_raw_entries(path):
+        entry = parse_entry(raw)
+        if entry is not None:
+            yield entry
@@ -0,0 +1,286 @@
+"""
+Index du corpus compilé dans un fichier binaire, ouvert en lecture seule avec mmap :
+pas d'analyse des .bib au démarrage, et tous les processus qui ouvrent le même fichier en partagent une seule copie en mémoire.
+
+    python compiled_index.py [FICHIERS.bib] -o corpus.idx
+
+Format (entiers non signés little-endian, sections alignées sur 4 octets) :
+    en-tête      HEADER : magic, version, nombre de documents, réservé, positions des sections mots, bigrammes et DOI
+    section mots / bigrammes (termes triés par octets UTF-8) :
+                 n (u32), positions des termes (u32 * n+1), positions des listes (u32 * n+1, en nombre d'entiers),
+                 termes concaténés, listes de documents concaténées (u32)
+    section DOI  n (u32), positions (u32 * n+1), DOI concaténés
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from corpus_index import CorpusIndex, CORPUS_FILES
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+DESCRIPTION = "Compile les exports .bib du corpus en un index binaire ouvert avec mmap."
+INDEX_PATH = "corpus.idx"
+MAGIC = b"CIDX"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQQ")
+COUNT = struct.Struct("<I")
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class MappedStrings:
+    """ Table de chaînes d'un fichier compilé : lue directement dans le mmap, sans copie de la table """
+
+    def __init__(self, view: memoryview, offset: int):
+        """
+        :pre: view est la vue du fichier, offset la position d'une table écrite par write_strings
+        """
+        self.view = view
+        self.size = COUNT.unpack_from(view, offset)[0]
+        self.offsets = view[offset + COUNT.size:offset + COUNT.size + 4 * (self.size + 1)].cast("I")
+        self.start = offset + COUNT.size + 4 * (self.size + 1)
+        self.end = self.start + self.offsets[self.size]
+
+    def get_bytes(self, i: int) -> bytes:
+        return bytes(self.view[self.start + self.offsets[i]:self.start + self.offsets[i + 1]])
+
+    def lower_bound(self, key: bytes) -> int:
+        """
+        :pre: les chaînes sont triées par octets
+        :return: L'indice de la première chaîne >= key
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, string: str) -> int:
+        """
+        :pre: les chaînes sont triées par octets
+        :return: L'indice de string, -1 si elle n'est pas dans la table
+        """
+        key = string.encode("utf-8")
+        i = self.lower_bound(key)
+        return i if i < self.size and self.get_bytes(i) == key else -1
+
+    def release(self):
+        self.offsets.release()
+
+    def __getitem__(self, i: int) -> str:
+        return self.get_bytes(i).decode("utf-8")
+
+    def __len__(self):
+        return self.size
+
+
+class MappedTermTable:
+    """ Dictionnaire de termes trié et listes de documents d'un fichier compilé (voir write_term_table) """
+
+    def __init__(self, view: memoryview, offset: int):
+        """
+        :pre: view est la vue du fichier, offset la position d'une section écrite par write_term_table
+        """
+        self.terms = MappedStrings(view, offset)
+        postings_offsets_start = self.terms.end + (-self.terms.end % 4)
+        self.postings_offsets = view[postings_offsets_start:postings_offsets_start + 4 * (len(self.terms) + 1)].cast("I")
+        postings_start = postings_offsets_start + 4 * (len(self.terms) + 1)
+        self.postings = view[postings_start:postings_start + 4 * self.postings_offsets[len(self.terms)]].cast("I")
+        self.ranges: dict[str, tuple[int, int]] = {}
+
+    def get_postings(self, i: int) -> memoryview:
+        """
+        :return: La liste des documents du terme d'indice i (vue sur le fichier, sans copie)
+        """
+        return self.postings[self.postings_offsets[i]:self.postings_offsets[i + 1]]
+
+    def get(self, term: str):
+        """
+        :return: La liste des documents de term, vide s'il n'est pas dans la table
+        """
+        i = self.terms.find(term)
+        return self.get_postings(i) if i != -1 else []
+
+    def get_range(self, prefix: str) -> tuple[int, int]:
+        """
+        Même rôle que TermDictionary.get_range (voir corpus_index.py), sur les termes du fichier
+        :return: (début, fin) tels que les termes d'indices début à fin-1 sont ceux qui commencent par prefix
+        """
+        term_range = self.ranges.get(prefix)
+        if term_range is None:
+            key = prefix.encode("utf-8")
+            # L'octet 0xff n'apparaît jamais en UTF-8 : tous les termes qui commencent par key sont < key + 0xff
+            term_range = self.ranges[prefix] = (self.terms.lower_bound(key), self.terms.lower_bound(key + b"\xff"))
+        return term_range
+
+    def get_prefix(self, prefix: str) -> memoryview:
+        """
+        :return: Les documents de tous les termes qui commencent par prefix, en une seule vue (les listes des termes consécutifs sont contiguës)
+        """
+        start, end = self.get_range(prefix)
+        return self.postings[self.postings_offsets[start]:self.postings_offsets[end]]
+
+    def release(self):
+        self.postings.release()
+        self.postings_offsets.release()
+        self.terms.release()
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class MappedCorpusIndex(CorpusIndex):
+    """
+    CorpusIndex en lecture seule ouvert depuis un fichier écrit par compile_index.
+    Seuls les bitmaps des termes utilisés sont construits (et gardés en cache), à partir des listes lues dans le mmap.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        """
+        :pre: path est un fichier écrit par compile_index
+        """
+        super().__init__()
+        self.path = path
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, version, nb_docs, _, words_offset, bigrams_offset, dois_offset = HEADER.unpack_from(self.view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} n'est pas un index compilé (version {VERSION})")
+        self.words = MappedTermTable(self.view, words_offset)
+        self.bigram_table = MappedTermTable(self.view, bigrams_offset)
+        self.dois = MappedStrings(self.view, dois_offset)
+        self.doc_ids = None
+        assert len(self.dois) == nb_docs
+
+    def add_document(self, doi: str, text: str):
+        raise NotImplementedError("Un index compilé est en lecture seule : recompiler le corpus avec compile_index")
+
+    def get_word_postings(self, word: str):
+        return self.words.get(word)
+
+    def get_bigram_postings(self, bigram: str):
+        return self.bigram_table.get(bigram)
+
+    def get_prefix_postings(self, prefix: str):
+        return [self.words.get_prefix(prefix)]
+
+    def close(self):
+        """ Libère les vues sur le fichier puis le ferme """
+        for table in ("words", "bigram_table", "dois"):
+            if hasattr(self, table):
+                getattr(self, table).release()
+        self.view.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def pad(out: bytearray):
+    """ Complète out par des zéros jusqu'à une longueur multiple de 4 """
+    out += bytes(-len(out) % 4)
+
+def write_strings(out: bytearray, strings: list[bytes]):
+    """
+    :pre: strings est une liste de chaînes encodées
+    :return: None
+    """
+    offsets = array("I", [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    out += COUNT.pack(len(strings))
+    out += to_little_endian(offsets)
+    out += b"".join(strings)
+    pad(out)
+
+def write_term_table(out: bytearray, postings: dict[str, list[int]]):
+    """
+    :pre: postings associe chaque terme à la liste croissante de ses documents
+    :return: None
+    """
+    terms = sorted((term.encode("utf-8"), term) for term in postings)
+    write_strings(out, [encoded for encoded, _ in terms])
+    offsets = array("I", [0])
+    values = array("I")
+    for _, term in terms:
+        values.extend(postings[term])
+        offsets.append(len(values))
+    out += to_little_endian(offsets)
+    out += to_little_endian(values)
+
+def compile_index(index: CorpusIndex, path=INDEX_PATH) -> int:
+    """
+    Écrit l'index dans un fichier binaire (voir MappedCorpusIndex). L'écriture passe par un fichier
+    temporaire : les processus qui ont déjà ouvert l'ancien fichier ne sont pas affectés.
+    :pre: index est un CorpusIndex construit en mémoire
+    :return: La taille du fichier en octets
+    """
+    out = bytearray(HEADER.size)
+    words_offset = len(out)
+    write_term_table(out, index.postings)
+    bigrams_offset = len(out)
+    write_term_table(out, index.bigrams)
+    dois_offset = len(out)
+    write_strings(out, [doi.encode("utf-8") for doi in index.dois])
+    HEADER.pack_into(out, 0, MAGIC, VERSION, len(index.dois), 0, words_offset, bigrams_offset, dois_offset)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(out)
+    os.replace(tmp_path, path)
+    return len(out)
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("paths", nargs="*", default=CORPUS_FILES, help="fichiers .bib (par défaut ceux de corpus_index.py)")
+    parser.add_argument("-o", "--output", default=INDEX_PATH, help="fichier produit")
+
+def build_parser(prog: str=None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog, description=DESCRIPTION)
+    add_arguments(parser)
+    return parser
+
+def run(args: argparse.Namespace):
+    start = time.perf_counter()
+    index = CorpusIndex.load(args.paths)
+    size = compile_index(index, args.output)
+    print(f"{len(index)} documents, {len(index.postings)} mots, {len(index.bigrams)} bigrammes : {size / 1e6:.1f} Mo écrits dans {args.output} en {time.perf_counter() - start:.2f}s")
+
+def main(argv=None, prog: str=None):
+    run(build_parser(prog).parse_args(argv))
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import bisect
+import re
+from itertools import chain
+from bib_reader import iter_entries
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+CORPUS_FILES = ["Results_versions/ACM/acm_requete1.bib", "Results_versions/IEEE/IEEE_results.bib"]
+INDEXED_FIELDS = ["title", "abstract", "keywords"]
+
+# Plus grand caractère Unicode : tous les mots qui commencent par un préfixe sont < préfixe + MAX_CHAR
+MAX_CHAR = "\U0010ffff"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+LATEX_COMMAND_PATTERN = re.compile(r"\\[a-zA-Z]+|\\.")
+
+# Valeur de getattr(node, "cache") pour les nœuds sans attribut cache (voir CorpusIndex.evaluate)
+NO_CACHE = object()
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class TermDictionary:
+    """
+    Mots de l'index triés : les mots qui commencent par un préfixe ("intera*") sont contigus et trouvés
+    par deux recherches dichotomiques, en O(log n + k) au lieu d'un parcours de tous les mots.
+    Les intervalles déjà calculés sont gardés en cache.
+    """
+
+    def __init__(self, words):
+        """
+        :pre: words est un itérable de mots distincts
+        """
+        self.words = sorted(words)
+        self.ranges: dict[str, tuple[int, int]] = {}
+
+    def get_range(self, prefix: str) -> tuple[int, int]:
+        """
+        :return: (début, fin) tels que self.words[début:fin] sont les mots qui commencent par prefix
+        """
+        word_range = self.ranges.get(prefix)
+        if word_range is None:
+            word_range = self.ranges[prefix] = (bisect.bisect_left(self.words, prefix), bisect.bisect_left(self.words, prefix + MAX_CHAR))
+        return word_range
+
+    def expand(self, prefix: str) -> list[str]:
+        """
+        :return: Les mots qui commencent par prefix, triés
+        """
+        start, end = self.get_range(prefix)
+        return self.words[start:end]
+
+    def __len__(self):
+        return len(self.words)
+
+
+class CorpusIndex:
+    """
+    Index inversé sur les articles déjà récupérés (titre, résumé, mots-clés).
+    Chaque terme est associé à un bitmap (un int Python) dont le bit i vaut 1
+    si le document i contient le terme.
+    """
+
+    def __init__(self):
+        self.dois: list[str] = []
+        self.doc_ids: dict[str, int] = {}
+        self.postings: dict[str, list[int]] = {}    # mot -> documents
+        self.bigrams: dict[str, list[int]] = {}     # "mot1 mot2" -> documents
+        self.bitmaps: dict[str, int] = {}           # cache des bitmaps déjà construits
+        self.term_dictionary: TermDictionary = None # construit au premier préfixe cherché (voir get_term_dictionary)
+        # Marque les résultats gardés dans Node.cache : remplacée quand l'index change, ce qui les invalide tous
+        self.cache_token = object()
+
+    def add_document(self, doi: str, text: str):
+        """
+        Ajoute un document à l'index. Un DOI déjà présent est ignoré.
+        :pre: doi et text sont des str
+        :return: None
+        """
+        if doi in self.doc_ids:
+            return
+        doc_id = len(self.dois)
+        self.dois.append(doi)
+        self.doc_ids[doi] = doc_id
+        tokens = tokenize(text)
+        for token in set(tokens):
+            self.postings.setdefault(token, []).append(doc_id)
+            # Les mots composés sont aussi indexés par leurs parties ("cross-platform" -> "cross", "platform")
+            if "-" in token:
+                for part in token.split("-"):
+                    postings = self.postings.setdefault(part, [])
+                    if not postings or postings[-1] != doc_id:
+                        postings.append(doc_id)
+        for bigram in set(zip(tokens, tokens[1:])):
+            self.bigrams.setdefault(" ".join(bigram), []).append(doc_id)
+        self.bitmaps.clear()
+        self.term_dictionary = None
+        self.cache_token = object()
+
+    def add_bib_file(self, path: str, fields=INDEXED_FIELDS):
+        """
+        Indexe toutes les entrées d'un fichier .bib
+        :pre: path est le chemin d'un fichier .bib
+        :return: None
+        """
+        for entry in iter_entries(path):
+            doi = entry.get_doi() or entry.key
+            self.add_document(doi, " ".join(entry.get(field, "") for field in fields))
+
+    def add_store(self, results_store, **filters):
+        """
+        Indexe les articles d'une base SQLite de results_store.py. La base ne garde ni résumé ni mots-clés :
+        seul le titre est indexé.
+        :pre: results_store est un ResultsStore ouvert, filters sont les filtres de ResultsStore.build_query
+        :return: None
+        """
+        for article in results_store.iter_articles(**filters):
+            # Un article sans DOI est identifié par sa clé de repli (titre, année, 1er auteur)
+            self.add_document(article["doi"] or article["fallback_key"], article["title"] or "")
+
+    def get_universe(self) -> int:
+        """
+        :pre: -
+        :return: Le bitmap contenant tous les documents
+        """
+        return (1 << len(self.dois)) - 1
+
+    def to_bitmap(self, doc_ids) -> int:
+        """
+        :pre: doc_ids est un itérable d'identifiants de documents (avec ou sans doublons)
+        :return: Le bitmap correspondant
+        """
+        bits = bytearray((len(self.dois) + 7) // 8)
+        for doc_id in doc_ids:
+            bits[doc_id >> 3] |= 1 << (doc_id & 7)
+        return int.from_bytes(bits, "little")
+
+    def get_term_bitmap(self, term: str) -> int:
+        """
+        Renvoie les documents qui contiennent un terme de requête : un mot,
+        une expression ("remote collaboration") ou un préfixe ("intera*").
+        :pre: term est un str
+        :return: Le bitmap des documents correspondants
+        """
+        bitmap = self.bitmaps.get(term)
+        if bitmap is not None:
+            return bitmap
+        tokens = tokenize(term)
+        if term.endswith("*"):
+            # Un seul bitmap construit pour l'union de toutes les listes, au lieu d'un par mot
+            bitmap = self.to_bitmap(chain.from_iterable(self.get_prefix_postings(" ".join(tokens))))
+        elif len(tokens) == 1:
+            bitmap = self.to_bitmap(self.get_word_postings(tokens[0]))
+        elif len(tokens) == 0:
+            bitmap = 0
+        else:
+            # Une expression est approchée par l'intersection de ses bigrammes (exacte pour 2 mots)
+            bitmap = self.get_universe()
+            for bigram in zip(tokens, tokens[1:]):
+                bitmap &= self.to_bitmap(self.get_bigram_postings(" ".join(bigram)))
+        self.bitmaps[term] = bitmap
+        return bitmap
+
+    ### LISTES DE DOCUMENTS (redéfinies par MappedCorpusIndex, voir compiled_index.py) ###
+
+    def get_word_postings(self, word: str) -> list[int]:
+        """
+        :return: Les identifiants des documents qui contiennent word
+        """
+        return self.postings.get(word, [])
+
+    def get_bigram_postings(self, bigram: str) -> list[int]:
+        """
+        :pre: bigram est de la forme "mot1 mot2"
+        :return: Les identifiants des documents qui contiennent bigram
+        """
+        return self.bigrams.get(bigram, [])
+
+    def get_term_dictionary(self) -> TermDictionary:
+        """
+        :return: Le dictionnaire trié des mots de l'index (reconstruit après l'ajout de documents)
+        """
+        if self.term_dictionary is None:
+            self.term_dictionary = TermDictionary(self.postings)
+        return self.term_dictionary
+
+    def get_prefix_postings(self, prefix: str) -> list[list[int]]:
+        """
+        :return: Les listes de documents de tous les mots qui commencent par prefix
+        """
+        return [self.postings[word] for word in self.get_term_dictionary().expand(prefix)]
+
+    def evaluate(self, node) -> int:
+        """
+        Le bitmap de chaque sous-arbre est gardé dans son attribut cache : après une altération
+        (qui invalide le chemin de la racine au nœud modifié), seul ce chemin est recalculé.
+        Les arbres plats (FlatTree, FlatNode, voir flat_tree.py) n'ont pas d'attribut cache : ils sont recalculés entièrement.
+        :pre: node est une Node valide (ou un RequestTree, un FlatTree)
+        :return: Le bitmap des documents qui satisfont la requête représentée par node
+        """
+        cache = getattr(node, "cache", NO_CACHE)
+        if cache is not None and cache is not NO_CACHE and cache[0] is self.cache_token:
+            return cache[1]
+        if node.is_leaf():
+            bitmap = self.get_term_bitmap(node.value)
+        elif node.value == "NOT":
+            bitmap = self.get_universe() & ~self.evaluate(node.children[0])
+        elif node.value == "AND":
+            bitmap = self.evaluate(node.children[0]) & self.evaluate(node.children[1])
+        else:
+            bitmap = self.evaluate(node.children[0]) | self.evaluate(node.children[1])
+        if cache is not NO_CACHE:
+            node.cache = (self.cache_token, bitmap)
+        return bitmap
+
+    def count(self, node) -> int:
+        """
+        :pre: node est une Node valide
+        :return: Le nombre de documents qui satisfont la requête
+        """
+        return self.evaluate(node).bit_count()
+
+    def get_dois(self, node) -> list[str]:
+        """
+        :pre: node est une Node valide
+        :return: La liste des DOI des documents qui satisfont la requête
+        """
+        return bitmap_to_dois(self.evaluate(node), self.dois)
+
+    def __len__(self):
+        return len(self.dois)
+
+    ### STATIC METHODS ###
+
+    @staticmethod
+    def load(paths: list[str]=CORPUS_FILES, fields=INDEXED_FIELDS):
+        """
+        :pre: paths est une liste de chemins de fichiers .bib
+        :return: L'index construit à partir de ces fichiers
+        """
+        index = CorpusIndex()
+        for path in paths:
+            index.add_bib_file(path, fields)
+        return index
+
+    @staticmethod
+    def from_store(results_store, **filters):
+        """
+        :pre: results_store est un ResultsStore ouvert, filters sont les filtres de ResultsStore.build_query
+        :return: L'index construit à partir des articles de la base (titres seulement)
+        """
+        index = CorpusIndex()
+        index.add_store(results_store, **filters)
+        return index
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    :pre: text est un str (éventuellement avec des commandes LaTeX)
+    :return: La liste des mots de text, en minuscules
+    """
+    text = LATEX_COMMAND_PATTERN.sub("", text).replace("{", "").replace("}", "")
+    return TOKEN_PATTERN.findall(text.lower())
+
+def bitmap_to_dois(bitmap: int, dois: list[str]) -> list[str]:
+    """
+    :pre: bitmap est un bitmap de documents, dois la table des DOI de l'index
+    :return: La liste des DOI dont le bit est à 1
+    """
+    result = []
+    while bitmap:
+        low_bit = bitmap & -bitmap
+        result.append(dois[low_bit.bit_length() - 1])
+        bitmap ^= low_bit
+    return result
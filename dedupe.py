@@ -0,0 +1,330 @@
+import argparse
+import csv
+import random
+import re
+import unicodedata
+import zlib
+from bib_reader import iter_entries
+from bib_filter import get_venue
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+### MINHASH / LSH ###
+# NB_BANDS bandes de ROWS_PER_BAND valeurs : deux titres de similarité de Jaccard s
+# deviennent candidats avec une probabilité 1 - (1 - s^ROWS_PER_BAND)^NB_BANDS (~50% pour s = 0.6, ~99% pour s = 0.85)
+NB_BANDS = 8
+ROWS_PER_BAND = 4
+NB_HASHES = NB_BANDS * ROWS_PER_BAND
+MERSENNE_PRIME = (1 << 61) - 1
+# Similarité de Jaccard minimale entre deux titres pour les considérer comme identiques
+SIMILARITY_THRESHOLD = 0.8
+# Au-delà de cette taille, un groupe LSH (titre très générique) n'est pas comparé paire à paire
+MAX_BUCKET_SIZE = 50
+
+DOI_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "https://dl.acm.org/doi/", "doi:")
+CSV_COLUMNS = ["Title", "Author1", "Year", "Venue", "DOI", "Sources"]
+# Les années BibTeX sont du texte libre ("2023a", "{to appear}") : seule une année à 4 chiffres est comparée
+YEAR_PATTERN = re.compile(r"\d{4}")
+
+_rng = random.Random(12345)
+HASH_PARAMETERS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(MERSENNE_PRIME)) for _ in range(NB_HASHES)]
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class DisjointSet:
+    """
+    Union-find pour regrouper les doublons. Chaque groupe porte le DOI de ses membres (s'ils en ont un) :
+    deux groupes de DOI différents ne sont jamais réunis, même par un article sans DOI proche des deux.
+    """
+
+    def __init__(self, size: int, dois: list[str]=None):
+        """
+        :pre: dois (optionnel) est la liste des DOI des éléments (None pour un élément sans DOI)
+        """
+        self.parents = list(range(size))
+        self.dois = list(dois) if dois is not None else [None] * size
+
+    def find(self, i: int) -> int:
+        while self.parents[i] != i:
+            self.parents[i] = self.parents[self.parents[i]]
+            i = self.parents[i]
+        return i
+
+    def union(self, i: int, j: int) -> bool:
+        """
+        :return: True si i et j sont dans le même groupe après l'appel, False si leurs groupes ont des DOI différents
+        """
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return True
+        if self.dois[i] and self.dois[j] and self.dois[i] != self.dois[j]:
+            return False
+        root, child = min(i, j), max(i, j)
+        self.parents[child] = root
+        self.dois[root] = self.dois[root] or self.dois[child]
+        return True
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+### NORMALISATION ###
+
+def normalize_text(text: str) -> str:
+    """
+    :pre: text est un str
+    :return: text en minuscules, sans accents, commandes LaTeX ni ponctuation
+    """
+    text = re.sub(r"\\[a-zA-Z]+|\\.|[{}]", "", text or "")
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+def normalize_doi(doi: str) -> str:
+    """
+    :pre: -
+    :return: Le DOI sans préfixe d'url, en minuscules. None si doi n'est pas un DOI.
+    """
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in DOI_PREFIXES:
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi if doi.startswith("10.") else None
+
+def get_last_name(author: str) -> str:
+    """
+    :pre: author est un nom au format BibTeX ("Nom, Prénom") ou "Prénom Nom"
+    :return: Le nom de famille normalisé, "" s'il est inconnu
+    """
+    if not author or author.startswith("No author"):
+        return ""
+    if "," in author:
+        return normalize_text(author.split(",")[0])
+    words = normalize_text(author).split()
+    return words[-1] if words else ""
+
+def get_year(year: str) -> int:
+    """
+    :pre: year est le champ year d'un article (texte libre)
+    :return: La première année à 4 chiffres de year, None s'il n'y en a pas
+    """
+    match = YEAR_PATTERN.search(year or "")
+    return int(match.group(0)) if match is not None else None
+
+### LECTURE ###
+
+def make_record(title, author1, year, venue, doi, source, raw=None) -> dict:
+    return {"title": title or "", "author1": author1 or "", "year": year or "", "venue": venue or "", "doi": normalize_doi(doi), "sources": [source], "raw": raw}
+
+def read_bib(path: str) -> list[dict]:
+    """
+    :pre: path est un fichier .bib
+    :return: Les articles du fichier
+    """
+    records = []
+    for entry in iter_entries(path):
+        author1 = entry.get("author", "").split(" and ")[0]
+        records.append(make_record(entry.get("title"), author1, entry.get("year"), get_venue(entry.raw), entry.get("doi"), path, entry.raw))
+    return records
+
+def read_csv(path: str) -> list[dict]:
+    """
+    :pre: path est un fichier produit par save_general_infos (Title, Author1, Date, Publisher, DOI[, Type])
+    :return: Les articles du fichier
+    """
+    records = []
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 5:
+                continue
+            year = YEAR_PATTERN.search(row[2])
+            records.append(make_record(row[0], row[1], year.group(0) if year else "", row[3], row[4], path))
+    return records
+
+def read_store(path: str) -> list[dict]:
+    """
+    :pre: path est une base écrite par ResultsStore (voir results_store.py)
+    :return: Les articles de la base
+    """
+    from results_store import ResultsStore
+    with ResultsStore(path) as store:
+        return [make_record(article["title"], article["author1"], str(article["year"] or ""), article["venue"], article["doi"], path) for article in store.iter_articles()]
+
+def read_records(path: str) -> list[dict]:
+    extension = path.lower().rsplit(".", 1)[-1]
+    if extension == "csv":
+        return read_csv(path)
+    if extension == "db":
+        return read_store(path)
+    return read_bib(path)
+
+### MINHASH ###
+
+def get_shingles(record: dict) -> set[int]:
+    """
+    :pre: record est un article
+    :return: L'ensemble des mots du titre normalisé et du nom du 1er auteur, hachés
+    """
+    words = normalize_text(record["title"]).split()
+    last_name = get_last_name(record["author1"])
+    if last_name:
+        words.append("@" + last_name)
+    return {zlib.crc32(word.encode("ascii")) for word in words}
+
+def get_shingle_hashes(shingle: int, cache: dict) -> tuple[int]:
+    """
+    Les titres partagent beaucoup de mots : les NB_HASHES valeurs de chaque mot ne sont calculées qu'une fois.
+    :pre: shingle est un mot haché, cache un dictionnaire partagé entre les appels
+    :return: Les valeurs du mot pour chaque fonction de hachage
+    """
+    hashes = cache.get(shingle)
+    if hashes is None:
+        hashes = cache[shingle] = tuple((a * shingle + b) % MERSENNE_PRIME for a, b in HASH_PARAMETERS)
+    return hashes
+
+def get_signature(shingles: set[int], cache: dict=None) -> list[int]:
+    """
+    :pre: shingles est un ensemble non vide
+    :return: La signature MinHash (NB_HASHES valeurs)
+    """
+    cache = {} if cache is None else cache
+    return [min(column) for column in zip(*(get_shingle_hashes(shingle, cache) for shingle in shingles))]
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def are_duplicates(r1: dict, r2: dict, s1: set, s2: set) -> bool:
+    """
+    :pre: r1 et r2 sont des articles, s1 et s2 leurs shingles
+    :return: True si r1 et r2 désignent le même article
+    """
+    # Deux DOI différents désignent deux publications différentes (ex: article long et extended abstract)
+    if r1["doi"] and r2["doi"] and r1["doi"] != r2["doi"]:
+        return False
+    year1, year2 = get_year(r1["year"]), get_year(r2["year"])
+    if year1 is not None and year2 is not None and abs(year1 - year2) > 1:
+        return False
+    return jaccard(s1, s2) >= SIMILARITY_THRESHOLD
+
+### FUSION ###
+
+def find_duplicates(records: list[dict]) -> DisjointSet:
+    """
+    Regroupe les doublons sans comparer toutes les paires :
+    1) index de hachage sur les DOI (doublons exacts),
+    2) MinHash + LSH sur les titres et 1ers auteurs : seuls les articles qui partagent une bande sont comparés.
+    :pre: records est une liste d'articles
+    :return: Les groupes de doublons
+    """
+    groups = DisjointSet(len(records), [record["doi"] for record in records])
+    by_doi = {}
+    for i, record in enumerate(records):
+        if record["doi"]:
+            if record["doi"] in by_doi:
+                groups.union(by_doi[record["doi"]], i)
+            else:
+                by_doi[record["doi"]] = i
+
+    shingles = [get_shingles(record) for record in records]
+    buckets = {}
+    hash_cache = {}
+    for i, record_shingles in enumerate(shingles):
+        if not record_shingles:
+            continue
+        signature = get_signature(record_shingles, hash_cache)
+        for band in range(NB_BANDS):
+            key = (band, tuple(signature[band*ROWS_PER_BAND:(band+1)*ROWS_PER_BAND]))
+            buckets.setdefault(key, []).append(i)
+
+    compared = set()
+    for bucket in buckets.values():
+        if len(bucket) < 2 or len(bucket) > MAX_BUCKET_SIZE:
+            continue
+        for x in range(len(bucket)):
+            for y in range(x + 1, len(bucket)):
+                i, j = bucket[x], bucket[y]
+                if (i, j) in compared or groups.find(i) == groups.find(j):
+                    continue
+                compared.add((i, j))
+                if are_duplicates(records[i], records[j], shingles[i], shingles[j]):
+                    groups.union(i, j)
+    return groups
+
+def merge_records(records: list[dict]) -> list[dict]:
+    """
+    :pre: records est une liste d'articles
+    :return: Un article par groupe de doublons ; les champs vides sont complétés par les autres membres du groupe
+    """
+    groups = find_duplicates(records)
+    merged = {}
+    for i, record in enumerate(records):
+        root = groups.find(i)
+        if root not in merged:
+            merged[root] = dict(record, sources=list(record["sources"]))
+            continue
+        target = merged[root]
+        for field in ("title", "author1", "year", "venue", "doi", "raw"):
+            if not target[field] and record[field]:
+                target[field] = record[field]
+        for source in record["sources"]:
+            if source not in target["sources"]:
+                target["sources"].append(source)
+    return list(merged.values())
+
+def write_csv(records: list[dict], path: str):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS)
+        for record in records:
+            writer.writerow([record["title"], record["author1"], record["year"], record["venue"], record["doi"] or "", ";".join(record["sources"])])
+
+def write_bib(records: list[dict], path: str) -> int:
+    """
+    Écrit les entrées BibTeX d'origine des articles fusionnés (ceux qui viennent d'un .bib)
+    :return: Le nombre d'entrées écrites
+    """
+    nb_written = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            if record["raw"]:
+                file.write(record["raw"].rstrip() + "\n\n")
+                nb_written += 1
+    return nb_written
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Fusionne des exports (.bib ACM/IEEE, .csv, base SQLite) en un corpus sans doublons.")
+    parser.add_argument("paths", nargs="+", help="fichiers .bib, .csv ou .db (voir results_store.py) à fusionner")
+    parser.add_argument("-o", "--output", required=True, help="fichier .csv produit")
+    parser.add_argument("--bib", help="fichier .bib produit avec les entrées d'origine (optionnel)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    records = [record for path in args.paths for record in read_records(path)]
+    merged = merge_records(records)
+    write_csv(merged, args.output)
+    if args.bib:
+        write_bib(merged, args.bib)
+    print(f"{len(records)} articles lus, {len(merged)} après fusion")
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
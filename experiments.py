@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+DESCRIPTION = "Lance des expériences aléatoires reproductibles en parallèle (tests de robustesse de semantic_tree)."
+LOG_PATH = "experiments.jsonl"
+NB_RUNS = 100
+NB_ALTERATIONS = 200
+NB_GENERATIONS = 20
+POPULATION_SIZE = 50
+
+# Index du corpus des expériences evaluation, chargé au premier appel de get_index dans chaque processus
+INDEX = None
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class ExperimentFailure(Exception):
+    """ Échec d'une expérience sur un arbre précis, gardé (sérialisé) pour pouvoir le rejouer """
+
+    def __init__(self, message: str, step: int, tree: str, tree_before: str=None):
+        """
+        :pre: step est le numéro de l'étape qui a échoué, tree l'arbre après l'échec et tree_before l'arbre avant (voir serialize)
+        """
+        super().__init__(message)
+        self.step = step
+        self.tree = tree
+        self.tree_before = tree_before
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+### EXPÉRIENCES ###
+
+def run_alteration_experiment(nb_alterations=NB_ALTERATIONS, check_every=1) -> dict:
+    """
+    Applique nb_alterations altérations aléatoires à une requête en vérifiant sa validité.
+    :pre: check_every >= 1 : l'arbre entier est vérifié (is_valid) toutes les check_every altérations
+    :return: La taille finale de la requête. ExperimentFailure (avec l'arbre fautif) si une altération échoue.
+    """
+    import semantic_tree as st
+    request = st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY))
+    for step in range(nb_alterations):
+        tree_before = st.serialize(request)
+        try:
+            request.alter_random_node()
+        except Exception as error:
+            raise ExperimentFailure(f"{type(error).__name__} : {error}", step, st.serialize(request), tree_before) from error
+        if (step + 1) % check_every == 0 and not request.is_valid():
+            raise ExperimentFailure("Arbre invalide après l'altération", step, st.serialize(request), tree_before)
+    return {"size": len(request), "request": request.get_simplified_request()}
+
+def score_by_size(request) -> int:
+    """ Score de référence des expériences : les requêtes courtes sont préférées """
+    return -len(request)
+
+def run_ga_experiment(nb_generations=NB_GENERATIONS, population_size=POPULATION_SIZE) -> dict:
+    """
+    Lance l'algorithme génétique (sans affichage) à partir de "collaboration AND NOT batman"
+    :return: La meilleure requête, sa taille et son score
+    """
+    import semantic_tree as st
+    initial_request = st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY))
+    best = st.generate_best_request_genetic_algorithm(score_by_size, initial_request, nb_generations=nb_generations, population_size=population_size, verbose=False)
+    if not best.is_valid():
+        raise ExperimentFailure("La meilleure requête est invalide", nb_generations, st.serialize(best))
+    return {"size": len(best), "score": score_by_size(best), "request": best.get_simplified_request()}
+
+def get_index(index_path: str=None):
+    """
+    :pre: index_path (optionnel) est un index compilé (voir compiled_index.py)
+    :return: L'index du corpus, chargé une seule fois par processus
+    """
+    global INDEX
+    if INDEX is None:
+        if index_path:
+            from compiled_index import MappedCorpusIndex
+            INDEX = MappedCorpusIndex(index_path)
+        else:
+            from corpus_index import CorpusIndex
+            INDEX = CorpusIndex.load()
+    return INDEX
+
+def run_evaluation_experiment(nb_alterations=NB_ALTERATIONS, index_path: str=None) -> dict:
+    """
+    Altère une requête et compare, après chaque altération, son nombre de résultats sur le corpus local
+    calculé sur le RequestTree (bitmaps gardés dans les nœuds) et sur le FlatRequestTree équivalent,
+    par CorpusIndex.count et par BatchEvaluator (incrémental ou non).
+    :return: Le nombre de résultats final. ExperimentFailure (avec l'arbre fautif) si deux évaluations diffèrent.
+    """
+    import semantic_tree as st
+    from batch_eval import BatchEvaluator
+    from flat_tree import FlatRequestTree
+    index = get_index(index_path)
+    evaluators = {"incremental": BatchEvaluator(index), "program": BatchEvaluator(index, incremental=False)}
+    request = st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY))
+    for step in range(nb_alterations):
+        tree_before = st.serialize(request)
+        request.alter_random_node()
+        flat = FlatRequestTree.from_request_tree(request)
+        counts = {"count": index.count(request), "flat_count": index.count(flat)}
+        for name, evaluator in evaluators.items():
+            counts[name], counts["flat_" + name] = evaluator.count_population([request, flat])
+        if len(set(counts.values())) != 1:
+            raise ExperimentFailure(f"Nombres de résultats différents : {counts}", step, st.serialize(request), tree_before)
+    return {"size": len(request), "count": counts["count"], "request": request.get_simplified_request()}
+
+def run_crossover_experiment(nb_alterations=NB_ALTERATIONS) -> dict:
+    """
+    Altère deux requêtes et les croise après chaque altération, sous forme de RequestTree et de FlatRequestTree,
+    avec les mêmes tirages aléatoires (le générateur est remis dans le même état avant chaque croisement).
+    :return: Les tailles finales. ExperimentFailure (avec l'arbre fautif) si les formes canoniques diffèrent.
+    """
+    import semantic_tree as st
+    from flat_tree import FlatRequestTree
+    requests = [st.RequestTree(st.Node("collaboration", [], st.INCLUDED_VOCABULARY), st.Node("batman", [], st.EXCLUDED_VOCABULARY)) for _ in range(2)]
+    for step in range(nb_alterations):
+        tree_before = st.serialize(requests[0])
+        for request in requests:
+            request.alter_random_node()
+        flats = [FlatRequestTree.from_request_tree(request) for request in requests]
+        state = random.getstate()
+        requests[0].crossover(requests[1])
+        random.setstate(state)
+        flats[0].crossover(flats[1])
+        for request, flat in zip(requests, flats):
+            if not flat.is_valid() or st.canonical_form(flat.to_request_tree()) != st.canonical_form(request):
+                raise ExperimentFailure(f"Croisements différents : {request.to_request()} / {flat.to_request()}", step, st.serialize(request), tree_before)
+    return {"size": len(requests[0]), "other_size": len(requests[1]), "request": requests[0].get_simplified_request()}
+
+# Expériences disponibles : nom -> fonction (les paramètres sont ceux de la fonction)
+EXPERIMENTS = {
+    "alterations": run_alteration_experiment,
+    "ga": run_ga_experiment,
+    "evaluation": run_evaluation_experiment,
+    "crossover": run_crossover_experiment,
+}
+
+def run_experiment(task: dict) -> dict:
+    """
+    Exécute une expérience dans le processus courant (fonction appelée par les workers du pool)
+    :pre: task contient id, kind (clé de EXPERIMENTS), seed et params
+    :return: L'enregistrement de l'expérience : statut, durée, résultat ou erreur (traceback complet et arbre fautif)
+    """
+    record = dict(task)
+    random.seed(task["seed"])
+    start = time.perf_counter()
+    try:
+        record["result"] = EXPERIMENTS[task["kind"]](**task["params"])
+        record["status"] = "ok"
+    except Exception as error:
+        record["status"] = "error"
+        record["error"] = {"type": type(error.__cause__ or error).__name__, "message": str(error), "traceback": traceback.format_exc()}
+        if isinstance(error, ExperimentFailure):
+            record["error"].update(step=error.step, tree=error.tree, tree_before=error.tree_before)
+    record["duration_s"] = time.perf_counter() - start
+    record["pid"] = os.getpid()
+    return record
+
+def make_tasks(kind: str, nb_runs: int, base_seed: int, params: dict) -> list[dict]:
+    """
+    :pre: kind est une clé de EXPERIMENTS
+    :return: nb_runs expériences dont les graines sont tirées à partir de base_seed (reproductibles)
+    """
+    rng = random.Random(base_seed)
+    return [{"id": i, "kind": kind, "seed": rng.getrandbits(32), "params": params} for i in range(nb_runs)]
+
+def summarize(records: list[dict]) -> dict:
+    """
+    :pre: records sont des sorties de run_experiment
+    :return: Nombre de succès et d'échecs, échecs par type d'erreur, statistiques des durées
+    """
+    durations = sorted(record["duration_s"] for record in records)
+    errors = {}
+    for record in records:
+        if record["status"] == "error":
+            errors[record["error"]["type"]] = errors.get(record["error"]["type"], 0) + 1
+    summary = {
+        "nb_runs": len(records),
+        "nb_ok": sum(record["status"] == "ok" for record in records),
+        "nb_errors": sum(errors.values()),
+        "errors": errors,
+    }
+    if durations:
+        summary["duration_s"] = {"total": sum(durations), "mean": sum(durations) / len(durations), "min": durations[0], "median": durations[len(durations) // 2], "max": durations[-1]}
+    sizes = [record["result"]["size"] for record in records if record["status"] == "ok" and "size" in record["result"]]
+    if sizes:
+        summary["size"] = {"mean": sum(sizes) / len(sizes), "min": min(sizes), "max": max(sizes)}
+    return summary
+
+def run_experiments(kind: str, nb_runs=NB_RUNS, base_seed=0, nb_workers: int=None, log_path=LOG_PATH, **params) -> dict:
+    """
+    Lance nb_runs expériences indépendantes dans un pool de processus et écrit chaque enregistrement
+    (une ligne JSON) dans log_path dès qu'il est terminé.
+    :pre: params sont les paramètres de l'expérience kind
+    :return: Le résumé des expériences (voir summarize)
+    """
+    tasks = make_tasks(kind, nb_runs, base_seed, params)
+    records = []
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        if nb_workers == 1:
+            results = map(run_experiment, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(nb_workers)
+            results = (future.result() for future in as_completed([executor.submit(run_experiment, task) for task in tasks]))
+        try:
+            for record in results:
+                records.append(record)
+                log_file.write(json.dumps(record) + "\n")
+                log_file.flush()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    return summarize(records)
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("kind", choices=sorted(EXPERIMENTS), help="type d'expérience")
+    parser.add_argument("-n", "--runs", type=int, default=NB_RUNS, help="nombre d'expériences")
+    parser.add_argument("-w", "--workers", type=int, help="nombre de processus (par défaut, un par cœur)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="graine dont sont tirées les graines des expériences")
+    parser.add_argument("--log", default=LOG_PATH, help="fichier JSONL des résultats (complété, pas écrasé)")
+    parser.add_argument("--replay", type=int, metavar="SEED", help="rejouer une seule expérience avec cette graine, dans ce processus")
+    parser.add_argument("--alterations", type=int, default=NB_ALTERATIONS, help="alterations, evaluation, crossover : nombre d'altérations")
+    parser.add_argument("--check-every", type=int, default=1, help="alterations : vérifier tout l'arbre toutes les N altérations")
+    parser.add_argument("--generations", type=int, default=NB_GENERATIONS, help="ga : nombre de générations")
+    parser.add_argument("--population", type=int, default=POPULATION_SIZE, help="ga : taille de la population")
+    parser.add_argument("--index", help="evaluation : index compilé (voir compiled_index.py), à la place des fichiers .bib du corpus")
+
+def build_parser(prog: str=None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog, description=DESCRIPTION)
+    add_arguments(parser)
+    return parser
+
+def run(args: argparse.Namespace):
+    if args.kind == "alterations":
+        params = {"nb_alterations": args.alterations, "check_every": args.check_every}
+    elif args.kind == "evaluation":
+        params = {"nb_alterations": args.alterations, "index_path": args.index}
+    elif args.kind == "crossover":
+        params = {"nb_alterations": args.alterations}
+    else:
+        params = {"nb_generations": args.generations, "population_size": args.population}
+    if args.replay is not None:
+        record = run_experiment({"id": 0, "kind": args.kind, "seed": args.replay, "params": params})
+        print(record["error"]["traceback"] if record["status"] == "error" else json.dumps(record["result"], indent=2))
+        return
+    summary = run_experiments(args.kind, args.runs, args.seed, args.workers, args.log, **params)
+    print(json.dumps(summary, indent=2))
+
+def main(argv=None, prog: str=None):
+    run(build_parser(prog).parse_args(argv))
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
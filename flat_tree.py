@@ -0,0 +1,454 @@
+import random
+from colorama import Fore
+from vocabulary import Vocabulary
+import simplifier
+from semantic_tree import Node, RequestTree, KEEP_SIMILAR_WORD_PROBA, ALTER_STRUCTURE_PROBA, GROW_PROBA
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+### OPCODES ###
+# Un arbre est stocké comme la liste de ses nœuds en parcours préfixe.
+# Les opérations sont codées par des entiers négatifs, les termes par leur identifiant (>= 0) dans TERMS.
+AND = -1
+OR = -2
+NOT = -3
+
+OPCODES = {"AND": AND, "OR": OR, "NOT": NOT}
+OPERATORS = {AND: "AND", OR: "OR", NOT: "NOT"}
+ARITY = {AND: 2, OR: 2, NOT: 1}
+
+### TERMES ###
+# Table des termes partagée par tous les arbres plats
+TERMS: list[str] = []
+TERM_IDS: dict[str, int] = {}
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class FlatNode:
+    """
+    Vue en lecture seule sur un nœud d'un FlatTree, avec la même interface de lecture qu'une Node
+    (value, children, is_leaf, is_operation...). Permet d'utiliser les évaluateurs et le simplificateur.
+    """
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def value(self):
+        return decode(self.tree.codes[self.index])
+
+    @property
+    def children(self) -> list:
+        code = self.tree.codes[self.index]
+        if code >= 0:
+            return []
+        first = self.index + 1
+        if ARITY[code] == 1:
+            return [FlatNode(self.tree, first)]
+        return [FlatNode(self.tree, first), FlatNode(self.tree, self.tree.get_ends()[first])]
+
+    def is_leaf(self):
+        return self.tree.codes[self.index] >= 0
+
+    def is_operation(self):
+        return self.tree.codes[self.index] < 0
+
+    def get_all_nodes(self):
+        return [FlatNode(self.tree, i) for i in range(self.index, self.tree.get_ends()[self.index])]
+
+    def to_request(self):
+        return self.tree.to_request(self.index)
+
+    def to_node(self) -> Node:
+        return self.tree.to_node(self.index)
+
+    def __len__(self):
+        return self.tree.get_ends()[self.index] - self.index
+
+    def __str__(self):
+        return self.to_request()
+
+
+class FlatTree:
+    """
+    Arbre syntaxique stocké à plat (parcours préfixe d'opcodes et d'identifiants de termes).
+    Même interface publique que Node, mais la sélection d'un nœud aléatoire est en O(1)
+    et la copie ne fait que dupliquer une liste d'entiers.
+    """
+
+    __slots__ = ("codes", "vocabulary", "ends")
+
+    def __init__(self, codes: list[int], vocabulary: Vocabulary):
+        """
+        :pre: codes est le parcours préfixe d'un arbre valide (voir from_node)
+        """
+        self.codes = codes
+        self.vocabulary = vocabulary
+        self.ends = None
+
+    ### LECTURE ###
+
+    def get_ends(self) -> list[int]:
+        """
+        :pre: -
+        :return: Pour chaque position i, la position qui suit le sous-arbre commençant en i
+        """
+        if self.ends is None:
+            codes = self.codes
+            ends = [0] * len(codes)
+            stack = []
+            for i in range(len(codes) - 1, -1, -1):
+                code = codes[i]
+                if code >= 0:
+                    ends[i] = i + 1
+                elif code == NOT:
+                    ends[i] = ends[stack.pop()]
+                else:
+                    stack.pop()
+                    ends[i] = ends[stack.pop()]
+                stack.append(i)
+            self.ends = ends
+        return self.ends
+
+    def get_subtree_end(self, i: int) -> int:
+        """
+        :pre: 0 <= i < len(self)
+        :return: La position qui suit le sous-arbre commençant en i
+        """
+        if self.ends is not None:
+            return self.ends[i]
+        codes = self.codes
+        missing = 1
+        while missing:
+            code = codes[i]
+            missing += ARITY[code] - 1 if code < 0 else -1
+            i += 1
+        return i
+
+    @property
+    def value(self):
+        return decode(self.codes[0])
+
+    @property
+    def children(self) -> list:
+        return FlatNode(self, 0).children
+
+    def is_leaf(self):
+        return len(self.codes) == 1
+
+    def is_operation(self):
+        return self.codes[0] < 0
+
+    def is_valid(self):
+        """
+        :pre: -
+        :return: True si codes représente exactement un arbre valide
+        """
+        return len(self.codes) > 0 and self.get_subtree_end(0) == len(self.codes)
+
+    def get_all_nodes(self):
+        return FlatNode(self, 0).get_all_nodes()
+
+    def get_random_index(self) -> int:
+        """
+        :pre: -
+        :return: La position d'un nœud aléatoire de l'arbre (en O(1))
+        """
+        return random.randrange(len(self.codes))
+
+    def get_random_node(self):
+        return FlatNode(self, self.get_random_index())
+
+    ### MODIFICATIONS ###
+
+    def alter_value_at(self, i: int, vocabulary: Vocabulary):
+        """
+        Modifie aléatoirement la valeur du nœud en position i (voir Node.alter_value)
+        :pre: 0 <= i < len(self)
+        :return: None
+        """
+        code = self.codes[i]
+        if code >= 0:
+            value = TERMS[code]
+            if random.random() < KEEP_SIMILAR_WORD_PROBA:
+                value = vocabulary.sample_synonym(value)
+            else:
+                value = vocabulary.sample_other(value)
+            self.codes[i] = intern_term(value)
+        elif code != NOT:
+            self.codes[i] = AND if code == OR else OR
+
+    def alter_structure_at(self, i: int, vocabulary: Vocabulary, grow_proba=GROW_PROBA, log=False) -> int:
+        """
+        Modifie aléatoirement la structure du sous-arbre en position i (voir Node.alter_structure)
+        :pre: 0 <= i < len(self)
+        :return: La variation du nombre de nœuds
+        """
+        codes = self.codes
+        code = codes[i]
+        self.ends = None
+        if code >= 0 or random.random() < grow_proba:
+            if log:
+                print("Growing...")
+            value = decode(code)
+            new_leaf = intern_term(vocabulary.sample_other(value))
+            end = self.get_subtree_end(i)
+            codes[i:end] = [random.choice([AND, OR])] + codes[i:end] + [new_leaf]
+            return 2
+        # On garde un des enfants à la place du nœud
+        end = self.get_subtree_end(i)
+        first_end = self.get_subtree_end(i + 1)
+        start, stop = random.choice([(i + 1, first_end), (first_end, end)]) if code != NOT else (i + 1, end)
+        if log:
+            print("Shrinking...")
+            print("Child to keep:", self.to_request(start))
+        codes[i:end] = codes[start:stop]
+        return (stop - start) - (end - i)
+
+    def alter_random_node(self, structure_proba=ALTER_STRUCTURE_PROBA, log=False):
+        """
+        Modifie aléatoirement un nœud de l'arbre
+        :pre: -
+        :return: None
+        """
+        i = self.get_random_index()
+        if log:
+            print(f"Altering node [{self.to_request(i)}]...")
+        if random.random() < structure_proba:
+            self.alter_structure_at(i, self.vocabulary, log=log)
+        else:
+            self.alter_value_at(i, self.vocabulary)
+
+    ### CONVERSIONS ###
+
+    def to_request(self, i=0) -> str:
+        """
+        :pre: 0 <= i < len(self)
+        :return: La requête correspondant au sous-arbre en position i (voir Node.to_request)
+        """
+        def to_request_rec(i):
+            code = self.codes[i]
+            if code >= 0:
+                value = TERMS[code]
+                return (value if Vocabulary.is_word(value) else '"' + value + '"'), i + 1
+            if code == NOT:
+                child, i = to_request_rec(i + 1)
+                return f"NOT {child}", i
+            left, j = to_request_rec(i + 1)
+            right, j = to_request_rec(j)
+            return f"({left} {OPERATORS[code]} {right})", j
+        return to_request_rec(i)[0]
+
+    def to_node(self, i=0) -> Node:
+        """
+        :pre: 0 <= i < len(self)
+        :return: Le sous-arbre en position i, sous forme de Node
+        """
+        def to_node_rec(i):
+            code = self.codes[i]
+            if code >= 0:
+                return Node(TERMS[code], [], self.vocabulary), i + 1
+            children = []
+            j = i + 1
+            for _ in range(ARITY[code]):
+                child, j = to_node_rec(j)
+                children.append(child)
+            return Node(OPERATORS[code], children, self.vocabulary), j
+        return to_node_rec(i)[0]
+
+    def get_simplified_request(self):
+        return simplifier.simplify_request(self)
+
+    def copy(self):
+        return FlatTree(self.codes[:], self.vocabulary)
+
+    def __str__(self):
+        return self.to_request()
+
+    def __repr__(self):
+        return repr(self.to_node())
+
+    def __eq__(self, other):
+        return isinstance(other, FlatTree) and self.codes == other.codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    ### STATIC METHODS ###
+
+    @staticmethod
+    def from_node(node: Node):
+        """
+        :pre: node est une Node valide
+        :return: Le FlatTree équivalent
+        """
+        return FlatTree(encode(node), node.vocabulary)
+
+
+class FlatRequestTree(FlatTree):
+    """
+    Équivalent plat de RequestTree : [racine, moitié incluse..., NOT, moitié exclue...].
+    split est la position du NOT, ce qui sépare les deux moitiés et leurs vocabulaires.
+    """
+
+    __slots__ = ("include_vocabulary", "exclude_vocabulary", "split")
+
+    def __init__(self, codes: list[int], include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary, split: int, vocabulary: Vocabulary=None):
+        """
+        :pre: codes[split] est le NOT qui précède la moitié exclue. vocabulary, s'il est donné, est la fusion des deux vocabulaires.
+        """
+        super().__init__(codes, vocabulary or include_vocabulary + exclude_vocabulary)
+        self.include_vocabulary = include_vocabulary
+        self.exclude_vocabulary = exclude_vocabulary
+        self.split = split
+
+    def get_include_tree(self):
+        return FlatNode(self, 1)
+
+    def get_exclude_tree(self):
+        return FlatNode(self, self.split + 1)
+
+    def alter_random_node(self, structure_proba=ALTER_STRUCTURE_PROBA, log=False):
+        """
+        Modifie aléatoirement un nœud de l'arbre sans toucher au NOT (voir RequestTree.alter_random_node)
+        :pre: -
+        :return: None
+        """
+        # Tirage uniforme parmi tous les nœuds sauf le NOT
+        i = random.randrange(len(self.codes) - 1)
+        if i >= self.split:
+            i += 1
+        if log:
+            print(f"Altering node [{self.to_request(i)}]...")
+        vocabulary = self.include_vocabulary if i < self.split else self.exclude_vocabulary
+        if i == 0 or random.random() >= structure_proba:
+            self.alter_value_at(i, vocabulary)
+            if log:
+                print(f"Altered value...")
+        else:
+            delta = self.alter_structure_at(i, vocabulary, log=log)
+            if i < self.split:
+                self.split += delta
+            if log:
+                print(f"Altered structure...")
+
+    def apply_alterations(self, nb_alterations=100, log=False):
+        for _ in range(nb_alterations):
+            self.alter_random_node(log=log)
+
+    def get_half_index(self, num_half: int) -> int:
+        """
+        Tire un nœud de l'une des deux moitiés (0 : inclusion, 1 : exclusion) comme RequestTree.get_half_path
+        (même loi et même consommation du générateur aléatoire)
+        :return: La position du nœud tiré
+        """
+        start, end = (1, self.split) if num_half == 0 else (self.split + 1, len(self.codes))
+        if end - start == 1:
+            return start
+        return start + random.randrange(end - start)
+
+    def crossover(self, other: "FlatRequestTree"):
+        """
+        Échange un sous-arbre aléatoire de self avec un sous-arbre aléatoire de other, pris dans la même moitié
+        (voir RequestTree.crossover) : les deux tranches de codes sont échangées et le NOT décalé de la différence de taille.
+        :pre: self et other sont des FlatRequestTree valides distincts (modifiés tous les deux)
+        :return: None
+        """
+        num_half = random.randint(0, 1)
+        i, j = self.get_half_index(num_half), other.get_half_index(num_half)
+        end, other_end = self.get_subtree_end(i), other.get_subtree_end(j)
+        subtree, other_subtree = self.codes[i:end], other.codes[j:other_end]
+        self.codes[i:end] = other_subtree
+        other.codes[j:other_end] = subtree
+        self.ends = other.ends = None
+        if num_half == 0:
+            self.split += len(other_subtree) - len(subtree)
+            other.split += len(subtree) - len(other_subtree)
+        REGISTRY.increment("tree_crossovers_total")
+
+    def to_colored_request(self):
+        return Fore.GREEN + self.to_request(1) + Fore.BLUE + f" {self.value} " + Fore.RED + self.to_request(self.split) + Fore.RESET
+
+    def to_request_tree(self) -> RequestTree:
+        """
+        :pre: -
+        :return: Le RequestTree équivalent
+        """
+        include = FlatTree(self.codes[1:self.split], self.include_vocabulary).to_node()
+        exclude = FlatTree(self.codes[self.split+1:], self.exclude_vocabulary).to_node()
+        request = RequestTree(include, exclude)
+        request.value = self.value
+        return request
+
+    def to_node(self, i=0) -> Node:
+        if i == 0:
+            return self.to_request_tree()
+        return super().to_node(i)
+
+    def copy(self):
+        return FlatRequestTree(self.codes[:], self.include_vocabulary, self.exclude_vocabulary, self.split, self.vocabulary)
+
+    def __str__(self):
+        return self.to_colored_request()
+
+    ### STATIC METHODS ###
+
+    @staticmethod
+    def from_request_tree(request: RequestTree):
+        """
+        :pre: request est un RequestTree valide
+        :return: Le FlatRequestTree équivalent
+        """
+        include = encode(request.get_include_tree())
+        codes = [OPCODES[request.value]] + include + [NOT] + encode(request.get_exclude_tree())
+        return FlatRequestTree(codes, request.get_include_tree().vocabulary, request.get_exclude_tree().vocabulary, len(include) + 1)
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def intern_term(term: str) -> int:
+    """
+    :pre: term est un str
+    :return: L'identifiant du terme dans TERMS (ajouté s'il n'existe pas encore)
+    """
+    term_id = TERM_IDS.get(term)
+    if term_id is None:
+        term_id = len(TERMS)
+        TERMS.append(term)
+        TERM_IDS[term] = term_id
+    return term_id
+
+def decode(code: int) -> str:
+    """
+    :pre: code est un opcode ou un identifiant de terme
+    :return: La valeur du nœud correspondant
+    """
+    return TERMS[code] if code >= 0 else OPERATORS[code]
+
+def encode(node: Node) -> list[int]:
+    """
+    :pre: node est une Node valide
+    :return: Le parcours préfixe de l'arbre sous forme de codes
+    """
+    codes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        codes.append(intern_term(node.value) if node.is_leaf() else OPCODES[node.value])
+        stack.extend(reversed(node.children))
+    return codes
@@ -0,0 +1,316 @@
+import asyncio
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import requetes_articles as ra
+from page_cache import PageCache, HarvestCheckpoint
+from metrics import REGISTRY, METRICS_PATH
+from results_store import ResultsStore
+from query_cache import QueryCache
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# Codes HTTP pour lesquels on retente la requête
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+### PARAMÈTRES PAR DÉFAUT ###
+REQUESTS_PER_SECOND = 0.5
+BURST = 2
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0      # secondes, doublé à chaque nouvel essai
+MAX_BACKOFF = 120.0
+TIMEOUT = 30.0
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class TokenBucket:
+    """
+    Limiteur de débit : le seau se remplit de rate jetons par seconde, jusqu'à capacity.
+    Chaque requête consomme un jeton et attend s'il n'y en a plus.
+    """
+
+    def __init__(self, rate: float, capacity: int=1):
+        """
+        :pre: rate > 0, capacity >= 1
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        """
+        Attend qu'un jeton soit disponible puis le consomme
+        :pre: -
+        :return: None
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+
+class AsyncHarvester:
+    """
+    Récupère les pages de résultats ACM en parallèle :
+    - une session HTTP par thread de requêtes, dont les connexions sont réutilisées (keep-alive),
+    - un débit limité par un TokenBucket,
+    - au plus max_concurrency requêtes en cours,
+    - de nouveaux essais avec attente exponentielle sur les erreurs 429 et 5xx.
+    Avec un PageCache, les pages déjà téléchargées sont relues sur le disque.
+    Avec un QueryCache, les pages déjà analysées d'une requête équivalente (mêmes dates et filtres) ne sont ni
+    téléchargées ni analysées, et les requêtes équivalentes lancées en même temps ne sont téléchargées qu'une fois.
+    """
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND, burst=BURST, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, timeout=TIMEOUT, base_url=ra.ACM_BASE_URL, page_cache: PageCache=None, query_cache: QueryCache=None, log=False):
+        """
+        :pre: requests_per_second > 0, max_concurrency >= 1. base_url permet de viser un serveur de test local.
+        """
+        self.page_cache = page_cache
+        self.query_cache = query_cache
+        self.pending_pages = {}     # clé du QueryCache -> téléchargement en cours
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.base_url = base_url
+        self.log = log
+        # requests.Session n'est pas garantie thread-safe : chaque thread de asyncio.to_thread a la sienne
+        self.local = threading.local()
+        self.sessions: list[requests.Session] = []
+        self.sessions_lock = threading.Lock()
+        self.semaphore = None
+
+    def get_session(self) -> requests.Session:
+        """
+        :pre: -
+        :return: La session HTTP du thread courant (créée au premier appel)
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            # Un thread n'envoie qu'une requête à la fois : une connexion suffit par serveur
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            with self.sessions_lock:
+                self.sessions.append(session)
+        return session
+
+    def get(self, url: str) -> requests.Response:
+        """ Requête GET bloquante, exécutée dans un thread par fetch """
+        return self.get_session().get(url, timeout=self.timeout)
+
+    def get_retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """
+        :pre: attempt est le numéro de l'essai qui vient d'échouer (à partir de 0)
+        :return: Le temps d'attente avant le prochain essai (Retry-After s'il est donné)
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        delay = min(MAX_BACKOFF, self.backoff_base * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    async def fetch(self, url: str) -> str:
+        """
+        :pre: url est une url http(s)
+        :return: Le contenu de la page
+        """
+        if self.page_cache is not None:
+            page_content = self.page_cache.get(url)
+            if page_content is not None:
+                self.page_cache.hits += 1
+                REGISTRY.increment("page_cache_lookups_total", result="hit")
+                return page_content
+            self.page_cache.misses += 1
+            REGISTRY.increment("page_cache_lookups_total", result="miss")
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        for attempt in range(self.max_retries + 1):
+            # Le sémaphore n'est gardé que pendant la requête : une attente avant un nouvel essai ne bloque pas les autres
+            async with self.semaphore:
+                await self.rate_limiter.acquire()
+                response = None
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.to_thread(self.get, url)
+                    REGISTRY.observe("fetch_seconds", time.perf_counter() - start)
+                    REGISTRY.increment("fetch_requests_total", status=response.status_code)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        if self.page_cache is not None:
+                            self.page_cache.put(url, response.text)
+                        return response.text
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    REGISTRY.increment("fetch_errors_total", error=type(error).__name__)
+                    if attempt == self.max_retries:
+                        raise
+            if attempt == self.max_retries:
+                response.raise_for_status()
+            delay = self.get_retry_delay(response, attempt)
+            REGISTRY.increment("fetch_retries_total")
+            REGISTRY.observe("fetch_backoff_seconds", delay)
+            if self.log:
+                status = response.status_code if response is not None else "connexion"
+                print(f"Erreur {status} sur {url}, nouvel essai dans {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def fetch_page(self, requete: str, start_page=0, nb_results_per_page=20, **url_params) -> dict:
+        """
+        :pre: url_params sont les autres paramètres de construct_ACM_url
+        :return: Les informations générales de la page (voir extract_general_infos)
+        """
+        url = ra.construct_ACM_url(requete, nb_max_results_per_page=nb_results_per_page, start_page=start_page, http_chars=ra.HTTP_CHARS, base_url=self.base_url, **url_params)
+        if self.query_cache is None:
+            return await self.download_page(url, start_page)
+        key = self.query_cache.get_key(requete, start_page=start_page, nb_results_per_page=nb_results_per_page, base_url=self.base_url, **url_params)
+        general_infos = self.query_cache.get(key)
+        if general_infos is not None:
+            return general_infos
+        task = self.pending_pages.get(key)
+        if task is not None:
+            return await task
+        task = self.pending_pages[key] = asyncio.ensure_future(self.download_page(url, start_page))
+        try:
+            general_infos = await task
+        finally:
+            del self.pending_pages[key]
+        self.query_cache.put(key, general_infos)
+        return general_infos
+
+    async def download_page(self, url: str, start_page: int) -> dict:
+        """
+        :pre: url est l'url d'une page de résultats ACM
+        :return: Les informations générales de la page (voir extract_general_infos)
+        """
+        page_content = await self.fetch(url)
+        general_infos = ra.extract_general_infos(page_content)
+        if self.log:
+            print(f"Page {start_page} : {len(general_infos['articles'])} articles")
+        return general_infos
+
+    async def harvest(self, requete: str, nb_results_per_page=20, checkpoint: HarvestCheckpoint=None, on_page=None, **url_params) -> dict[int, dict]:
+        """
+        Récupère la première page pour connaître le nombre de résultats, puis toutes les autres en parallèle.
+        Avec un checkpoint, les pages déjà traitées lors d'une exécution précédente sont ignorées et chaque
+        page est marquée comme traitée après l'appel de on_page(start_page, general_infos).
+        :pre: url_params sont les autres paramètres de construct_ACM_url
+        :return: Les informations générales des pages traitées, indexées par startPage
+        """
+        key = None
+        done_pages = set()
+        if checkpoint is not None:
+            first_url = ra.construct_ACM_url(requete, nb_max_results_per_page=nb_results_per_page, http_chars=ra.HTTP_CHARS, base_url=self.base_url, **url_params)
+            key = HarvestCheckpoint.get_key(first_url)
+            done_pages = checkpoint.get_done_pages(key)
+        pages = {}
+
+        def process(start_page, general_infos):
+            pages[start_page] = general_infos
+            if on_page is not None:
+                on_page(start_page, general_infos)
+            if checkpoint is not None:
+                checkpoint.mark_done(key, start_page)
+
+        first_page = await self.fetch_page(requete, 0, nb_results_per_page, **url_params)
+        nb_pages = ra.get_nb_pages(first_page['nb_results'], nb_results_per_page)
+        if checkpoint is not None:
+            checkpoint.set_nb_pages(key, nb_pages)
+        if 0 not in done_pages:
+            process(0, first_page)
+
+        async def fetch_and_process(start_page):
+            process(start_page, await self.fetch_page(requete, start_page, nb_results_per_page, **url_params))
+        await asyncio.gather(*(fetch_and_process(i) for i in range(1, nb_pages) if i not in done_pages))
+        return dict(sorted(pages.items()))
+
+    async def count_results(self, requetes: list[str], nb_results_per_page=10, **url_params) -> list[dict]:
+        """
+        Récupère en parallèle la première page de chaque requête (pour son nombre de résultats)
+        :pre: url_params sont les autres paramètres de construct_ACM_url
+        :return: Les informations générales de la première page de chaque requête, dans l'ordre de requetes
+        """
+        return await asyncio.gather(*(self.fetch_page(requete, 0, nb_results_per_page, **url_params) for requete in requetes))
+
+    def run(self, coroutine):
+        """
+        Exécute une coroutine du harvester dans une nouvelle boucle asyncio (harvester réutilisable d'un appel à l'autre)
+        :pre: coroutine est une coroutine de ce harvester
+        :return: Le résultat de la coroutine
+        """
+        # Le sémaphore et le verrou du limiteur sont liés à la boucle où ils ont servi : on les recrée
+        self.semaphore = None
+        self.rate_limiter.lock = None
+        self.pending_pages.clear()
+        return asyncio.run(coroutine)
+
+    def close(self):
+        with self.sessions_lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions.clear()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def harvest(requete: str, nb_results_per_page=20, harvester: AsyncHarvester=None, checkpoint: HarvestCheckpoint=None, on_page=None, **url_params) -> dict[int, dict]:
+    """
+    Version synchrone de AsyncHarvester.harvest
+    :pre: url_params sont les autres paramètres de construct_ACM_url
+    :return: Les informations générales des pages traitées, indexées par startPage
+    """
+    harvester = harvester or AsyncHarvester()
+    try:
+        return asyncio.run(harvester.harvest(requete, nb_results_per_page, checkpoint, on_page, **url_params))
+    finally:
+        harvester.close()
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    checkpoint = HarvestCheckpoint()
+    results_store = ResultsStore()
+
+    def save_page(start_page, general_infos):
+        ra.display_general_infos(general_infos)
+        # Une transaction par page : une page marquée comme traitée dans le checkpoint est toujours entièrement enregistrée
+        results_store.save_general_infos(general_infos)
+
+    url_params = dict(after_month=ra.after_month, after_year=ra.after_year, before_month=ra.before_month, before_year=ra.before_year, sponsorise_ACM=ra.sponsorise_ACM, articles_uniquement=ra.articles_uniquement)
+    first_url = ra.construct_ACM_url(ra.requete, nb_max_results_per_page=ra.nb_max_results_to_display, http_chars=ra.HTTP_CHARS, **url_params)
+    key = HarvestCheckpoint.get_key(first_url)
+    if checkpoint.is_complete(key):
+        checkpoint.reset(key)
+    harvest(ra.requete, ra.nb_max_results_to_display, AsyncHarvester(page_cache=PageCache(), log=True), checkpoint, save_page, **url_params)
+    results_store.close()
+    REGISTRY.save(METRICS_PATH)
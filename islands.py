@@ -0,0 +1,138 @@
+import multiprocessing
+import random
+import traceback
+from typing import Callable
+from vocabulary import Vocabulary
+import semantic_tree as st
+import tree_codec
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+MIGRATION_INTERVAL = 10
+# Part de chaque île envoyée à l'île suivante à chaque migration
+MIGRATION_RATE = 0.1
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class IslandMigration:
+    """
+    Fonction de migration (paramètre migration de generate_best_request_genetic_algorithm) d'une île :
+    toutes les migration_interval générations, les nb_migrants meilleures requêtes sont envoyées au
+    processus principal, qui les transmet à l'île suivante (topologie en anneau), et les requêtes reçues
+    de l'île précédente remplacent les nb_migrants moins bonnes.
+    """
+
+    def __init__(self, connection, nb_generations: int, migration_interval: int, nb_migrants: int, include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary):
+        """
+        :pre: connection est l'extrémité de Pipe de l'île, nb_migrants >= 1
+        """
+        self.connection = connection
+        self.nb_generations = nb_generations
+        self.migration_interval = migration_interval
+        self.nb_migrants = nb_migrants
+        self.include_vocabulary = include_vocabulary
+        self.exclude_vocabulary = exclude_vocabulary
+
+    def __call__(self, num_generation: int, population: list, scores: list) -> tuple[list, list]:
+        # Pas de migration après la dernière génération : le processus principal en attend nb_migrations = (nb_generations-1) // migration_interval
+        if (num_generation + 1) % self.migration_interval != 0 or num_generation + 1 >= self.nb_generations:
+            return population, scores
+        order = sorted(range(len(population)), key=scores.__getitem__, reverse=True)
+        best = order[:self.nb_migrants]
+        self.connection.send(("migrants", tree_codec.dumps_population([population[i] for i in best]), [scores[i] for i in best]))
+        _, data, migrant_scores = self.connection.recv()
+        migrants = tree_codec.loads_population(data, self.include_vocabulary, self.exclude_vocabulary)
+        population, scores = list(population), list(scores)
+        for i, migrant, migrant_score in zip(reversed(order), migrants, migrant_scores):
+            population[i] = migrant
+            scores[i] = migrant_score
+        return population, scores
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def _run_island(connection, seed: int, initial_data: bytes, score_function: Callable, batch_score_function: Callable, nb_generations: int, migration_interval: int, nb_migrants: int, kwargs: dict):
+    """ Processus d'une île : algorithme génétique complet, puis envoi de sa meilleure requête et de son score """
+    try:
+        random.seed(seed)
+        include_vocabulary, exclude_vocabulary = kwargs.pop("include_vocabulary"), kwargs.pop("exclude_vocabulary")
+        initial_request = tree_codec.loads(initial_data, include_vocabulary, exclude_vocabulary)
+        migration = IslandMigration(connection, nb_generations, migration_interval, nb_migrants, include_vocabulary, exclude_vocabulary)
+        best = st.generate_best_request_genetic_algorithm(score_function, initial_request, nb_generations=nb_generations, batch_score_function=batch_score_function, migration=migration, verbose=False, **kwargs)
+        best_score = batch_score_function([best])[0] if batch_score_function is not None else score_function(best)
+        connection.send(("result", tree_codec.dumps(best), best_score))
+    except Exception:
+        connection.send(("error", traceback.format_exc(), None))
+    finally:
+        connection.close()
+
+def receive(connection, num_island: int) -> tuple:
+    """
+    :return: Le message suivant de l'île, RuntimeError (avec son traceback) si elle a échoué
+    """
+    message = connection.recv()
+    if message[0] == "error":
+        raise RuntimeError(f"Échec de l'île {num_island} :\n{message[1]}")
+    return message
+
+def run_islands(score_function: Callable, initial_request: st.RequestTree, nb_islands: int, nb_generations=100, population_size=100, migration_interval=MIGRATION_INTERVAL, nb_migrants: int=None, batch_score_function: Callable=None, seed: int=None, verbose=True, **kwargs) -> st.RequestTree:
+    """
+    Modèle en îles de l'algorithme génétique : nb_islands populations de population_size requêtes évoluent
+    indépendamment, chacune dans son processus, et échangent leurs meilleures requêtes toutes les migration_interval générations.
+    :pre: les fonctions de score sont utilisables dans un processus fils (fork, ou définies au niveau d'un module).
+    nb_migrants est le nombre de requêtes échangées (MIGRATION_RATE de population_size par défaut).
+    kwargs sont les autres paramètres de generate_best_request_genetic_algorithm (cache_size, cache_key_function, nb_max_alterations_per_gen...).
+    seed (optionnel) fixe les graines des îles (seed, seed+1, ...), tirées de random sinon.
+    :return: La meilleure requête de toutes les îles
+    """
+    nb_migrants = max(1, nb_migrants or int(population_size * MIGRATION_RATE))
+    kwargs.update(population_size=population_size, include_vocabulary=initial_request.get_include_tree().vocabulary, exclude_vocabulary=initial_request.get_exclude_tree().vocabulary)
+    seeds = [seed + i for i in range(nb_islands)] if seed is not None else [random.getrandbits(32) for _ in range(nb_islands)]
+    initial_data = tree_codec.dumps(initial_request)
+    connections, processes = [], []
+    try:
+        for num_island in range(nb_islands):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_island, args=(child_connection, seeds[num_island], initial_data, score_function, batch_score_function, nb_generations, migration_interval, nb_migrants, dict(kwargs)), daemon=True)
+            process.start()
+            child_connection.close()
+            connections.append(parent_connection)
+            processes.append(process)
+
+        for num_migration in range(max(0, nb_generations - 1) // migration_interval):
+            with REGISTRY.phase("ga.migrate"):
+                messages = [receive(connection, num_island) for num_island, connection in enumerate(connections)]
+                # Anneau : l'île i reçoit les migrants de l'île i-1
+                for num_island, connection in enumerate(connections):
+                    connection.send(messages[num_island - 1])
+            best_scores = [max(message[2]) for message in messages]
+            REGISTRY.increment("island_migrations_total")
+            if verbose:
+                print(f"Migration {num_migration+1} (génération {(num_migration+1)*migration_interval}) : meilleurs scores {best_scores}")
+
+        results = [receive(connection, num_island) for num_island, connection in enumerate(connections)]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for connection in connections:
+            connection.close()
+
+    best_island = max(range(nb_islands), key=lambda num_island: results[num_island][2])
+    if verbose:
+        print(f"Meilleurs scores des îles : {[result[2] for result in results]}")
+    return tree_codec.loads(results[best_island][1], kwargs["include_vocabulary"], kwargs["exclude_vocabulary"])
@@ -0,0 +1,242 @@
+"""
+Point d'entrée unique du projet :
+
+    python main.py harvest [--query REQUÊTE] [--store articles.db]      récolte des résultats ACM
+    python main.py filter FICHIERS.bib -o sortie.bib [-p PRÉFIXE]      filtre des exports BibTeX par conférence
+    python main.py evolve [--initial REQUÊTE] [--generations N]        algorithme génétique sur le corpus local
+    python main.py simplify "REQUÊTE" [--sympy]                        simplification d'une requête
+    python main.py experiments {alterations,crossover,evaluation,ga}   expériences aléatoires en parallèle
+    python main.py index [FICHIERS.bib] -o corpus.idx                  compilation de l'index du corpus (ouvert avec mmap par evolve --index)
+
+Les modules lourds (bs4, requests, sympy, index du corpus) ne sont importés que par la sous-commande qui en a besoin.
+"""
+import argparse
+import sys
+import time
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+DEFAULT_INITIAL_REQUEST = "collaboration AND NOT batman"
+# Nombre de résultats visé par evolve : assez pour être exhaustif, assez peu pour être relu
+DEFAULT_TARGET_COUNT = 100
+DEFAULT_SIZE_PENALTY = 0.5
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class TargetCountScore:
+    """
+    Score d'une requête à partir de son nombre de résultats sur le corpus local :
+    plus il est proche de target, mieux c'est, et chaque nœud coûte size_penalty.
+    """
+
+    def __init__(self, target=DEFAULT_TARGET_COUNT, size_penalty=DEFAULT_SIZE_PENALTY):
+        self.target = target
+        self.size_penalty = size_penalty
+
+    def __call__(self, tree, count: int) -> float:
+        return -abs(count - self.target) - self.size_penalty * len(tree)
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+### SOUS-COMMANDES ###
+
+def run_harvest(args: argparse.Namespace):
+    import requetes_articles as ra
+    from harvester import AsyncHarvester, harvest
+    from page_cache import PageCache, HarvestCheckpoint
+    from results_store import ResultsStore
+
+    requete = args.query or ra.requete
+    url_params = dict(after_year=args.after_year, before_year=args.before_year, sponsorise_ACM=ra.sponsorise_ACM, articles_uniquement=ra.articles_uniquement)
+    checkpoint = HarvestCheckpoint(args.checkpoint)
+    first_url = ra.construct_ACM_url(requete, nb_max_results_per_page=args.per_page, http_chars=ra.HTTP_CHARS, base_url=args.base_url, **url_params)
+    key = HarvestCheckpoint.get_key(first_url)
+    if checkpoint.is_complete(key):
+        checkpoint.reset(key)
+    harvester = AsyncHarvester(requests_per_second=args.rate, max_concurrency=args.concurrency, base_url=args.base_url, page_cache=None if args.no_cache else PageCache(), log=not args.quiet)
+    with ResultsStore(args.store) as results_store:
+        def save_page(start_page, general_infos):
+            results_store.save_general_infos(general_infos)
+        pages = harvest(requete, args.per_page, harvester, checkpoint, save_page, **url_params)
+        print(f"{sum(len(page['articles']) for page in pages.values())} articles enregistrés dans {args.store} ({len(results_store)} au total)")
+    if args.metrics:
+        from metrics import REGISTRY
+        REGISTRY.save(args.metrics)
+
+def run_filter(args: argparse.Namespace):
+    import bib_filter
+    bib_filter.run(args)
+
+def run_evolve(args: argparse.Namespace):
+    import random
+    import semantic_tree as st
+    from corpus_index import CorpusIndex, CORPUS_FILES
+    from batch_eval import BatchEvaluator, make_batch_score_function
+    from score_cache import canonical_form_and_size
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    start = time.perf_counter()
+    if args.index:
+        from compiled_index import MappedCorpusIndex
+        index = MappedCorpusIndex(args.index)
+    elif args.store:
+        from results_store import ResultsStore
+        with ResultsStore(args.store) as results_store:
+            index = CorpusIndex.from_store(results_store)
+    else:
+        index = CorpusIndex.load(args.corpus or CORPUS_FILES)
+    if not args.quiet:
+        print(f"Corpus : {len(index)} documents chargés en {time.perf_counter() - start:.2f}s")
+    initial_request = st.parse_request_tree(args.initial, st.INCLUDED_VOCABULARY, st.EXCLUDED_VOCABULARY)
+    score_from_count = TargetCountScore(args.target, args.size_penalty)
+    batch_score_function = make_batch_score_function(BatchEvaluator(index), score_from_count)
+    cache_size = args.cache_size
+    # Le score dépend de la taille des requêtes : la forme canonique seule ne suffit pas comme clé du cache
+    cache_key_function = canonical_form_and_size if args.size_penalty else None
+    harvester = None
+    if args.live_top_k:
+        # Nombres de résultats estimés sur le corpus local, seules les live_top_k meilleures requêtes de chaque génération sont envoyées à ACM
+        from harvester import AsyncHarvester
+        from page_cache import PageCache
+        from query_cache import QueryCache
+        from surrogate import HitCountEstimator, MultiFidelityScorer, LiveCounter
+        estimator = HitCountEstimator(index)
+        estimator.load(args.calibration)
+        harvester = AsyncHarvester(requests_per_second=args.rate, base_url=args.base_url, page_cache=PageCache(), query_cache=QueryCache(args.query_cache, args.query_cache_ttl * 3600), log=not args.quiet)
+        batch_score_function = MultiFidelityScorer(estimator, LiveCounter(harvester), score_from_count, args.live_top_k)
+        cache_size = None
+    if args.profile:
+        st.REGISTRY.enable_profiling()
+    try:
+        best = st.generate_best_request_genetic_algorithm(None, initial_request, nb_generations=args.generations, population_size=args.population, batch_score_function=batch_score_function, cache_size=cache_size, cache_key_function=cache_key_function, verbose=not args.quiet, nb_islands=args.islands, migration_interval=args.migration_interval, crossover_proba=st.CROSSOVER_PROBA if args.crossover is None else args.crossover)
+    finally:
+        if harvester is not None:
+            harvester.close()
+            harvester.query_cache.close()
+            estimator.save(args.calibration)
+    print(best.get_simplified_request())
+    print(f"{index.count(best)} résultats sur le corpus local")
+    if harvester is not None:
+        print(batch_score_function)
+    if args.metrics:
+        st.REGISTRY.save(args.metrics)
+    if args.profile:
+        st.REGISTRY.dump_profiles(args.profile)
+
+def run_simplify(args: argparse.Namespace):
+    import semantic_tree as st
+    from vocabulary import Vocabulary
+    # Le vocabulaire ne sert qu'aux altérations : inutile de charger les fichiers JSON
+    vocabulary = Vocabulary()
+    for request in args.requests:
+        try:
+            tree = st.parse_request(request, vocabulary)
+        except ValueError as error:
+            sys.exit(f"Erreur : {error}")
+        print(tree.get_simplified_request(use_sympy=args.sympy))
+
+def run_index(arguments: list[str]):
+    import compiled_index
+    compiled_index.main(arguments, prog="main.py index")
+
+def run_experiments(arguments: list[str]):
+    import experiments
+    experiments.main(arguments, prog="main.py experiments")
+
+### PARSER ###
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Recherche de requêtes ACM par algorithme génétique.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    harvest_parser = subparsers.add_parser("harvest", help="récolter les résultats d'une requête ACM")
+    harvest_parser.add_argument("-q", "--query", help="requête (par défaut celle de requetes_articles.py)")
+    harvest_parser.add_argument("--per-page", type=int, default=20, help="nombre de résultats par page")
+    harvest_parser.add_argument("--after-year", type=int, default=1990)
+    harvest_parser.add_argument("--before-year", type=int, default=time.localtime().tm_year)
+    harvest_parser.add_argument("--store", default="articles.db", help="base SQLite des articles (voir results_store.py)")
+    harvest_parser.add_argument("--checkpoint", default="harvest_checkpoint.json", help="fichier de reprise")
+    harvest_parser.add_argument("--rate", type=float, default=0.5, help="requêtes par seconde")
+    harvest_parser.add_argument("--concurrency", type=int, default=4, help="requêtes simultanées au maximum")
+    harvest_parser.add_argument("--base-url", default="https://dl.acm.org", help="serveur interrogé (un serveur de test local par exemple)")
+    harvest_parser.add_argument("--no-cache", action="store_true", help="ne pas utiliser le cache de pages")
+    harvest_parser.add_argument("--metrics", help="fichier .json ou .prom où écrire les métriques")
+    harvest_parser.add_argument("--quiet", action="store_true")
+    harvest_parser.set_defaults(run=run_harvest)
+
+    import bib_filter
+    filter_parser = subparsers.add_parser("filter", help=bib_filter.DESCRIPTION)
+    bib_filter.add_arguments(filter_parser)
+    filter_parser.set_defaults(run=run_filter)
+
+    evolve_parser = subparsers.add_parser("evolve", help="chercher une requête par algorithme génétique, évaluée sur le corpus local")
+    evolve_parser.add_argument("--initial", default=DEFAULT_INITIAL_REQUEST, help="requête initiale, de la forme '<inclusion> AND NOT <exclusion>'")
+    evolve_parser.add_argument("-g", "--generations", type=int, default=100)
+    evolve_parser.add_argument("-p", "--population", type=int, default=100)
+    evolve_parser.add_argument("--crossover", type=float, help="part des nouveaux individus obtenus par croisement de deux parents (0 : mutations seules, par défaut semantic_tree.CROSSOVER_PROBA)")
+    evolve_parser.add_argument("--target", type=int, default=DEFAULT_TARGET_COUNT, help="nombre de résultats visé")
+    evolve_parser.add_argument("--size-penalty", type=float, default=DEFAULT_SIZE_PENALTY, help="pénalité par nœud de la requête")
+    evolve_parser.add_argument("--corpus", nargs="+", help="fichiers .bib du corpus (par défaut ceux de corpus_index.py)")
+    evolve_parser.add_argument("--index", help="index compilé par la sous-commande index (remplace --corpus, ouverture immédiate)")
+    evolve_parser.add_argument("--store", help="base SQLite remplie par harvest (remplace --corpus, titres seulement, voir results_store.py)")
+    evolve_parser.add_argument("--cache-size", type=int, default=10000, help="nombre de scores gardés en cache")
+    evolve_parser.add_argument("--islands", type=int, default=1, help="nombre de populations, chacune dans son processus (voir islands.py)")
+    evolve_parser.add_argument("--migration-interval", type=int, default=10, help="générations entre deux échanges des meilleures requêtes entre îles")
+    evolve_parser.add_argument("--live-top-k", type=int, metavar="K", help="évaluer sur ACM les K meilleures requêtes estimées de chaque génération (voir surrogate.py)")
+    evolve_parser.add_argument("--calibration", default="surrogate_calibration.json", help="nombres de résultats ACM déjà observés, pour calibrer l'estimateur")
+    evolve_parser.add_argument("--base-url", default="https://dl.acm.org", help="serveur interrogé avec --live-top-k")
+    evolve_parser.add_argument("--rate", type=float, default=0.5, help="requêtes par seconde avec --live-top-k")
+    evolve_parser.add_argument("--query-cache", default="query_cache.db", help="cache des pages de résultats, indexé par la forme simplifiée des requêtes (voir query_cache.py)")
+    evolve_parser.add_argument("--query-cache-ttl", type=float, default=7 * 24, metavar="HEURES", help="durée de validité des pages en cache")
+    evolve_parser.add_argument("--seed", type=int)
+    evolve_parser.add_argument("--metrics", help="fichier .json ou .prom où écrire les métriques")
+    evolve_parser.add_argument("--profile", metavar="DOSSIER", help="profiler chaque phase (cProfile) et écrire les profils dans DOSSIER")
+    evolve_parser.add_argument("--quiet", action="store_true", help="ne pas afficher la population à chaque génération")
+    evolve_parser.set_defaults(run=run_evolve)
+
+    simplify_parser = subparsers.add_parser("simplify", help="simplifier une ou plusieurs requêtes")
+    simplify_parser.add_argument("requests", nargs="+", help="requêtes avec AND, OR, NOT et parenthèses")
+    simplify_parser.add_argument("--sympy", action="store_true", help="passer par la forme normale conjonctive de sympy (lent)")
+    simplify_parser.set_defaults(run=run_simplify)
+
+    # Arguments analysés par experiments.main : le module (multiprocessing, concurrent.futures) n'est importé que s'il sert
+    experiments_parser = subparsers.add_parser("experiments", help="lancer des expériences aléatoires reproductibles en parallèle (python main.py experiments -h)", add_help=False)
+    experiments_parser.set_defaults(run=run_experiments, delegated=True)
+
+    # Arguments analysés par compiled_index.main, importé (avec l'index du corpus) seulement s'il sert
+    index_parser = subparsers.add_parser("index", help="compiler les exports .bib du corpus en un index binaire ouvert avec mmap (python main.py index -h)", add_help=False)
+    index_parser.set_defaults(run=run_index, delegated=True)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, arguments = parser.parse_known_args(argv)
+    # Les sous-commandes déléguées reçoivent leurs arguments tels quels et les analysent elles-mêmes
+    if getattr(args, "delegated", False):
+        args.run(arguments)
+    elif arguments:
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+    else:
+        args.run(args)
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
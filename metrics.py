@@ -0,0 +1,308 @@
+import bisect
+import contextlib
+import functools
+import json
+import os
+import time
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# Bornes (en secondes) des histogrammes de durées : de 100µs à 2 minutes
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 120.0)
+METRICS_PATH = "metrics.json"
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class Histogram:
+    """ Distribution de valeurs observées (durées en général), par intervalles cumulés à la Prometheus """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :pre: buckets est une suite croissante de bornes supérieures
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def get_cumulative_counts(self) -> list[int]:
+        """
+        :return: Pour chaque borne (et +Inf), le nombre de valeurs inférieures ou égales
+        """
+        cumulative, total = [], 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.get_cumulative_counts())},
+        }
+
+
+class MetricsRegistry:
+    """
+    Registre des mesures d'une exécution :
+    - compteurs (requêtes, erreurs, altérations...),
+    - histogrammes de durées (une par appel ou par phase),
+    - durées de chaque phase de chaque génération de l'algorithme génétique,
+    - profils cProfile par phase, seulement si enable_profiling a été appelé.
+    Rien n'est affiché : tout est exporté à la fin en JSON (to_json) ou au format texte Prometheus (to_prometheus).
+    Les métriques sont identifiées par un nom et des étiquettes optionnelles (ex: status="429").
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.generations = []
+        self.profiled_phases = None
+        self.profiles = {}
+        self.profiling = False
+        self.active_profile = None
+
+    ### COMPTEURS ET HISTOGRAMMES ###
+
+    def increment(self, name: str, value=1, **labels):
+        """
+        :pre: name est le nom du compteur, labels ses étiquettes
+        :return: None
+        """
+        key = make_key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Ajoute une valeur à un histogramme (créé à la première observation)
+        :pre: name est le nom de l'histogramme, labels ses étiquettes
+        :return: None
+        """
+        key = make_key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def get_counter(self, name: str, **labels):
+        return self.counters.get(make_key(name, labels), 0)
+
+    def get_histogram(self, name: str, **labels) -> Histogram:
+        return self.histograms.get(make_key(name, labels))
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Mesure la durée du bloc dans l'histogramme name
+        :pre: name est le nom de l'histogramme (en secondes)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str=None):
+        """
+        Décorateur qui mesure la durée de chaque appel de la fonction
+        :pre: name est le nom de l'histogramme, par défaut "<nom de la fonction>_seconds"
+        """
+        def decorator(func):
+            histogram_name = name or f"{func.__name__}_seconds"
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(histogram_name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    ### PHASES ET PROFILAGE ###
+
+    def enable_profiling(self, phases: list[str]=None):
+        """
+        Active cProfile pour les phases données (toutes si phases est None)
+        :pre: phases est une liste de noms de phases (voir phase)
+        :return: None
+        """
+        self.profiled_phases = None if phases is None else set(phases)
+        self.profiling = True
+
+    def disable_profiling(self):
+        self.profiling = False
+
+    def is_profiled(self, phase: str) -> bool:
+        return self.profiling and (self.profiled_phases is None or phase in self.profiled_phases)
+
+    @contextlib.contextmanager
+    def phase(self, phase: str, durations: dict=None):
+        """
+        Mesure la durée d'une phase (histogramme "phase_seconds" d'étiquette phase) et la profile si demandé.
+        Les profils d'une même phase sont cumulés ; une phase imbriquée dans une phase déjà profilée n'est pas profilée à part.
+        :pre: durations (optionnel) est un dictionnaire où ajouter la durée de la phase (voir record_generation)
+        """
+        profile = None
+        if self.is_profiled(phase) and self.active_profile is None:
+            profile = self.profiles.get(phase)
+            if profile is None:
+                import cProfile
+                profile = self.profiles[phase] = cProfile.Profile()
+            self.active_profile = profile
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self.active_profile = None
+            self.observe("phase_seconds", duration, phase=phase)
+            if durations is not None:
+                durations[phase] = durations.get(phase, 0.0) + duration
+
+    def get_profile_stats(self, phase: str) -> "pstats.Stats":
+        """
+        :pre: la phase a été profilée
+        :return: Les statistiques cProfile cumulées de la phase
+        """
+        import pstats
+        return pstats.Stats(self.profiles[phase])
+
+    def dump_profiles(self, directory: str):
+        """
+        Écrit un fichier <phase>.prof par phase profilée (lisible avec pstats ou snakeviz)
+        :pre: directory est un dossier (créé si besoin)
+        :return: None
+        """
+        os.makedirs(directory, exist_ok=True)
+        for phase, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(directory, phase.replace("/", "_") + ".prof"))
+
+    ### GÉNÉRATIONS ###
+
+    def record_generation(self, num_generation: int, durations: dict[str, float], **values):
+        """
+        Enregistre les durées des phases d'une génération de l'algorithme génétique
+        :pre: durations associe le nom de chaque phase à sa durée en secondes. values sont d'autres valeurs de la génération (meilleur score...).
+        :return: None
+        """
+        self.generations.append({"generation": num_generation, "durations": dict(durations), "total": sum(durations.values()), **values})
+        self.observe("ga_generation_seconds", sum(durations.values()))
+
+    ### EXPORT ###
+
+    def to_dict(self) -> dict:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())],
+            "histograms": [{"name": name, "labels": dict(labels), **histogram.to_dict()} for (name, labels), histogram in sorted(self.histograms.items())],
+            "generations": self.generations,
+        }
+
+    def to_json(self, path: str=None) -> str:
+        """
+        :pre: path (optionnel) est le fichier où écrire le JSON
+        :return: Le JSON de toutes les métriques
+        """
+        content = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+        return content
+
+    def to_prometheus(self, path: str=None) -> str:
+        """
+        :pre: path (optionnel) est le fichier où écrire les métriques
+        :return: Les compteurs et histogrammes au format texte de Prometheus
+        """
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                if histogram_name != name:
+                    continue
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.get_cumulative_counts()):
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        content = "\n".join(lines) + "\n"
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+        return content
+
+    def save(self, path=METRICS_PATH):
+        """
+        :pre: path finit par .json, ou par .prom/.txt pour le format Prometheus
+        :return: None
+        """
+        if path.endswith(".json"):
+            self.to_json(path)
+        else:
+            self.to_prometheus(path)
+
+    def reset(self):
+        self.__init__()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def make_key(name: str, labels: dict) -> tuple:
+    """
+    :pre: labels est un dictionnaire {nom de l'étiquette: valeur}
+    :return: La clé de la métrique : (name, couples (étiquette, valeur en str) triés)
+    """
+    if not labels:
+        return (name, ())
+    return (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+
+def format_labels(labels: tuple) -> str:
+    """
+    :pre: labels est un tuple de couples (nom, valeur)
+    :return: Les étiquettes au format Prometheus ('{status="429"}'), '' s'il n'y en a pas
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"' for name, value in labels) + "}"
+
+
+
+################################### REGISTRE GLOBAL ###################################
+
+
+
+# Registre utilisé par le harvester, le parser, semantic_tree et l'algorithme génétique
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Callable
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+CACHE_DIRECTORY = ".page_cache"
+CHECKPOINT_PATH = "harvest_checkpoint.json"
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class PageCache:
+    """
+    Cache disque des pages téléchargées. Chaque page est stockée (compressée) dans un fichier
+    dont le nom est le sha256 de son url : relancer une récolte ou re-parser les pages
+    ne refait aucune requête pour les urls déjà récupérées.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY):
+        """
+        :pre: directory est le chemin d'un dossier (créé si besoin)
+        """
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def get_path(self, url: str) -> str:
+        """
+        :pre: url est un str
+        :return: Le chemin du fichier qui contient la page (sous-dossier = 2 premiers caractères du hash)
+        """
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".html.gz")
+
+    def get(self, url: str) -> str:
+        """
+        :pre: url est un str
+        :return: Le contenu de la page en cache, None s'il n'y est pas
+        """
+        try:
+            with gzip.open(self.get_path(url), "rt", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, page_content: str):
+        """
+        Enregistre une page. L'écriture passe par un fichier temporaire pour qu'un arrêt brutal
+        ne laisse jamais de page tronquée dans le cache.
+        :pre: url et page_content sont des str
+        :return: None
+        """
+        path = self.get_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            file.write(page_content)
+        os.replace(tmp_path, path)
+
+    def fetch(self, url: str, fetch_function: Callable[[str], str]) -> str:
+        """
+        :pre: fetch_function prend une url et renvoie le contenu de la page
+        :return: Le contenu de la page, téléchargé seulement s'il n'est pas en cache
+        """
+        page_content = self.get(url)
+        if page_content is not None:
+            self.hits += 1
+            REGISTRY.increment("page_cache_lookups_total", result="hit")
+            return page_content
+        self.misses += 1
+        REGISTRY.increment("page_cache_lookups_total", result="miss")
+        page_content = fetch_function(url)
+        self.put(url, page_content)
+        return page_content
+
+    def __contains__(self, url: str):
+        return os.path.exists(self.get_path(url))
+
+
+class HarvestCheckpoint:
+    """
+    Garde la trace des pages (startPage) déjà traitées pour chaque requête,
+    afin qu'une récolte interrompue reprenne là où elle s'est arrêtée.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        """
+        :pre: path est un chemin de fichier JSON (créé au premier enregistrement)
+        """
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.content = json.load(file)
+        except FileNotFoundError:
+            self.content = {}
+
+    def get_progress(self, key: str) -> dict:
+        return self.content.setdefault(key, {"done": [], "nb_pages": None})
+
+    def get_done_pages(self, key: str) -> set[int]:
+        """
+        :pre: key identifie une récolte (voir get_key)
+        :return: L'ensemble des startPage déjà traités
+        """
+        return set(self.get_progress(key)["done"])
+
+    def is_started(self, key: str) -> bool:
+        return len(self.get_progress(key)["done"]) > 0
+
+    def is_complete(self, key: str) -> bool:
+        progress = self.get_progress(key)
+        return progress["nb_pages"] is not None and len(progress["done"]) >= progress["nb_pages"]
+
+    def set_nb_pages(self, key: str, nb_pages: int):
+        self.get_progress(key)["nb_pages"] = nb_pages
+        self.save()
+
+    def mark_done(self, key: str, start_page: int):
+        """
+        Enregistre qu'une page a été entièrement traitée (à appeler après sa sauvegarde)
+        :pre: key identifie une récolte
+        :return: None
+        """
+        progress = self.get_progress(key)
+        if start_page not in progress["done"]:
+            progress["done"].append(start_page)
+            progress["done"].sort()
+        self.save()
+
+    def reset(self, key: str):
+        """ Oublie la progression d'une récolte (les pages restent dans le cache) """
+        self.content.pop(key, None)
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.content, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    ### STATIC METHODS ###
+
+    @staticmethod
+    def get_key(first_page_url: str) -> str:
+        """
+        :pre: first_page_url est l'url de la première page de la récolte
+        :return: L'identifiant de la récolte (la requête et tous ses filtres)
+        """
+        return hashlib.sha256(first_page_url.encode("utf-8")).hexdigest()[:16]
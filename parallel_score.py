@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+from vocabulary import Vocabulary
+from semantic_tree import RequestTree
+import tree_codec
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# État de chaque processus de calcul, initialisé une seule fois par _init_worker
+_WORKER_STATE = {}
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class ParallelScorer:
+    """
+    Répartit le calcul des scores d'une population sur un pool de processus.
+    Les arbres sont envoyés par paquets au format binaire de tree_codec et les
+    vocabulaires ne sont transmis qu'une fois, à l'initialisation de chaque processus.
+    S'utilise comme une batch_score_function de generate_best_request_genetic_algorithm.
+    """
+
+    def __init__(self, score_function: Callable=None, batch_score_function: Callable=None, include_vocabulary: Vocabulary=None, exclude_vocabulary: Vocabulary=None, nb_workers: int=None, chunksize: int=None):
+        """
+        :pre: score_function ou batch_score_function est donnée et est picklable (définie au niveau d'un module).
+        include_vocabulary et exclude_vocabulary sont les vocabulaires des deux moitiés des requêtes.
+        nb_workers est le nombre de processus (tous les cœurs par défaut), chunksize le nombre d'arbres par tâche.
+        """
+        assert score_function is not None or batch_score_function is not None
+        self.nb_workers = nb_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.executor = ProcessPoolExecutor(max_workers=self.nb_workers, initializer=_init_worker, initargs=(score_function, batch_score_function, include_vocabulary, exclude_vocabulary))
+
+    def get_chunksize(self, nb_trees: int) -> int:
+        """
+        :pre: nb_trees est un int >= 0
+        :return: Le nombre d'arbres par tâche (environ 4 tâches par processus si non précisé)
+        """
+        if self.chunksize is not None:
+            return self.chunksize
+        return max(1, -(-nb_trees // (self.nb_workers * 4)))
+
+    def score_population(self, population: list[RequestTree]) -> list:
+        """
+        :pre: population est une liste de RequestTree valides
+        :return: La liste des scores, dans l'ordre de population
+        """
+        chunksize = self.get_chunksize(len(population))
+        chunks = [tree_codec.dumps_population(population[i:i+chunksize]) for i in range(0, len(population), chunksize)]
+        scores = []
+        for chunk_scores in self.executor.map(_score_chunk, chunks):
+            scores.extend(chunk_scores)
+        return scores
+
+    def close(self):
+        """ Arrête les processus du pool """
+        self.executor.shutdown()
+
+    def __call__(self, population: list[RequestTree]) -> list:
+        return self.score_population(population)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def _init_worker(score_function, batch_score_function, include_vocabulary, exclude_vocabulary):
+    _WORKER_STATE["score_function"] = score_function
+    _WORKER_STATE["batch_score_function"] = batch_score_function
+    _WORKER_STATE["include_vocabulary"] = include_vocabulary
+    _WORKER_STATE["exclude_vocabulary"] = exclude_vocabulary
+
+def _score_chunk(chunk: bytes) -> list:
+    requests = tree_codec.loads_population(chunk, _WORKER_STATE["include_vocabulary"], _WORKER_STATE["exclude_vocabulary"])
+    if _WORKER_STATE["batch_score_function"] is not None:
+        return list(_WORKER_STATE["batch_score_function"](requests))
+    score_function = _WORKER_STATE["score_function"]
+    return [score_function(request) for request in requests]
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import time
+import simplifier
+from semantic_tree import parse_request
+from vocabulary import Vocabulary
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+QUERY_CACHE_PATH = "query_cache.db"
+# Durée de validité d'une page en cache (en secondes) : les nombres de résultats ACM évoluent lentement
+DEFAULT_TTL = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    key TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    nb_results INTEGER,
+    general_infos TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_queries_fetched_at ON queries (fetched_at);
+"""
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class QueryCache:
+    """
+    Cache persistant (SQLite) des pages de résultats déjà analysées (voir extract_general_infos), indexé par
+    la forme simplifiée de la requête (voir normalize_request) et les paramètres de l'url (dates, filtres, page).
+    Deux requêtes logiquement équivalentes (opérandes permutés, termes répétés, absorption...) partagent la même entrée.
+    Une entrée plus vieille que ttl secondes est ignorée, puis remplacée au prochain téléchargement.
+    """
+
+    def __init__(self, path=QUERY_CACHE_PATH, ttl=DEFAULT_TTL):
+        """
+        :pre: path est le chemin du fichier de la base (créé si besoin), ou ":memory:". ttl > 0.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, requete: str, **params) -> str:
+        """
+        :pre: params sont les paramètres de l'url (start_page, dates, filtres...), de valeurs sérialisables en JSON
+        :return: La clé de la page : requête normalisée et paramètres triés
+        """
+        return json.dumps([normalize_request(requete), params], sort_keys=True)
+
+    def get(self, key: str) -> dict:
+        """
+        :pre: key est une sortie de get_key
+        :return: Les informations générales de la page, None si elles ne sont pas en cache ou ont expiré
+        """
+        row = self.connection.execute("SELECT general_infos FROM queries WHERE key = ? AND fetched_at >= ?", (key, time.time() - self.ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            REGISTRY.increment("query_cache_lookups_total", result="miss")
+            return None
+        self.hits += 1
+        REGISTRY.increment("query_cache_lookups_total", result="hit")
+        return json.loads(row[0])
+
+    def put(self, key: str, general_infos: dict):
+        """
+        :pre: key est une sortie de get_key, general_infos une sortie de extract_general_infos
+        :return: None
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO queries (key, request, nb_results, general_infos, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.loads(key)[0], general_infos['nb_results'], json.dumps(general_infos), time.time()),
+            )
+
+    def purge(self) -> int:
+        """
+        Supprime les entrées expirées
+        :return: Le nombre d'entrées supprimées
+        """
+        with self.connection:
+            return self.connection.execute("DELETE FROM queries WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"QueryCache(path={self.path!r}, size={len(self)}, hits={self.hits}, misses={self.misses})"
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def normalize_request(requete: str) -> str:
+    """
+    :pre: requete est une requête avec AND, OR, NOT et parenthèses
+    :return: La requête simplifiée (voir simplifier.py), en minuscules : la même pour deux requêtes équivalentes.
+    Une requête que parse_request refuse est seulement mise en minuscules, sans espaces superflus.
+    """
+    try:
+        # Le vocabulaire ne sert qu'aux altérations : inutile de charger les fichiers JSON
+        tree = parse_request(requete, Vocabulary())
+    except ValueError:
+        return " ".join(requete.lower().split())
+    return simplifier.simplify_request(tree).lower()
@@ -1,9 +1,14 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import datetime
 import time
 import csv
+import html
+import re
 from time import sleep
+from page_cache import PageCache, HarvestCheckpoint
+from metrics import REGISTRY, METRICS_PATH
+from results_store import ResultsStore
 
 # import semantic_tree as st
 
@@ -27,6 +32,18 @@ nb_max_results_to_display = 20 # Plus ce nombre est grand, plus la requête sera
 sponsorise_ACM = False
 articles_uniquement = False
 
+ACM_BASE_URL = "https://dl.acm.org"
+HTTP_CHARS = {':': '%3A', '(': '%28', ')': '%29', ' ': '+', "'": '%22', }
+
+# Seuls le nombre de résultats et les articles d'une page de résultats sont construits par BeautifulSoup
+# (le champ class est comparé en entier, d'où l'expression régulière pour les classes multiples)
+RESULTS_STRAINER = SoupStrainer(['span', 'li'], class_=re.compile(r'(^|\s)(hitsLength|search__item)(\s|$)'))
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+# Première balise utile de la page : tout ce qui la précède (scripts, styles, menus) n'a pas besoin d'être parcouru
+RESULTS_START_PATTERN = re.compile(r'<(?:span|li)\s[^>]*class="[^"]*\b(?:hitsLength|search__item)\b')
+ARTICLE_START_PATTERN = re.compile(r'<li\s[^>]*class="[^"]*\bsearch__item\b')
+LI_TAG_PATTERN = re.compile(r'<(/?)li\b', re.IGNORECASE)
+
 
 
 ################################### FUNCTIONS ###################################
@@ -34,26 +51,23 @@ articles_uniquement = False
 
 
 def timer_decorator(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"Execution time of {func.__name__}: {execution_time} seconds\n")
-        return result
-    return wrapper
+    """
+    Enregistre la durée de chaque appel de func dans l'histogramme "<nom de func>_seconds" du registre de métriques (voir metrics.py)
+    """
+    return REGISTRY.timed()(func)
 
 def get_nb_pages(nb_results, nb_results_per_page):
+    # nb_results vaut -1 quand la page n'affiche pas de nombre de résultats : seule la première page est récoltée
+    if nb_results == -1:
+        return 1
     return (nb_results // nb_results_per_page) + 1
 
-def get_page_content(url):
-    response = requests.get(url)
-    page_content = response.text
-    return page_content
-
 @timer_decorator
 def get_page_content(url):
     response = requests.get(url)
+    REGISTRY.increment("fetch_requests_total", status=response.status_code)
+    # Une page d'erreur (429, 5xx...) lève une exception : elle n'est donc jamais gardée dans le cache de pages
+    response.raise_for_status()
     page_content = response.text
     return page_content
 
@@ -68,14 +82,15 @@ def replace_http_chars(string: str, http_chars: dict[str, str]):
         string = string.replace(char, http_chars[char])
     return string
 
-def construct_ACM_url(requete: str, nb_max_results_per_page=10, start_page=0, after_month=1, after_year=2000, before_month=datetime.datetime.now().month, before_year=datetime.datetime.now().year, sponsorise_ACM=False, articles_uniquement=False, http_chars: dict[str, str]={}):
+def construct_ACM_url(requete: str, nb_max_results_per_page=10, start_page=0, after_month=1, after_year=2000, before_month=datetime.datetime.now().month, before_year=datetime.datetime.now().year, sponsorise_ACM=False, articles_uniquement=False, http_chars: dict[str, str]={}, base_url=ACM_BASE_URL):
     """ 
     Construit l'url pour faire une requête sur ACM à partir d'une requête ne contenant que les opérateurs AND, OR et NOT.
     
     :pre: requete est une string de la forme "(collaboration OR teamwork) AND (asym* or dissimilar) AND NOT (batman)"
+    base_url permet de viser un autre serveur (un serveur de test local par exemple)
     :return: l'url de la requête get tel qu'il aurait été généré par ACM DL
     """
-    base_url = f"https://dl.acm.org/action/doSearch?pageSize={nb_max_results_per_page}&fillQuickSearch=false&target=advanced&expand=dl&AfterMonth={after_month}&AfterYear={after_year}&BeforeMonth={before_month}&BeforeYear={before_year}"
+    base_url = f"{base_url}/action/doSearch?pageSize={nb_max_results_per_page}&fillQuickSearch=false&target=advanced&expand=dl&AfterMonth={after_month}&AfterYear={after_year}&BeforeMonth={before_month}&BeforeYear={before_year}"
     requete = "Abstract:(" + requete + ")"
     all_field = "&AllField="+replace_http_chars(requete, http_chars)
     if articles_uniquement:
@@ -89,15 +104,49 @@ def construct_ACM_url(requete: str, nb_max_results_per_page=10, start_page=0, af
 
 ### Récupération des infos avec BeautifulSoup4
 
-def get_general_infos(soup: BeautifulSoup):
+def find_child(element, name: str, class_name: str=None):
+    """
+    :pre: element est un élément BeautifulSoup ou None
+    :return: Le premier descendant de element de balise name (et de classe class_name), None s'il n'existe pas
+    """
+    if element is None:
+        return None
+    if class_name is None:
+        return element.find(name)
+    return element.find(name, {'class': class_name})
+
+def get_text(element, default: str) -> str:
+    return element.text if element is not None else default
+
+def get_article_infos(article_li) -> dict:
+    """
+    :pre: article_li est l'élément li.search__item d'un article
+    :return: Les informations de l'article (doi, author1, title, publisher, date, type), 'No ...' pour celles qui manquent
+    """
+    article = {}
+    info_block = find_child(article_li, 'div', 'issue-item__content')
+    title_link = find_child(find_child(article_li, 'span', 'hlFld-Title'), 'a')
+    article['doi'] = ACM_BASE_URL + title_link['href'] if title_link is not None and title_link.has_attr('href') else 'No doi'
+    author = find_child(find_child(find_child(article_li, 'span', 'hlFld-ContribAuthor'), 'a'), 'span')
+    article['author1'] = get_text(author, 'No author')
+    article['title'] = get_text(find_child(info_block, 'a'), 'No title')
+    item_detail = find_child(info_block, 'div', 'issue-item__detail')
+    article['publisher'] = get_text(find_child(item_detail, 'span'), 'No publisher')
+    item_citation = find_child(article_li, 'div', 'issue-item__citation')
+    item_citations = item_citation.find_all('div') if item_citation is not None else []
+    article['date'] = item_citations[1].text if len(item_citations) > 1 else 'No date'
+    article['type'] = item_citations[0].text if len(item_citations) > 0 else 'No type'
+    return article
+
+def get_general_infos(soup: BeautifulSoup, formatted_request: str=None):
     """
     Récupère les informations générales sur la requête
-    :pre: soup est l'objet contentant le contenu de la page
-    :return: formatted_request, nb_results (-1 si non trouvé)
+    :pre: soup est l'objet contentant le contenu de la page. formatted_request remplace le titre de la page s'il est donné.
+    :return: formatted_request, nb_results (-1 si non trouvé), articles
     """
     general_infos = {}
     # Requête au format ACM
-    general_infos['formatted_request'] = soup.title.text
+    general_infos['formatted_request'] = soup.title.text if formatted_request is None else formatted_request
     # Nombre de résultats
     nb_results = soup.find('span', {'class': 'hitsLength'})
     if nb_results is None:
@@ -106,45 +155,49 @@ def get_general_infos(soup: BeautifulSoup):
         nb_results = int(nb_results.text.replace(',', ''))
     general_infos['nb_results'] = nb_results
     # Articles
-    articles_lis = soup.find_all('li', {'class': 'search__item issue-item-container'})
-    articles = []
-    for article_li in articles_lis:
-        info_block = article_li.find('div', {'class': 'issue-item__content'})
-        article = {}
-        try:
-            article['doi'] = 'https://dl.acm.org'+article_li.find('span', {'class': 'hlFld-Title'}).a['href']
-        except:
-            article['doi'] = 'No doi'
-        try:
-            article['author1'] = article_li.find('span', {'class': 'hlFld-ContribAuthor'}).a.span.text
-        except:
-            article['author1'] = 'No author'
-        try:
-            article['title'] = info_block.find('a').text
-        except:
-            article['title'] = 'No title'
-        
-        item_detail = info_block.find('div', {'class': 'issue-item__detail'})
-        try:
-            article['publisher'] = item_detail.find('span').text
-        except:
-            article['publisher'] = 'No publisher'
-
-        item_citations = article_li.find('div', {'class': 'issue-item__citation'}).find_all('div')
-        try:
-            article['date'] = item_citations[1].text
-        except:
-            article['date'] = 'No date'
-        try:
-            article['type'] = item_citations[0].text
-        except:
-            article['type'] = 'No date'
-
-        articles.append(article)
-    general_infos['articles'] = articles
+    articles_lis = soup.find_all('li', {'class': 'search__item'})
+    general_infos['articles'] = [get_article_infos(article_li) for article_li in articles_lis]
 
     return general_infos
 
+def get_results_content(page_content: str) -> str:
+    """
+    Délimite la partie d'une page de résultats qui contient le nombre de résultats et les articles,
+    sans analyser le HTML (recherche de motifs uniquement).
+    :pre: page_content est le code HTML d'une page de résultats ACM
+    :return: Le code HTML qui va de la première balise utile à la fin du dernier article ('' s'il n'y en a aucune)
+    """
+    results_start = RESULTS_START_PATTERN.search(page_content)
+    if results_start is None:
+        return ''
+    last_article = None
+    for last_article in ARTICLE_START_PATTERN.finditer(page_content, results_start.start()):
+        pass
+    if last_article is None:
+        return page_content[results_start.start():]
+    # Fin du dernier article : balise </li> qui ferme son <li> (listes imbriquées comprises).
+    # Si elle n'est pas trouvée (balises </li> omises), on garde toute la fin de la page.
+    depth = 0
+    for li_tag in LI_TAG_PATTERN.finditer(page_content, last_article.start()):
+        depth += -1 if li_tag.group(1) else 1
+        if depth == 0:
+            return page_content[results_start.start():page_content.find('>', li_tag.end()) + 1]
+    return page_content[results_start.start():]
+
+@timer_decorator
+def extract_general_infos(page_content: str):
+    """
+    Même résultat que get_general_infos(BeautifulSoup(page_content, 'html.parser')), mais seuls le nombre de résultats
+    et les articles sont analysés (voir get_results_content), et seuls leurs éléments sont construits en arbre.
+    :pre: page_content est le code HTML d'une page de résultats ACM
+    :return: formatted_request, nb_results (-1 si non trouvé), articles
+    """
+    title = TITLE_PATTERN.search(page_content)
+    soup = BeautifulSoup(get_results_content(page_content), 'html.parser', parse_only=RESULTS_STRAINER)
+    general_infos = get_general_infos(soup, html.unescape(title.group(1)) if title is not None else '')
+    REGISTRY.increment("articles_parsed_total", len(general_infos['articles']))
+    return general_infos
+
 def display_general_infos(general_infos: dict):
     for article in general_infos['articles']:
         print(f"{article['title']} ===> {article['author1']} ===> {article['date']}")
@@ -156,7 +209,7 @@ def save_general_infos(general_infos: dict, path: str, mode='w'):
     with open(path, mode, newline='', encoding='utf-8') as file:
         csv_writer = csv.writer(file)
         if mode == 'w':
-            csv_writer.writerow(['Title', 'Author1', 'Date', 'Publisher', 'DOI'])
+            csv_writer.writerow(['Title', 'Author1', 'Date', 'Publisher', 'DOI', 'Type'])
         for article in general_infos['articles']:
             csv_writer.writerow([article['title'], article['author1'], article['date'], article['publisher'], article['doi'], article['type']])
 
@@ -176,35 +229,60 @@ def save_general_infos(general_infos: dict, path: str, mode='w'):
 
 
 
-# url construction
-http_chars = {':': '%3A', '(': '%28', ')': '%29', ' ': '+', "'": '%22', }
-url = construct_ACM_url(requete=requete, nb_max_results_per_page=nb_max_results_to_display, after_month=after_month, after_year=after_year, before_month=before_month, before_year=before_year, sponsorise_ACM=sponsorise_ACM, articles_uniquement=articles_uniquement, http_chars=http_chars)
-print(requete)
-print(url)
-
-# récupération du contenu de la page
-page_content = get_page_content(url)
-soup = BeautifulSoup(page_content, 'html.parser')
-
-# récupération des infos générales
-general_infos = get_general_infos(soup)
-display_general_infos(general_infos)
-save_general_infos(general_infos, 'articles2.csv', mode='w')
-
-for i in range(1, get_nb_pages(general_infos['nb_results'], nb_max_results_to_display)):
-    url = construct_ACM_url(requete=requete, nb_max_results_per_page=nb_max_results_to_display, start_page=i, after_month=after_month, after_year=after_year, before_month=before_month, before_year=before_year, sponsorise_ACM=sponsorise_ACM, articles_uniquement=articles_uniquement, http_chars=http_chars)
+if __name__ == "__main__":
+    # url construction
+    http_chars = HTTP_CHARS
+    url = construct_ACM_url(requete=requete, nb_max_results_per_page=nb_max_results_to_display, after_month=after_month, after_year=after_year, before_month=before_month, before_year=before_year, sponsorise_ACM=sponsorise_ACM, articles_uniquement=articles_uniquement, http_chars=http_chars)
+    print(requete)
     print(url)
-    page_content = get_page_content(url)
-    soup = BeautifulSoup(page_content, 'html.parser')
-    general_infos = get_general_infos(soup)
-    display_general_infos(general_infos)
-    save_general_infos(general_infos, 'articles2.csv', 'a')
-    sleep(30)
-
-# included_node = st.Node("collaboration", [], st.INCLUDED_VOCABULARY)
-# excluded_node = st.Node("batman", [], st.EXCLUDED_VOCABULARY)
-# initial_request = st.RequestTree(included_node, excluded_node)
-# req = st.generate_best_request_genetic_algorithm(calculate_request_score, initial_request, nb_generations=25, population_size=100)
+
+    # Les pages téléchargées sont gardées en cache et les pages traitées sont notées dans un checkpoint :
+    # si le script s'arrête, le relancer reprend à la première page non traitée
+    page_cache = PageCache()
+    checkpoint = HarvestCheckpoint()
+    # Les articles sont enregistrés dans une base SQLite, une transaction par page (voir results_store.py)
+    results_store = ResultsStore()
+    harvest_key = HarvestCheckpoint.get_key(url)
+    if checkpoint.is_complete(harvest_key):
+        # Récolte déjà terminée : on la rejoue entièrement depuis le cache (aucune requête)
+        checkpoint.reset(harvest_key)
+    done_pages = checkpoint.get_done_pages(harvest_key)
+
+    # récupération du contenu de la page
+    page_content = page_cache.fetch(url, get_page_content)
+
+    # récupération des infos générales
+    general_infos = extract_general_infos(page_content)
+    nb_pages = get_nb_pages(general_infos['nb_results'], nb_max_results_to_display)
+    checkpoint.set_nb_pages(harvest_key, nb_pages)
+    if 0 not in done_pages:
+        display_general_infos(general_infos)
+        results_store.save_general_infos(general_infos)
+        checkpoint.mark_done(harvest_key, 0)
+
+    for i in range(1, nb_pages):
+        if i in done_pages:
+            continue
+        url = construct_ACM_url(requete=requete, nb_max_results_per_page=nb_max_results_to_display, start_page=i, after_month=after_month, after_year=after_year, before_month=before_month, before_year=before_year, sponsorise_ACM=sponsorise_ACM, articles_uniquement=articles_uniquement, http_chars=http_chars)
+        print(url)
+        was_cached = url in page_cache
+        page_content = page_cache.fetch(url, get_page_content)
+        general_infos = extract_general_infos(page_content)
+        display_general_infos(general_infos)
+        results_store.save_general_infos(general_infos)
+        checkpoint.mark_done(harvest_key, i)
+        # On ne fait une pause que si la page a réellement été téléchargée
+        if not was_cached:
+            sleep(30)
+
+    results_store.close()
+    # Durées des téléchargements et du parsing, nombre de requêtes par code HTTP... (voir metrics.py)
+    REGISTRY.save(METRICS_PATH)
+
+    # included_node = st.Node("collaboration", [], st.INCLUDED_VOCABULARY)
+    # excluded_node = st.Node("batman", [], st.EXCLUDED_VOCABULARY)
+    # initial_request = st.RequestTree(included_node, excluded_node)
+    # req = st.generate_best_request_genetic_algorithm(calculate_request_score, initial_request, nb_generations=25, population_size=100)
 
 """
 TODO :
@@ -0,0 +1,268 @@
+import csv
+import datetime
+import re
+import sqlite3
+from typing import Iterator
+from dedupe import normalize_doi, normalize_text, get_last_name
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+STORE_PATH = "articles.db"
+
+# Valeurs mises par get_general_infos quand une information manque
+MISSING_VALUES = {"No doi", "No author", "No title", "No publisher", "No date", "No type"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    doi TEXT UNIQUE,
+    fallback_key TEXT,
+    title TEXT,
+    author1 TEXT,
+    date TEXT,
+    year INTEGER,
+    venue TEXT,
+    type TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_year ON articles (year);
+CREATE INDEX IF NOT EXISTS idx_articles_venue ON articles (venue);
+CREATE INDEX IF NOT EXISTS idx_articles_author1 ON articles (author1);
+"""
+
+# Les articles sans DOI sont identifiés par leur titre normalisé, leur année et le nom de leur 1er auteur (voir get_fallback_key).
+# L'index est créé après la migration des anciennes bases (voir ResultsStore.migrate)
+FALLBACK_KEY_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_fallback_key ON articles (fallback_key)"
+
+# Une information manquante dans la nouvelle version ne remplace pas l'ancienne
+UPDATE_MISSING = """
+    title = COALESCE(excluded.title, title),
+    author1 = COALESCE(excluded.author1, author1),
+    date = COALESCE(excluded.date, date),
+    year = COALESCE(excluded.year, year),
+    venue = COALESCE(excluded.venue, venue),
+    type = COALESCE(excluded.type, type),
+    updated_at = excluded.updated_at
+"""
+
+# Upsert sur le DOI, ou sur la clé de repli pour les articles sans DOI (qui n'ont jamais les deux)
+UPSERT = f"""
+INSERT INTO articles (doi, fallback_key, title, author1, date, year, venue, type, updated_at)
+VALUES (:doi, :fallback_key, :title, :author1, :date, :year, :venue, :type, :updated_at)
+ON CONFLICT (doi) DO UPDATE SET {UPDATE_MISSING}
+ON CONFLICT (fallback_key) DO UPDATE SET {UPDATE_MISSING}
+"""
+
+
+#################################### CLASSES ####################################
+
+
+
+class ResultsStore:
+    """
+    Base SQLite des articles récoltés : une transaction par page, une ligne par DOI (upsert),
+    et des index sur le DOI, l'année, la conférence (venue) et le 1er auteur pour les requêtes.
+    Un article sans DOI a une seule ligne par titre, année et 1er auteur ; sans DOI ni titre, il n'est pas enregistré.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        """
+        :pre: path est le chemin du fichier de la base (créé si besoin), ou ":memory:"
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.migrate()
+
+    def migrate(self):
+        """
+        Ajoute la clé de repli aux bases créées avant elle et fusionne leurs doublons sans DOI (la plus ancienne ligne est gardée)
+        :pre: -
+        :return: None
+        """
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(articles)")}
+        with self.connection:
+            if "fallback_key" not in columns:
+                self.connection.execute("ALTER TABLE articles ADD COLUMN fallback_key TEXT")
+                rows = self.connection.execute("SELECT id, title, author1, year FROM articles WHERE doi IS NULL").fetchall()
+                self.connection.executemany("UPDATE articles SET fallback_key = ? WHERE id = ?", [(get_fallback_key(row["title"], row["author1"], row["year"]), row["id"]) for row in rows])
+                self.connection.execute("DELETE FROM articles WHERE fallback_key IS NOT NULL AND id NOT IN (SELECT MIN(id) FROM articles WHERE fallback_key IS NOT NULL GROUP BY fallback_key)")
+            self.connection.execute(FALLBACK_KEY_INDEX)
+
+    ### ÉCRITURE ###
+
+    def save_articles(self, articles: list[dict]) -> int:
+        """
+        Enregistre des articles (au format de get_general_infos) en une seule transaction
+        :pre: articles est une liste de dictionnaires avec les clés doi, title, author1, date, publisher, type
+        :return: Le nombre d'articles enregistrés (ceux sans DOI ni titre sont ignorés)
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = [to_row(article, now) for article in articles]
+        rows = [row for row in rows if row['doi'] is not None or row['fallback_key'] is not None]
+        with self.connection:
+            self.connection.executemany(UPSERT, rows)
+        return len(rows)
+
+    def save_general_infos(self, general_infos: dict) -> int:
+        """
+        :pre: general_infos est une sortie de get_general_infos (une page de résultats)
+        :return: Le nombre d'articles enregistrés
+        """
+        return self.save_articles(general_infos['articles'])
+
+    def import_csv(self, path: str) -> int:
+        """
+        Importe un fichier écrit par save_general_infos (Title, Author1, Date, Publisher, DOI[, Type])
+        :return: Le nombre d'articles importés
+        """
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            articles = [{'title': row[0], 'author1': row[1], 'date': row[2], 'publisher': row[3], 'doi': row[4], 'type': row[5] if len(row) > 5 else None} for row in reader if len(row) >= 5]
+        return self.save_articles(articles)
+
+    ### LECTURE ###
+
+    def get_article(self, doi: str) -> dict:
+        """
+        :pre: doi est un DOI (avec ou sans préfixe d'url)
+        :return: L'article, None s'il n'est pas dans la base
+        """
+        row = self.connection.execute("SELECT * FROM articles WHERE doi = ?", (normalize_doi(doi),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def build_query(self, select: str, after_year: int=None, before_year: int=None, venue: str=None, author1: str=None) -> tuple[str, list]:
+        """
+        :pre: venue est un préfixe de conférence ("CHI PLAY"), author1 le 1er auteur exact
+        :return: La requête SQL et ses paramètres
+        """
+        conditions, parameters = [], []
+        if after_year is not None:
+            conditions.append("year >= ?")
+            parameters.append(after_year)
+        if before_year is not None:
+            conditions.append("year <= ?")
+            parameters.append(before_year)
+        if venue is not None:
+            # Comparaison par intervalle plutôt que LIKE pour que l'index sur venue soit utilisé
+            conditions.append("venue >= ? AND venue < ?")
+            parameters += [venue, venue + "\U0010ffff"]
+        if author1 is not None:
+            conditions.append("author1 = ?")
+            parameters.append(author1)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return f"SELECT {select} FROM articles{where}", parameters
+
+    def iter_articles(self, **filters) -> Iterator[dict]:
+        """
+        :pre: filters sont les filtres de build_query
+        :return: Un itérateur sur les articles correspondants
+        """
+        query, parameters = self.build_query("*", **filters)
+        for row in self.connection.execute(query + " ORDER BY year, id", parameters):
+            yield dict(row)
+
+    def count(self, **filters) -> int:
+        """
+        :pre: filters sont les filtres de build_query
+        :return: Le nombre d'articles correspondants
+        """
+        query, parameters = self.build_query("COUNT(*)", **filters)
+        return self.connection.execute(query, parameters).fetchone()[0]
+
+    def get_dois(self, **filters) -> set[str]:
+        """
+        :pre: filters sont les filtres de build_query
+        :return: Les DOI des articles correspondants
+        """
+        query, parameters = self.build_query("doi", **filters)
+        return {row[0] for row in self.connection.execute(query, parameters) if row[0] is not None}
+
+    def export_csv(self, path: str) -> int:
+        """
+        Écrit toute la base au format de save_general_infos
+        :return: Le nombre d'articles écrits
+        """
+        nb_written = 0
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(['Title', 'Author1', 'Date', 'Publisher', 'DOI', 'Type'])
+            for article in self.iter_articles():
+                writer.writerow([article['title'], article['author1'], article['date'], article['venue'], article['doi'], article['type']])
+                nb_written += 1
+        return nb_written
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def clean_value(value: str) -> str:
+    """
+    :return: value sans espaces superflus, None si elle est vide ou vaut 'No ...'
+    """
+    if value is None:
+        return None
+    value = " ".join(value.split())
+    return None if value == "" or value in MISSING_VALUES else value
+
+def get_year(date: str) -> int:
+    """
+    :pre: date est une date ACM ("October 2019") ou None
+    :return: L'année, None si elle n'est pas trouvée
+    """
+    year = re.search(r"\d{4}", date) if date else None
+    return int(year.group(0)) if year is not None else None
+
+def get_fallback_key(title: str, author1: str, year: int) -> str:
+    """
+    :pre: title, author1 et year sont des valeurs de la table articles (éventuellement None)
+    :return: La clé d'un article sans DOI : titre normalisé, année et nom du 1er auteur. None si le titre est vide.
+    """
+    title = normalize_text(title)
+    if not title:
+        return None
+    return f"{title}|{year or ''}|{get_last_name(author1)}"
+
+def to_row(article: dict, updated_at: str) -> dict:
+    """
+    :pre: article est un article au format de get_general_infos
+    :return: Les valeurs de la ligne de la table articles
+    """
+    date = clean_value(article.get('date'))
+    doi = normalize_doi(clean_value(article.get('doi')))
+    title = clean_value(article.get('title'))
+    author1 = clean_value(article.get('author1'))
+    year = get_year(date)
+    return {
+        'doi': doi,
+        'fallback_key': get_fallback_key(title, author1, year) if doi is None else None,
+        'title': title,
+        'author1': author1,
+        'date': date,
+        'year': year,
+        'venue': clean_value(article.get('publisher')),
+        'type': clean_value(article.get('type')),
+        'updated_at': updated_at,
+    }
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Callable
+from semantic_tree import canonical_form
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class ScoreCache:
+    """
+    Cache LRU des scores de requêtes, indexé par la forme canonique des arbres :
+    deux requêtes qui ne diffèrent que par l'ordre des opérandes d'un AND/OR
+    ou par des termes répétés ne sont évaluées qu'une seule fois.
+    La forme canonique ne garde que le sens logique de l'arbre (ni sa taille, ni sa structure) : avec la clé
+    par défaut, le score ne doit dépendre que de ce sens. Sinon, key_function doit garder ce dont il dépend
+    (canonical_form_and_size pour un score pénalisé par la taille).
+    """
+
+    def __init__(self, score_function: Callable=None, batch_score_function: Callable=None, maxsize=10000, key_function: Callable=canonical_form):
+        """
+        :pre: score_function prend un arbre et renvoie un score. batch_score_function (optionnelle) prend une liste d'arbres et renvoie la liste des scores.
+        Au moins l'une des deux est donnée. maxsize est un int > 0.
+        key_function prend un arbre et renvoie une clé hashable ; deux arbres de même clé doivent avoir le même score.
+        """
+        assert score_function is not None or batch_score_function is not None
+        assert maxsize > 0
+        self.score_function = score_function
+        self.batch_score_function = batch_score_function
+        self.maxsize = maxsize
+        self.key_function = key_function
+        self.scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        :pre: key est une clé produite par key_function
+        :return: Le score en cache, None s'il est absent
+        """
+        score = self.scores.get(key)
+        if score is not None:
+            self.scores.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        """
+        Ajoute un score au cache en évinçant le moins récemment utilisé si nécessaire.
+        :pre: key est une clé produite par key_function
+        :return: None
+        """
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        if len(self.scores) > self.maxsize:
+            self.scores.popitem(last=False)
+            self.evictions += 1
+
+    def score(self, tree):
+        """
+        :pre: tree est une Node valide
+        :return: Le score de tree (calculé seulement s'il n'est pas en cache)
+        """
+        key = self.key_function(tree)
+        score = self.get(key)
+        if score is not None:
+            self.hits += 1
+            return score
+        self.misses += 1
+        if self.score_function is not None:
+            score = self.score_function(tree)
+        else:
+            score = self.batch_score_function([tree])[0]
+        self.put(key, score)
+        return score
+
+    def score_population(self, population: list) -> list:
+        """
+        Calcule les scores d'une population. Avec une fonction par lot, seuls les
+        arbres absents du cache (et distincts entre eux) sont envoyés en un seul appel.
+        :pre: population est une liste de Node valides
+        :return: La liste des scores, dans l'ordre de population
+        """
+        if self.batch_score_function is None:
+            return [self.score(tree) for tree in population]
+        keys = [self.key_function(tree) for tree in population]
+        scores = [self.get(key) for key in keys]
+        missing = {}
+        for i, score in enumerate(scores):
+            if score is None:
+                missing.setdefault(keys[i], i)
+            else:
+                self.hits += 1
+        self.hits += scores.count(None) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = self.batch_score_function([population[i] for i in missing.values()])
+            for key, score in zip(missing.keys(), computed):
+                self.put(key, score)
+            computed = dict(zip(missing.keys(), computed))
+            scores = [computed[key] if score is None else score for key, score in zip(keys, scores)]
+        return scores
+
+    def clear(self):
+        """ Vide le cache et remet les compteurs à zéro """
+        self.scores.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def get_hit_rate(self) -> float:
+        """
+        :pre: -
+        :return: La proportion d'appels servis par le cache
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __call__(self, tree):
+        return self.score(tree)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __repr__(self):
+        return f"ScoreCache(size={len(self)}/{self.maxsize}, hits={self.hits}, misses={self.misses}, evictions={self.evictions}, hit_rate={self.get_hit_rate():.1%})"
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def canonical_form_and_size(tree) -> tuple:
+    """
+    Clé de ScoreCache pour un score qui dépend aussi de la taille de l'arbre (pénalité par nœud par exemple)
+    :pre: tree est une Node valide
+    :return: La forme canonique de tree et son nombre de nœuds
+    """
+    return canonical_form(tree), len(tree)
@@ -1,8 +1,10 @@
+import os
 import random
+import re
 from vocabulary import Vocabulary
-from colorama import Fore
-import sympy as sp
 from typing import Callable
+import simplifier
+from metrics import REGISTRY
 
 
 
@@ -11,15 +13,23 @@ from typing import Callable
 
 
 ### VOCABULARY ###
-INCLUDED_VOCABULARY:Vocabulary = Vocabulary.load("data/included_vocabulary.json")
-EXCLUDED_VOCABULARY:Vocabulary = Vocabulary.load("data/excluded_vocabulary.json")
-# Merge dictionaries into one
-VOCABULARY = INCLUDED_VOCABULARY + EXCLUDED_VOCABULARY
+# INCLUDED_VOCABULARY, EXCLUDED_VOCABULARY et VOCABULARY (leur fusion) ne sont chargés qu'au premier accès (voir __getattr__)
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+VOCABULARY_PATHS = {
+    "INCLUDED_VOCABULARY": os.path.join(DATA_DIRECTORY, "included_vocabulary.json"),
+    "EXCLUDED_VOCABULARY": os.path.join(DATA_DIRECTORY, "excluded_vocabulary.json"),
+}
+
+### PARSING ###
+# Parenthèse, terme entre guillemets ou mot (opérateur compris)
+REQUEST_TOKEN_PATTERN = re.compile(r'\s*(?:([()])|"([^"]*)"|([^\s()"]+))')
 
 ### PROBABILITIES ###
 KEEP_SIMILAR_WORD_PROBA = 0.7
 ALTER_STRUCTURE_PROBA = 0.5
 GROW_PROBA = 0.5
+# Part des nouveaux individus de chaque génération obtenus par croisement de deux parents (les autres sont des copies)
+CROSSOVER_PROBA = 0.3
 
 
 
@@ -28,16 +38,25 @@ GROW_PROBA = 0.5
 
 
 class Node:
-    """ Un nœud de l'arbre syntaxique """
+    """
+    Un nœud de l'arbre syntaxique.
+    cache garde le résultat de la dernière évaluation du sous-arbre (voir CorpusIndex.evaluate) : il est remis à None
+    sur tout le chemin de la racine au nœud modifié par alter_random_node, et conservé par copy.
+    Une modification directe d'un nœud (alter_value, alter_structure...) doit être suivie de invalidate_path.
+    """
+
+    __slots__ = ("value", "children", "vocabulary", "cache")
 
     def __init__(self, value, children: list, vocabulary: Vocabulary):
         """
-        :pre: value est un str ou un int. children est une liste de Node. Le nœud résultant est valide.
+        :pre: value est un str ou un int. children est une liste de Node valides. Le nœud résultant est valide.
         """
         self.value = value
         self.children = children
         self.vocabulary = vocabulary
-        assert self.is_valid()
+        self.cache = None
+        # Les enfants sont déjà valides : il suffit de vérifier le nœud lui-même
+        assert self.is_locally_valid()
 
     def is_leaf(self):
         """
@@ -58,6 +77,13 @@ class Node:
         else:
             return False
 
+    def is_locally_valid(self):
+        """
+        :pre: -
+        :return: True si le nœud lui-même (sans ses enfants) est valide. False sinon.
+        """
+        return self.is_leaf() or self.is_operation()
+
     def is_valid(self):
         """
         :pre: -
@@ -81,15 +107,15 @@ class Node:
         if self.is_leaf():
             # On choisit aléatoirement soit un synonyme
             if random.random() < KEEP_SIMILAR_WORD_PROBA:
-                self.value = random.choice(list(self.vocabulary.get_similar_words(self.value)))
+                self.value = self.vocabulary.sample_synonym(self.value)
             # Soit un mot aléatoire
             else:
                 # On choisit un mot différent du vocabulaire
-                self.value = random.choice([word for word in self.vocabulary.get_words() if word != self.value])
+                self.value = self.vocabulary.sample_other(self.value)
         # Si le nœud est une opération, on l'inverse
         else:
             self.value = "AND" if self.value == "OR" else "OR"
-        assert self.is_valid()
+        assert self.is_locally_valid()
     
     def alter_structure(self, grow_proba=GROW_PROBA, log=False):
         """
@@ -100,7 +126,7 @@ class Node:
         # Si le nœud est une feuille, on le remplace par une opération
         if self.is_leaf():
             # Le 1er enfant est l'ancienne valeur et le second est mot aléatoire différent de la valeur
-            self.children = [Node(self.value, [], self.vocabulary), Node(random.choice([word for word in self.vocabulary.get_words() if word != self.value]), [], self.vocabulary)]
+            self.children = [Node(self.value, [], self.vocabulary), Node(self.vocabulary.sample_other(self.value), [], self.vocabulary)]
             self.value = random.choice(["AND", "OR"])
             if log:
                 print("Growing...")
@@ -110,7 +136,7 @@ class Node:
             if random.random() < grow_proba:
                 if log:
                     print("Growing...")
-                self.children = [Node(self.value, self.children, self.vocabulary), Node(random.choice([word for word in self.vocabulary.get_words() if word != self.value]), [], self.vocabulary)]
+                self.children = [Node(self.value, self.children, self.vocabulary), Node(self.vocabulary.sample_other(self.value), [], self.vocabulary)]
                 self.value = random.choice(["AND", "OR"])
             
             # On a une proba qu'il rétrécisse
@@ -121,7 +147,7 @@ class Node:
                     print("Child to keep:", child_to_keep)
                 self.children = child_to_keep.children
                 self.value = child_to_keep.value
-        assert self.is_valid()
+        assert self.is_locally_valid()
     
     def get_all_nodes(self):
         """
@@ -139,23 +165,52 @@ class Node:
             return self
         return random.choice(self.get_all_nodes())
 
+    def get_random_path(self):
+        """
+        Tire un nœud comme get_random_node (même loi et même consommation du générateur aléatoire)
+        :pre: -
+        :return: La liste des nœuds de la racine (self) au nœud tiré
+        """
+        if self.is_leaf():
+            return [self]
+        # Parcours préfixe, dans le même ordre que get_all_nodes, en gardant le parent de chaque nœud
+        nodes, parents = [], []
+        stack = [(self, -1)]
+        while stack:
+            node, parent = stack.pop()
+            parents.append(parent)
+            nodes.append(node)
+            position = len(nodes) - 1
+            stack.extend((child, position) for child in reversed(node.children))
+        position = random.choice(range(len(nodes)))
+        path = []
+        while position != -1:
+            path.append(nodes[position])
+            position = parents[position]
+        path.reverse()
+        return path
+
     def alter_random_node(self, structure_proba=ALTER_STRUCTURE_PROBA, log=False):
         """
         Modifie aléatoirement un nœud de l'arbre
         :pre: -
         :return: None
         """
-        node = self.get_random_node()
+        path = self.get_random_path()
+        node = path[-1]
         if log:
             print(f"Altering node [{node}]...")
         if random.random() < structure_proba:
             node.alter_structure(log=log)
+            REGISTRY.increment("tree_alterations_total", kind="structure")
             if log:
                 print(f"Altered structure...")
         else:
             node.alter_value()
+            REGISTRY.increment("tree_alterations_total", kind="value")
             if log:
                 print(f"Altered value...")
+        invalidate_path(path)
 
     def to_request(self):
         """
@@ -172,24 +227,33 @@ class Node:
                 return f"NOT {self.children[0].to_request()}"
             return f"({self.children[0].to_request()} {self.value} {self.children[1].to_request()})"
     
-    def get_sympy_symbols(self) -> dict[str, sp.Symbol]:
+    def get_sympy_symbols(self) -> "dict[str, sp.Symbol]":
         """
         :pre: -
         :return: Un dictionnaire de tous les termes de l'arbre et de leur équivalent en symboles sympy
         """
+        import sympy as sp
         symbols = {}
         for node in self.get_all_nodes():
             if node.is_leaf():
                 symbols[node.value] = sp.symbols(node.value.replace(" ", "_"))
         return symbols
 
-    def get_simplified_request(self):
+    @REGISTRY.timed("simplification_seconds")
+    def get_simplified_request(self, use_sympy=False):
         """
         :pre: -
-        :return: La requête correspondant à l'arbre, simplifiée
+        :return: La requête correspondant à l'arbre, simplifiée (voir simplifier.py).
+        Si use_sympy, on passe par la forme normale conjonctive de sympy, exponentielle en le nombre de termes.
         """
+        if not use_sympy:
+            return simplifier.simplify_request(self)
+        import sympy as sp
         sympy_tree = to_sympy(self)
         simplified_sympy = sp.to_cnf(sympy_tree, simplify=True, force=True)
+        if simplified_sympy in (sp.true, sp.false):
+            # Requête toujours vraie ou toujours fausse : pas de forme simplifiée (voir simplifier.simplify_request)
+            return self.to_request()
         return sympy_to_request(simplified_sympy)
 
     def copy(self):
@@ -197,7 +261,9 @@ class Node:
         :pre: -
         :return: Une copie de l'arbre
         """
-        return unserialize(serialize(self), self.vocabulary)
+        node = Node(self.value, [child.copy() for child in self.children], self.vocabulary)
+        node.cache = self.cache
+        return node
 
     def __repr__(self):
         """ Donne une représentation textuelle et visuelle de l'arbre, pour le debugging """
@@ -233,6 +299,9 @@ class RequestTree(Node):
     Arbre dont l'opération est un AND et qui ne contient qu'un seul
     "NOT" à la racine du 2ème enfant.
     """
+
+    __slots__ = ()
+
     def __init__(self, initial_included_node:Node, initial_excluded_node:Node):
         super().__init__("AND", [initial_included_node, Node("NOT", [initial_excluded_node], initial_excluded_node.vocabulary)], initial_included_node.vocabulary + initial_excluded_node.vocabulary)
         # Remarque : Le vocabulaire est de cet arbre n'a pas vraiment d'intérêt
@@ -253,34 +322,42 @@ class RequestTree(Node):
         :return: None
         """
         # Sélection d'un nœud aléatoire
-        node = self.get_random_node()
-        while node.value == "NOT": # On évite de modifier le NOT
-            node = self.get_random_node()
+        path = self.get_random_path()
+        while path[-1].value == "NOT": # On évite de modifier le NOT
+            path = self.get_random_path()
+        node = path[-1]
         if log:
             print(f"Altering node [{node}]...")
         # Si le nœud est la racine, on n'autorise que le changement de valeur
         if node==self:
             node.alter_value()
+            REGISTRY.increment("tree_alterations_total", kind="root")
             if log:
                 print(f"Altered value...")
         # Sinon, on autorise la modification de la valeur ou de la structure
         elif random.random() < structure_proba:
             node.alter_structure(log=log)
+            REGISTRY.increment("tree_alterations_total", kind="structure")
             if log:
                 print(f"Altered structure...")
         else:
             node.alter_value()
+            REGISTRY.increment("tree_alterations_total", kind="value")
             if log:
                 print(f"Altered value...")
+        invalidate_path(path)
 
     def to_colored_request(self):
         """
         Renvoie la requête correspondant à l'arbre.
         Affiche la partie "NOT" en rouge et la partie "AND" en vert.
         """
+        from colorama import Fore
         return Fore.GREEN + self.children[0].to_request() + Fore.BLUE + f" {self.value} " + Fore.RED + self.children[1].to_request() + Fore.RESET
 
     def apply_alterations(self, nb_alterations=100, log=False):
+        if log:
+            from colorama import Fore
         for i in range(nb_alterations):
             if log:
                 print("\n\n------------------------------"+Fore.YELLOW+f"Requête {i+1}"+Fore.RESET+"------------------------------")
@@ -292,8 +369,40 @@ class RequestTree(Node):
                 print(f"{self}")
                 print("------------------------------"+Fore.YELLOW+f"Requête {i+1}"+Fore.RESET+"------------------------------")
 
+    def get_half_path(self, num_half: int):
+        """
+        Tire un nœud de l'une des deux moitiés (0 : inclusion, 1 : exclusion) comme get_random_path
+        :return: La liste des nœuds de la racine de la requête au nœud tiré
+        """
+        if num_half == 0:
+            return [self] + self.get_include_tree().get_random_path()
+        return [self, self.children[1]] + self.get_exclude_tree().get_random_path()
+
+    def crossover(self, other: "RequestTree"):
+        """
+        Échange un sous-arbre aléatoire de self avec un sous-arbre aléatoire de other, pris dans la même moitié
+        (inclusion ou exclusion) : chaque moitié garde son vocabulaire et le NOT reste à sa place.
+        :pre: self et other sont des RequestTree valides distinctes (modifiées toutes les deux)
+        :return: None
+        """
+        num_half = random.randint(0, 1)
+        path, other_path = self.get_half_path(num_half), other.get_half_path(num_half)
+        node, other_node = path[-1], other_path[-1]
+        # On échange le contenu des deux nœuds plutôt que les nœuds : leurs parents n'ont pas à être modifiés.
+        # Chaque sous-arbre garde son résultat en cache, seuls les ancêtres sont invalidés.
+        node.value, other_node.value = other_node.value, node.value
+        node.children, other_node.children = other_node.children, node.children
+        node.cache, other_node.cache = other_node.cache, node.cache
+        invalidate_path(path[:-1])
+        invalidate_path(other_path[:-1])
+        REGISTRY.increment("tree_crossovers_total")
+
     def copy(self):
-        return RequestTree(self.get_include_tree().copy(), self.get_exclude_tree().copy())
+        request = RequestTree(self.get_include_tree().copy(), self.get_exclude_tree().copy())
+        request.value = self.value
+        request.cache = self.cache
+        request.children[1].cache = self.children[1].cache
+        return request
 
     def __str__(self):
         return self.to_colored_request()
@@ -304,57 +413,194 @@ class RequestTree(Node):
 
 
 
+def get_vocabulary(name: str) -> Vocabulary:
+    """
+    Charge un vocabulaire une seule fois, au premier accès
+    :pre: name vaut "INCLUDED_VOCABULARY", "EXCLUDED_VOCABULARY" ou "VOCABULARY"
+    :return: Le vocabulaire
+    """
+    vocabulary = globals().get(name)
+    if vocabulary is None:
+        if name == "VOCABULARY":
+            vocabulary = get_vocabulary("INCLUDED_VOCABULARY") + get_vocabulary("EXCLUDED_VOCABULARY")
+        else:
+            vocabulary = Vocabulary.load(VOCABULARY_PATHS[name])
+        globals()[name] = vocabulary
+    return vocabulary
+
+def __getattr__(name: str):
+    """ semantic_tree.INCLUDED_VOCABULARY, EXCLUDED_VOCABULARY et VOCABULARY sont chargés au premier accès """
+    if name in VOCABULARY_PATHS or name == "VOCABULARY":
+        return get_vocabulary(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def invalidate_path(path: list[Node]):
+    """
+    Invalide les résultats gardés en cache après la modification du dernier nœud de path
+    :pre: path est la liste des nœuds de la racine au nœud modifié (voir get_random_path)
+    :return: None
+    """
+    for node in path:
+        node.cache = None
+
+def tokenize_request(request: str) -> list[tuple[str, str]]:
+    """
+    :pre: request est un str
+    :return: La liste des lexèmes (type, valeur), de type "(", ")", "OP" (AND, OR, NOT) ou "TERM"
+    """
+    tokens = []
+    position = 0
+    request = request.rstrip()
+    while position < len(request):
+        match = REQUEST_TOKEN_PATTERN.match(request, position)
+        if match is None:
+            raise ValueError(f"Requête invalide à la position {position} : {request[position:position+20]!r}")
+        parenthesis, quoted, word = match.groups()
+        if parenthesis is not None:
+            tokens.append((parenthesis, parenthesis))
+        elif quoted is not None:
+            tokens.append(("TERM", " ".join(quoted.split())))
+        elif word in {"AND", "OR", "NOT"}:
+            tokens.append(("OP", word))
+        else:
+            tokens.append(("TERM", word))
+        position = match.end()
+    return tokens
+
+def parse_request(request: str, vocabulary: Vocabulary) -> Node:
+    """
+    Construit l'arbre d'une requête au format de to_request ou de get_simplified_request :
+    termes (entre guillemets s'ils contiennent des espaces), parenthèses et opérateurs NOT, AND, OR
+    (NOT est prioritaire sur AND, lui-même prioritaire sur OR). "a AND b AND c" devient ((a AND b) AND c).
+    :pre: vocabulary est le vocabulaire des nœuds créés
+    :return: L'arbre correspondant. ValueError si la requête est mal formée.
+    """
+    tokens = tokenize_request(request)
+    position = 0
+
+    def expect(kind: str, value: str=None) -> bool:
+        return position < len(tokens) and tokens[position][0] == kind and (value is None or tokens[position][1] == value)
+
+    def parse_binary(operator: str, parse_operand: Callable[[], Node]) -> Node:
+        nonlocal position
+        node = parse_operand()
+        while expect("OP", operator):
+            position += 1
+            node = Node(operator, [node, parse_operand()], vocabulary)
+        return node
+
+    def parse_or() -> Node:
+        return parse_binary("OR", parse_and)
+
+    def parse_and() -> Node:
+        return parse_binary("AND", parse_not)
+
+    def parse_not() -> Node:
+        nonlocal position
+        if expect("OP", "NOT"):
+            position += 1
+            return Node("NOT", [parse_not()], vocabulary)
+        if expect("("):
+            position += 1
+            node = parse_or()
+            if not expect(")"):
+                raise ValueError(f"Parenthèse fermante manquante dans {request!r}")
+            position += 1
+            return node
+        if expect("TERM"):
+            position += 1
+            return Node(tokens[position-1][1], [], vocabulary)
+        found = tokens[position][1] if position < len(tokens) else "la fin de la requête"
+        raise ValueError(f"Terme attendu à la place de {found!r} dans {request!r}")
+
+    node = parse_or()
+    if position < len(tokens):
+        raise ValueError(f"{tokens[position][1]!r} inattendu dans {request!r}")
+    return node
+
+def parse_request_tree(request: str, include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary) -> RequestTree:
+    """
+    :pre: request est de la forme "<inclusion> AND NOT <exclusion>" (ou OR NOT, la racine pouvant être altérée), voir parse_request
+    :return: La RequestTree correspondante, dont chaque moitié utilise son vocabulaire
+    """
+    node = parse_request(request, include_vocabulary)
+    if node.is_leaf() or node.value == "NOT" or node.children[1].value != "NOT":
+        raise ValueError(f"La requête doit être de la forme '<inclusion> AND NOT <exclusion>' : {request!r}")
+    exclude_tree = node.children[1].children[0]
+    for excluded_node in exclude_tree.get_all_nodes():
+        excluded_node.vocabulary = exclude_vocabulary
+    request_tree = RequestTree(node.children[0], exclude_tree)
+    request_tree.value = node.value
+    return request_tree
+
 def serialize(tree: Node) -> str:
     """ Crée une représentation "plate" de l'arbre, via un parcours préfixe
     :pre: tree est une Node valide
     :return: une représentation de l'arbre
     """
-    serialized_repr = f"{tree.value},{len(tree.children)}"
-    for child in tree.children:
-        serialized_repr += ","
-        serialized_repr += serialize(child)
-    return serialized_repr
+    parts = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        parts.append(f"{node.value},{len(node.children)}")
+        stack.extend(reversed(node.children))
+    return ",".join(parts)
 
 def unserialize(serialized_repr, vocabulary: Vocabulary) -> Node: 
     """
     :pre: serialized_repr est une sortie de serialize 
     :return: l'arbre qui a été donné à serialize 
     pour tout arbre X, on doit avoir que X == unserialize(serialize(X)). 
+    Les termes ne doivent pas contenir de virgule (voir tree_codec.py pour un format sans cette limite).
     """
-
-    def calc_size(tree: Node):
-        """ Calcule la taille de l'arbre """
-        if tree.is_leaf():
-            return 1
-        return 1 + sum([calc_size(c) for c in tree.children])
-    
     def unserialize_rec(serialized_tree, indice):
+        """ :return: le sous-arbre qui commence à indice et l'indice qui le suit """
         val = serialized_tree[indice] #0
         nb_childs = int(serialized_tree[indice+1]) #1 
         indice += 2
         
-        if nb_childs == 0: #feuille : noeud avec une liste vide
-            return Node(val,[], vocabulary)
-                
-        children = [] #noeud : noeud avec plusieurs enfants
-        
+        children = [] # une feuille est un noeud avec une liste vide
         for _ in range(nb_childs):
-            child = unserialize_rec(serialized_tree, indice)
-            # On avance de 2 fois la taille de l'enfant car pour chaque noeud et chaque feuille il y a un nombre d'enfants
-            indice += calc_size(child)*2
+            child, indice = unserialize_rec(serialized_tree, indice)
             children.append(child)
 
-        node = Node(val, children, vocabulary)
-        return node
+        return Node(val, children, vocabulary), indice
             
-    return unserialize_rec(serialized_repr.split(',') , 0)
+    return unserialize_rec(serialized_repr.split(',') , 0)[0]
+
+def canonical_form(node: Node):
+    """
+    Forme canonique d'un arbre : les AND/OR imbriqués sont aplatis, leurs opérandes
+    sont dédupliqués et triés, et les doubles négations sont supprimées.
+    Deux arbres logiquement identiques à la commutativité/associativité près ont la même forme.
+    :pre: node est une Node valide
+    :return: Un str (feuille) ou un tuple hashable
+    """
+    if node.is_leaf():
+        return node.value
+    if node.value == "NOT":
+        child = canonical_form(node.children[0])
+        if isinstance(child, tuple) and child[0] == "NOT":
+            return child[1]
+        return ("NOT", child)
+    operands = set()
+    stack = list(node.children)
+    while stack:
+        child = stack.pop()
+        if child.value == node.value and not child.is_leaf():
+            stack.extend(child.children)
+        else:
+            operands.add(canonical_form(child))
+    if len(operands) == 1:
+        return operands.pop()
+    return (node.value, tuple(sorted(operands, key=repr)))
 
 def to_sympy(node: Node):
     """
     :pre: -
     :return: L'expression sympy correspondant à l'arbre
     """
-    def to_sympy_rec(node: Node, symbols: dict[str, sp.Symbol]):
+    def to_sympy_rec(node: Node, symbols: "dict[str, sp.Symbol]"):
         """
         :pre: symbols est un dictionnaire de tous les termes de l'arbre et de leur équivalent en symboles sympy
         :return: L'expression sympy correspondant à l'arbre
@@ -372,12 +618,13 @@ def to_sympy(node: Node):
     sympy_expr = to_sympy_rec(node, symbols)
     return sympy_expr
 
-def sympy_to_request(expr: sp.Expr)->str:
+def sympy_to_request(expr: "sp.Expr")->str:
     """
     :pre: expr est une expression sympy
     :return: La requête correspondant à l'expression sympy
     """
-    def sympy_to_request_rec(expr: sp.Expr, symbols: dict[str, sp.Symbol]):
+    import sympy as sp
+    def sympy_to_request_rec(expr: "sp.Expr", symbols: "dict[str, sp.Symbol]"):
         """
         :pre: symbols est un dictionnaire de tous les termes de la requête et de leur équivalent en symboles sympy
         :return: La requête correspondant à l'expression sympy
@@ -395,12 +642,40 @@ def sympy_to_request(expr: sp.Expr)->str:
     symbols = {str(symbol).replace("_", " "): symbol for symbol in expr.free_symbols}
     return sympy_to_request_rec(expr, symbols)
 
-def generate_best_request_genetic_algorithm(score_function: Callable[[RequestTree], int], initial_request:RequestTree, nb_generations=100, population_size=100, nb_max_alterations_per_gen=5, nb_max_initial_alterations=10)->RequestTree:
+def generate_best_request_genetic_algorithm(score_function: Callable[[RequestTree], int], initial_request:RequestTree, nb_generations=100, population_size=100, nb_max_alterations_per_gen=5, nb_max_initial_alterations=10, batch_score_function: Callable[[list[RequestTree]], list[int]]=None, cache_size:int=None, cache_key_function: Callable[[RequestTree], object]=None, nb_workers=1, chunksize:int=None, verbose=True, nb_islands=1, migration_interval=10, crossover_proba=CROSSOVER_PROBA, migration: Callable[[int, list[RequestTree], list[int]], tuple[list[RequestTree], list[int]]]=None)->RequestTree:
     """
     Génère la meilleure requête possible en utilisant un algorithme génétique.
-    :pre: score_function est une fonction qui prend une requête en entrée et renvoie un score
+    :pre: score_function est une fonction qui prend une requête en entrée et renvoie un score.
+    batch_score_function, si elle est donnée, prend toute la population et renvoie la liste des scores (voir batch_eval.py) ;
+    elle remplace alors score_function.
+    cache_size, s'il est donné, est le nombre maximal de scores gardés en cache (voir score_cache.py). Par défaut le cache
+    est indexé par la forme canonique des requêtes, qui ne garde que leur sens logique : le score ne doit alors dépendre que
+    de ce sens. Un score qui dépend aussi de la taille ou de la structure d'une requête demande une cache_key_function
+    qui la garde (score_cache.canonical_form_and_size par exemple).
+    Si nb_workers > 1, les scores sont calculés par un pool de nb_workers processus, par paquets de chunksize requêtes
+    (voir parallel_score.py). Les fonctions de score doivent alors être définies au niveau d'un module.
+    Si verbose est False, rien n'est affiché : la durée de chaque phase de chaque génération et le meilleur score
+    sont enregistrés dans le registre de métriques (voir metrics.py), comme dans tous les cas.
+    Si nb_islands > 1, nb_islands populations de population_size requêtes évoluent chacune dans son processus et échangent
+    leurs meilleures requêtes toutes les migration_interval générations (voir islands.py) ; nb_workers est alors ignoré.
+    migration (optionnel) est appelée après le calcul des scores de chaque génération avec le numéro de la génération,
+    la population et ses scores, et renvoie la population et les scores à utiliser pour la sélection.
+    crossover_proba est la part des nouveaux individus de chaque génération obtenus en croisant deux des 10% meilleurs
+    (voir RequestTree.crossover), les autres étant des copies ; tous sont ensuite mutés.
     :return: La meilleure requête trouvée
     """
+    if nb_islands > 1:
+        from islands import run_islands
+        return run_islands(score_function, initial_request, nb_islands, nb_generations, population_size, migration_interval, batch_score_function=batch_score_function, cache_size=cache_size, cache_key_function=cache_key_function, nb_max_alterations_per_gen=nb_max_alterations_per_gen, nb_max_initial_alterations=nb_max_initial_alterations, crossover_proba=crossover_proba, verbose=verbose)
+    parallel_scorer = None
+    if nb_workers > 1:
+        from parallel_score import ParallelScorer
+        parallel_scorer = ParallelScorer(score_function, batch_score_function, initial_request.get_include_tree().vocabulary, initial_request.get_exclude_tree().vocabulary, nb_workers, chunksize)
+        score_function, batch_score_function = None, parallel_scorer
+    score_cache = None
+    if cache_size is not None:
+        from score_cache import ScoreCache
+        score_cache = ScoreCache(score_function, batch_score_function, maxsize=cache_size, key_function=cache_key_function or canonical_form)
 
     def generate_population(population_size, initial_request:RequestTree)->list[RequestTree]:
         population = [initial_request]
@@ -415,35 +690,75 @@ def generate_best_request_genetic_algorithm(score_function: Callable[[RequestTre
         request.alter_random_node()
         return request
     
+    def score_population(population: list[RequestTree])->list[int]:
+        if score_cache is not None:
+            return score_cache.score_population(population)
+        if batch_score_function is not None:
+            return batch_score_function(population)
+        return [score_function(request) for request in population]
+
     def disp_population(population: list[RequestTree]):
         # On affiche entièrement les 2 premières requêtes ainsi que le nombre de nœuds de toutes les autres
 
         ch = f"[{population[0].get_simplified_request()},{population[1].get_simplified_request()}"
         for i in range(2, len(population)):
-            ch += f",{len(population[i].get_all_nodes())}"
+            ch += f",{len(population[i])}"
         print(ch+"]")
 
-    ten_percent = population_size//10
-    population = generate_population(population_size, initial_request)
-    print(f"Initial population:")
-    disp_population(population)
-    for num_generation in range(nb_generations):
-        # On commence par trier la population en utilisant la fonction score
-        population.sort(key=score_function, reverse=True)
-        # Ensuite, on garde les 10% meilleurs
-        population = population[:ten_percent]
-        # On duplique les 10% meilleurs pour retrouver la taille initiale de la population
-        while len(population) < population_size:
-            population.append(population[random.randint(0, ten_percent-1)].copy())
-        # On génère des mutations sur les 90% précédemment créés
-        for i in range(ten_percent, population_size):
-            for _ in range(random.randint(0, nb_max_alterations_per_gen)):
-                population[i] = mutate(population[i])
-        print(f"Generation {num_generation+1}:")
-        disp_population(population)
-    
-    # On retourne la meilleure requête trouvée
-    return max(population, key=score_function)
+    try:
+        ten_percent = population_size//10
+        with REGISTRY.phase("ga.initial_population"):
+            population = generate_population(population_size, initial_request)
+        if verbose:
+            print(f"Initial population:")
+            disp_population(population)
+        for num_generation in range(nb_generations):
+            durations = {}
+            # On commence par trier la population en utilisant la fonction score
+            with REGISTRY.phase("ga.score", durations):
+                scores = score_population(population)
+            if migration is not None:
+                with REGISTRY.phase("ga.migrate", durations):
+                    population, scores = migration(num_generation, population, scores)
+            with REGISTRY.phase("ga.select", durations):
+                order = sorted(range(len(population)), key=scores.__getitem__, reverse=True)
+                population = [population[i] for i in order]
+                # Ensuite, on garde les 10% meilleurs
+                population = population[:ten_percent]
+                # On complète la population avec des enfants de deux des 10% meilleurs ou des copies de l'un d'eux
+                while len(population) < population_size:
+                    if ten_percent >= 2 and random.random() < crossover_proba:
+                        parent, other_parent = random.sample(range(ten_percent), 2)
+                        child, other_child = population[parent].copy(), population[other_parent].copy()
+                        child.crossover(other_child)
+                        population.append(child)
+                        if len(population) < population_size:
+                            population.append(other_child)
+                    else:
+                        population.append(population[random.randint(0, ten_percent-1)].copy())
+            # On génère des mutations sur les 90% précédemment créés
+            with REGISTRY.phase("ga.mutate", durations):
+                for i in range(ten_percent, population_size):
+                    for _ in range(random.randint(0, nb_max_alterations_per_gen)):
+                        population[i] = mutate(population[i])
+            if verbose:
+                with REGISTRY.phase("ga.display", durations):
+                    print(f"Generation {num_generation+1}:")
+                    disp_population(population)
+            REGISTRY.record_generation(num_generation+1, durations, best_score=scores[order[0]], population_size=population_size)
+
+        # On retourne la meilleure requête trouvée
+        with REGISTRY.phase("ga.score"):
+            scores = score_population(population)
+        if score_cache is not None:
+            REGISTRY.increment("score_cache_hits_total", score_cache.hits)
+            REGISTRY.increment("score_cache_misses_total", score_cache.misses)
+            if verbose:
+                print(f"Score cache: {score_cache}")
+        return population[max(range(len(population)), key=scores.__getitem__)]
+    finally:
+        if parallel_scorer is not None:
+            parallel_scorer.close()
 
 
 
@@ -452,8 +767,9 @@ def generate_best_request_genetic_algorithm(score_function: Callable[[RequestTre
 
 
 def run_tests():
-    initial_include_tree = Node("collaboration", [], INCLUDED_VOCABULARY)
-    initial_exclude_tree = Node("batman", [], EXCLUDED_VOCABULARY)
+    from colorama import Fore
+    initial_include_tree = Node("collaboration", [], get_vocabulary("INCLUDED_VOCABULARY"))
+    initial_exclude_tree = Node("batman", [], get_vocabulary("EXCLUDED_VOCABULARY"))
     request_tree = RequestTree(initial_include_tree, initial_exclude_tree)
 
     print(Fore.YELLOW+"\nInitial request:"+Fore.RESET)
@@ -467,6 +783,7 @@ def run_tests():
     print(request_tree.to_colored_request())
     print(repr(request_tree))
 
+    import sympy as sp
     sympy_tree = to_sympy(request_tree)
     print(f"Représentation sympy: {sympy_tree}")
     simplified_sympy = sp.to_cnf(sympy_tree, simplify=True, force=True)
@@ -0,0 +1,199 @@
+from vocabulary import Vocabulary
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+### BUDGET ###
+# Au-delà de cette taille (en nœuds), on ne fait que les simplifications linéaires
+MAX_NODES_FOR_ABSORPTION = 500
+# Travail maximal consacré aux simplifications quadratiques : une absorption sur n opérandes coûte n² étapes.
+# Un nombre d'étapes plutôt qu'une durée : la forme simplifiée (clé du cache de requêtes) ne dépend pas de la charge de la machine.
+# 250000 étapes prennent environ 50 ms (OR de 125 sous-requêtes AND)
+ABSORPTION_STEPS = 250000
+
+DUAL = {"AND": "OR", "OR": "AND"}
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class Budget:
+    """ Limite le travail des simplifications coûteuses """
+
+    def __init__(self, allow_absorption=True, absorption_steps=ABSORPTION_STEPS):
+        self.allow_absorption = allow_absorption
+        self.remaining_steps = absorption_steps
+
+    def can_absorb(self, nb_items: int) -> bool:
+        """
+        Décompte le coût d'une absorption sur nb_items opérandes. Une fois le budget épuisé, plus aucune absorption n'est faite.
+        :pre: nb_items est le nombre d'opérandes de l'opération à simplifier
+        :return: True si on peut encore faire cette simplification quadratique
+        """
+        self.remaining_steps -= nb_items * nb_items
+        if self.allow_absorption and self.remaining_steps < 0:
+            self.allow_absorption = False
+        return self.allow_absorption
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+# Une expression est soit un terme (str), soit ("NOT", terme), soit (opération, frozenset d'expressions),
+# soit une constante (True / False). Les NOT ne portent que sur des termes (forme normale négative).
+
+def negate_literal(expr):
+    """
+    :pre: expr est un littéral (un terme ou ("NOT", terme))
+    :return: La négation de expr
+    """
+    return expr[1] if isinstance(expr, tuple) else ("NOT", expr)
+
+def is_literal(expr) -> bool:
+    """
+    :pre: -
+    :return: True si expr est un terme ou la négation d'un terme
+    """
+    return isinstance(expr, str) or (isinstance(expr, tuple) and expr[0] == "NOT")
+
+def covers(wildcard: str, term: str) -> bool:
+    """
+    :pre: wildcard et term sont des str
+    :return: True si wildcard est un préfixe ("intera*") qui couvre term ("interaction")
+    """
+    return wildcard.endswith("*") and wildcard != term and " " not in term and term.lower().startswith(wildcard[:-1].lower())
+
+def remove_covered_terms(items: set, op: str):
+    """
+    Supprime les termes redondants à cause d'un préfixe : dans un OR, "intera*" rend "interaction" inutile,
+    dans un AND c'est "interaction" qui rend "intera*" inutile (et inversement pour les termes niés).
+    :pre: items est l'ensemble des opérandes d'une opération op
+    :return: None
+    """
+    positives = {item for item in items if isinstance(item, str)}
+    negatives = {item[1] for item in items if isinstance(item, tuple) and item[0] == "NOT"}
+    wildcards = [term for term in positives | negatives if term.endswith("*")]
+    if not wildcards:
+        return
+    for wildcard in wildcards:
+        # Dans un OR, le préfixe absorbe les termes positifs qu'il couvre ; dans un AND, les termes niés
+        absorbed, kept = (positives, negatives) if op == "OR" else (negatives, positives)
+        if wildcard in absorbed:
+            for term in [term for term in absorbed if covers(wildcard, term)]:
+                items.discard(term if absorbed is positives else ("NOT", term))
+                absorbed.discard(term)
+        if wildcard in kept and any(covers(wildcard, term) for term in kept):
+            items.discard(wildcard if kept is positives else ("NOT", wildcard))
+            kept.discard(wildcard)
+
+def absorb(items: set, op: str):
+    """
+    Absorption : A AND (A OR B) = A, et (A OR B) AND (A OR B OR C) = (A OR B) AND ... (idem en échangeant AND et OR).
+    :pre: items est l'ensemble des opérandes d'une opération op
+    :return: None
+    """
+    dual = DUAL[op]
+    compounds = [item for item in items if isinstance(item, tuple) and item[0] == dual]
+    if not compounds:
+        return
+    others = items.difference(compounds)
+    # Une sous-opération qui contient un opérande de l'opération courante est absorbée
+    compounds = [compound for compound in compounds if others.isdisjoint(compound[1])]
+    # Une sous-opération qui contient tous les opérandes d'une autre est absorbée
+    compounds.sort(key=lambda compound: len(compound[1]))
+    kept = []
+    for compound in compounds:
+        if not any(smaller[1] <= compound[1] for smaller in kept):
+            kept.append(compound)
+    items.intersection_update(others.union(kept))
+
+def make_operation(op: str, operands: list, budget: Budget):
+    """
+    Construit une opération simplifiée (aplatissement, idempotence, complémentaires, constantes, absorption).
+    :pre: op vaut "AND" ou "OR". operands est une liste d'expressions déjà simplifiées.
+    :return: L'expression simplifiée
+    """
+    absorbing = op == "OR"      # x AND False = False, x OR True = True
+    items = set()
+    for operand in operands:
+        if operand is absorbing:
+            return absorbing
+        if operand is (not absorbing):
+            continue
+        if isinstance(operand, tuple) and operand[0] == op:
+            items.update(operand[1])
+        else:
+            items.add(operand)
+    # Complémentaires : x AND NOT x = False, x OR NOT x = True
+    for item in items:
+        if is_literal(item) and negate_literal(item) in items:
+            return absorbing
+    remove_covered_terms(items, op)
+    if budget.can_absorb(len(items)):
+        absorb(items, op)
+    if not items:
+        return not absorbing
+    if len(items) == 1:
+        return items.pop()
+    return (op, frozenset(items))
+
+def simplify_node(node, budget: Budget, negate=False):
+    """
+    :pre: node est une Node valide
+    :return: L'expression simplifiée correspondant à node (ou à sa négation si negate)
+    """
+    if node.is_leaf():
+        return ("NOT", node.value) if negate else node.value
+    if node.value == "NOT":
+        return simplify_node(node.children[0], budget, not negate)
+    op = DUAL[node.value] if negate else node.value
+    return make_operation(op, [simplify_node(child, budget, negate) for child in node.children], budget)
+
+def simplify(node, max_nodes=MAX_NODES_FOR_ABSORPTION, absorption_steps=ABSORPTION_STEPS):
+    """
+    Simplifie un arbre booléen sans sympy. Les simplifications linéaires (aplatissement, idempotence,
+    complémentaires, préfixes) sont toujours appliquées ; l'absorption, quadratique, ne l'est que
+    si l'arbre a au plus max_nodes nœuds et tant que absorption_steps étapes ne sont pas écoulées.
+    Le résultat ne dépend que de node (pas du temps de calcul).
+    :pre: node est une Node valide
+    :return: L'expression simplifiée
+    """
+    budget = Budget(len(node) <= max_nodes, absorption_steps)
+    expr = simplify_node(node, budget)
+    # Simplifications dont l'absorption a été sautée (arbre trop grand ou budget d'étapes épuisé)
+    if not budget.allow_absorption:
+        REGISTRY.increment("simplifications_without_absorption_total")
+    return expr
+
+def to_request(expr) -> str:
+    """
+    :pre: expr est une sortie de simplify
+    :return: La requête correspondante, au format de sympy_to_request.
+    ValueError si expr est une constante : aucune requête de termes n'est toujours vraie ou toujours fausse.
+    """
+    if isinstance(expr, bool):
+        raise ValueError(f"Requête toujours {'vraie' if expr else 'fausse'} : pas de requête de termes équivalente")
+    if isinstance(expr, str):
+        return expr if Vocabulary.is_word(expr) else '"' + expr + '"'
+    if expr[0] == "NOT":
+        return f"NOT {to_request(expr[1])}"
+    return "(" + f" {expr[0]} ".join(sorted(to_request(operand) for operand in expr[1])) + ")"
+
+def simplify_request(node) -> str:
+    """
+    :pre: node est une Node valide (ou un RequestTree, un FlatTree)
+    :return: La requête simplifiée. Une requête toujours vraie ou toujours fausse (x AND NOT x)
+    n'a pas de forme simplifiée : elle est renvoyée telle quelle.
+    """
+    expr = simplify(node)
+    if isinstance(expr, bool):
+        return node.to_request()
+    return to_request(expr)
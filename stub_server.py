@@ -0,0 +1,182 @@
+"""
+Serveur HTTP local qui imite la recherche ACM (pages de benchmarks/fixtures), pour tester la récolte sans interroger dl.acm.org :
+
+    python stub_server.py [--port 8765]        puis, dans un autre terminal : python main.py harvest --base-url http://127.0.0.1:8765
+    python stub_server.py --check              vérifie les nouveaux essais de AsyncHarvester (429, 503, Retry-After)
+"""
+import argparse
+import asyncio
+import glob
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from harvester import AsyncHarvester
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+DESCRIPTION = "Serveur local qui imite la recherche ACM, et vérification des nouveaux essais du harvester."
+PORT = 8765
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures")
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class StubServer:
+    """
+    Serveur HTTP dans un thread : chaque GET renvoie une page de résultats de benchmarks/fixtures
+    (choisie par le paramètre startPage), après les erreurs prévues pour son chemin.
+    """
+
+    def __init__(self, port=0, failures: dict[str, list[tuple[int, str]]]=None):
+        """
+        :pre: port est le port d'écoute (0 : un port libre). failures associe un chemin ("/action/doSearch")
+        à la liste des réponses d'erreur (code HTTP, Retry-After ou None) à renvoyer avant la page.
+        """
+        self.failures = {path: list(responses) for path, responses in (failures or {}).items()}
+        self.requests: list[tuple[float, str, int]] = []     # (instant, chemin, code HTTP) de chaque requête reçue
+        self.lock = threading.Lock()
+        self.pages = []
+        for path in sorted(glob.glob(os.path.join(FIXTURES_DIRECTORY, "*.html"))):
+            with open(path, "r", encoding="utf-8") as file:
+                self.pages.append(file.read().encode("utf-8"))
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.thread = None
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                with stub.lock:
+                    failures = stub.failures.get(path)
+                    status, retry_after = failures.pop(0) if failures else (200, None)
+                    stub.requests.append((time.monotonic(), path, status))
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", retry_after)
+                if status != 200:
+                    self.end_headers()
+                    return
+                start_page = next((int(value) for key, _, value in (parameter.partition("=") for parameter in query.split("&")) if key == "startPage"), 0)
+                body = stub.pages[start_page % len(stub.pages)]
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def get_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def check_retries():
+    """
+    Vérifie les nouveaux essais de AsyncHarvester.fetch contre le serveur local :
+    1) après un 429 avec Retry-After puis un 503, la page est obtenue au 3e essai, Retry-After étant respecté,
+    2) pendant l'attente d'une requête refusée, le sémaphore est libéré : une autre requête passe,
+    3) quand tous les essais échouent, l'erreur HTTP est levée.
+    :return: None (AssertionError si une vérification échoue)
+    """
+    with StubServer(failures={"/retry": [(429, "1"), (503, None)]}) as stub:
+        harvester = AsyncHarvester(requests_per_second=100, burst=10, backoff_base=0.05, base_url=stub.get_url())
+        page_content = harvester.run(harvester.fetch(stub.get_url() + "/retry"))
+        harvester.close()
+        times = [instant for instant, _, _ in stub.requests]
+        assert [status for _, _, status in stub.requests] == [429, 503, 200], stub.requests
+        assert times[1] - times[0] >= 1.0, "Retry-After non respecté"
+        assert page_content.encode("utf-8") == stub.pages[0]
+    print("429 + Retry-After puis 503 : page obtenue au 3e essai")
+
+    with StubServer(failures={"/slow": [(429, "1")]}) as stub:
+        harvester = AsyncHarvester(requests_per_second=100, burst=10, max_concurrency=1, base_url=stub.get_url())
+
+        async def fetch_both():
+            slow = asyncio.ensure_future(harvester.fetch(stub.get_url() + "/slow"))
+            # La requête refusée part la première et occupe le seul emplacement du sémaphore
+            await asyncio.sleep(0.2)
+            await harvester.fetch(stub.get_url() + "/fast")
+            await slow
+        harvester.run(fetch_both())
+        harvester.close()
+        order = [(path, status) for _, path, status in stub.requests]
+        assert order == [("/slow", 429), ("/fast", 200), ("/slow", 200)], order
+    print("Attente d'un nouvel essai : le sémaphore est libéré")
+
+    with StubServer(failures={"/down": [(503, None)] * 3}) as stub:
+        harvester = AsyncHarvester(requests_per_second=100, burst=10, max_retries=1, backoff_base=0.05, base_url=stub.get_url())
+        try:
+            harvester.run(harvester.fetch(stub.get_url() + "/down"))
+        except requests.HTTPError as error:
+            assert error.response.status_code == 503
+        else:
+            raise AssertionError("Aucune erreur après le dernier essai")
+        finally:
+            harvester.close()
+        assert len(stub.requests) == 2, stub.requests
+    print("Tous les essais échouent : HTTPError levée")
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--port", type=int, default=PORT, help="port d'écoute du serveur")
+    parser.add_argument("--check", action="store_true", help="vérifier les nouveaux essais du harvester puis quitter")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    return parser
+
+def run(args: argparse.Namespace):
+    if args.check:
+        check_retries()
+        return
+    with StubServer(args.port) as stub:
+        print(f"Serveur sur {stub.get_url()} (Ctrl+C pour l'arrêter)")
+        try:
+            stub.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+def main(argv=None):
+    run(build_parser().parse_args(argv))
+
+
+
+################################### MAIN ###################################
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import json
+import math
+import os
+from typing import Callable
+from corpus_index import CorpusIndex
+from semantic_tree import canonical_form, parse_request
+from vocabulary import Vocabulary
+from metrics import REGISTRY
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+CALIBRATION_PATH = "surrogate_calibration.json"
+# Ordre de grandeur du nombre de documents de la bibliothèque ACM : pente et ordonnée avant toute calibration
+DEFAULT_LIBRARY_SIZE = 3_000_000
+# Nombre de requêtes envoyées au vrai site à chaque génération
+TOP_K = 5
+# Nombre minimal d'observations (d'abscisses distinctes) pour ajuster aussi la pente
+MIN_OBSERVATIONS_FOR_SLOPE = 3
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class HitCountEstimator:
+    """
+    Estimateur (modèle de substitution) du nombre de résultats ACM d'une requête à partir du corpus local :
+        log(1 + nb_résultats_ACM) = intercept + slope * log(p)
+    où p est la proportion de documents du corpus local qui satisfont la requête. Si aucun ne la satisfait,
+    p est lissé par la probabilité calculée à partir des fréquences des termes en les supposant indépendants.
+    La droite est ajustée (moindres carrés) sur les nombres de résultats réels déjà observés.
+    """
+
+    def __init__(self, index: CorpusIndex, library_size=DEFAULT_LIBRARY_SIZE):
+        """
+        :pre: index est l'index du corpus local, non vide
+        """
+        self.index = index
+        self.intercept = math.log(library_size)
+        self.slope = 1.0
+        self.observations: list[tuple[str, int]] = []
+        self.features: list[float] = []
+
+    ### ESTIMATION ###
+
+    def get_independent_probability(self, node) -> float:
+        """
+        :pre: node est une Node valide
+        :return: La proportion de documents qui satisferaient node si ses termes étaient indépendants (lissée, jamais nulle)
+        """
+        if node.is_leaf():
+            return (self.index.get_term_bitmap(node.value).bit_count() + 0.5) / (len(self.index) + 1)
+        if node.value == "NOT":
+            return 1.0 - self.get_independent_probability(node.children[0])
+        a = self.get_independent_probability(node.children[0])
+        b = self.get_independent_probability(node.children[1])
+        return a * b if node.value == "AND" else a + b - a * b
+
+    def get_feature(self, node) -> float:
+        """
+        :pre: node est une Node valide
+        :return: Le log de la proportion (lissée) de documents du corpus local qui satisfont node
+        """
+        count = self.index.count(node)
+        if count > 0:
+            return math.log(count / len(self.index))
+        # Moins d'un document : la probabilité sous indépendance donne la fraction de document manquante
+        return math.log(max(self.get_independent_probability(node), 1e-12) / (len(self.index) + 1))
+
+    def estimate(self, node) -> float:
+        """
+        :pre: node est une Node valide
+        :return: Le nombre de résultats ACM estimé (>= 0)
+        """
+        return max(0.0, math.exp(self.intercept + self.slope * self.get_feature(node)) - 1)
+
+    def estimate_population(self, trees: list) -> list[float]:
+        REGISTRY.increment("surrogate_estimates_total", len(trees))
+        return [self.estimate(tree) for tree in trees]
+
+    ### CALIBRATION ###
+
+    def add_observation(self, node, nb_results: int):
+        """
+        Ajoute un nombre de résultats réel (sans réajuster : voir fit)
+        :pre: node est une Node valide, nb_results >= 0
+        :return: None
+        """
+        feature = self.get_feature(node)
+        # Erreur de l'estimation faite avant de connaître le nombre réel
+        REGISTRY.observe("surrogate_log_error", abs(self.intercept + self.slope * feature - math.log1p(nb_results)))
+        self.observations.append((node.to_request(), nb_results))
+        self.features.append(feature)
+
+    def fit(self):
+        """
+        Ajuste la droite sur les observations : l'ordonnée seule tant qu'il y en a moins de MIN_OBSERVATIONS_FOR_SLOPE
+        :pre: -
+        :return: None
+        """
+        if not self.observations:
+            return
+        xs = self.features
+        ys = [math.log1p(nb_results) for _, nb_results in self.observations]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if len(set(xs)) >= MIN_OBSERVATIONS_FOR_SLOPE and variance > 0:
+            self.slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+        self.intercept = mean_y - self.slope * mean_x
+
+    def get_error(self) -> float:
+        """
+        :pre: -
+        :return: L'erreur moyenne en log (|log(1+estimé) - log(1+réel)|) sur les observations, 0 s'il n'y en a pas
+        """
+        if not self.observations:
+            return 0.0
+        errors = [abs(self.intercept + self.slope * x - math.log1p(nb_results)) for x, (_, nb_results) in zip(self.features, self.observations)]
+        return sum(errors) / len(errors)
+
+    ### SAUVEGARDE ###
+
+    def save(self, path=CALIBRATION_PATH):
+        """
+        Enregistre les observations (requête, nombre de résultats réel) en JSON
+        :return: None
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"observations": self.observations}, file, indent=1)
+
+    def load(self, path=CALIBRATION_PATH):
+        """
+        Ajoute les observations d'un fichier écrit par save (s'il existe) et réajuste la droite
+        :return: None
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as file:
+            observations = json.load(file)["observations"]
+        # Le vocabulaire ne sert qu'aux altérations : les requêtes sont seulement évaluées sur l'index
+        vocabulary = Vocabulary()
+        for request, nb_results in observations:
+            self.add_observation(parse_request(request, vocabulary), nb_results)
+        self.fit()
+
+
+class MultiFidelityScorer:
+    """
+    Fonction de score par lot (batch_score_function de generate_best_request_genetic_algorithm) à deux niveaux :
+    toute la population est évaluée par l'estimateur, puis seules les top_k meilleures requêtes (selon l'estimation)
+    jamais vues sont envoyées à live_count_function. Les nombres réels servent au score de ces requêtes et à recalibrer l'estimateur.
+    Ne pas l'utiliser avec cache_size : les scores estimés resteraient en cache alors qu'ils changent à chaque calibration.
+    """
+
+    def __init__(self, estimator: HitCountEstimator, live_count_function: Callable[[list], list[int]], score_from_count: Callable[[object, float], float], top_k=TOP_K):
+        """
+        :pre: live_count_function prend une liste d'arbres et renvoie leurs nombres de résultats réels.
+        score_from_count prend un arbre et son nombre de résultats (réel ou estimé) et renvoie un score.
+        """
+        self.estimator = estimator
+        self.live_count_function = live_count_function
+        self.score_from_count = score_from_count
+        self.top_k = top_k
+        self.live_counts = {}       # forme canonique -> nombre de résultats réel
+        self.nb_live_queries = 0
+        self.nb_estimates = 0
+
+    def score_population(self, population: list) -> list[float]:
+        """
+        :pre: population est une liste de RequestTree valides
+        :return: La liste des scores, dans l'ordre de population
+        """
+        keys = [canonical_form(tree) for tree in population]
+        counts = [self.live_counts.get(key) for key in keys]
+        unknown = [i for i, count in enumerate(counts) if count is None]
+        estimates = dict(zip(unknown, self.estimator.estimate_population([population[i] for i in unknown])))
+        self.nb_estimates += len(unknown)
+
+        # Les top_k requêtes inconnues (et distinctes) les plus prometteuses sont évaluées sur le vrai site
+        candidates = {}
+        for i in sorted(unknown, key=lambda i: self.score_from_count(population[i], estimates[i]), reverse=True):
+            candidates.setdefault(keys[i], i)
+            if len(candidates) == self.top_k:
+                break
+        if candidates:
+            live_counts = self.live_count_function([population[i] for i in candidates.values()])
+            for (key, i), count in zip(candidates.items(), live_counts):
+                self.live_counts[key] = count
+                self.estimator.add_observation(population[i], count)
+            self.estimator.fit()
+            self.nb_live_queries += len(candidates)
+            REGISTRY.increment("surrogate_live_queries_total", len(candidates))
+
+        scores = []
+        for i, (tree, key) in enumerate(zip(population, keys)):
+            count = self.live_counts.get(key)
+            scores.append(self.score_from_count(tree, count if count is not None else estimates[i]))
+        return scores
+
+    def __call__(self, population: list) -> list[float]:
+        return self.score_population(population)
+
+    def __repr__(self):
+        return f"MultiFidelityScorer(live_queries={self.nb_live_queries}, estimates={self.nb_estimates}, log_error={self.estimator.get_error():.2f})"
+
+
+class LiveCounter:
+    """ Nombre de résultats réels de requêtes, récupérés en parallèle par un AsyncHarvester (live_count_function de MultiFidelityScorer) """
+
+    def __init__(self, harvester, **url_params):
+        """
+        :pre: harvester est un AsyncHarvester, url_params les autres paramètres de construct_ACM_url (dates, filtres)
+        """
+        self.harvester = harvester
+        self.url_params = url_params
+
+    def __call__(self, trees: list) -> list[int]:
+        requetes = [tree.get_simplified_request() for tree in trees]
+        pages = self.harvester.run(self.harvester.count_results(requetes, **self.url_params))
+        # nb_results vaut -1 quand la page n'affiche pas de nombre de résultats (aucun résultat)
+        return [max(0, page['nb_results']) for page in pages]
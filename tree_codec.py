@@ -0,0 +1,239 @@
+from vocabulary import Vocabulary
+from semantic_tree import Node, RequestTree
+
+
+
+#################################### CONSTANTES ####################################
+
+
+
+# Format binaire (tous les entiers sont des varints LEB128) :
+#   en-tête    : MAGIC, VERSION, type de contenu (KIND_*)
+#   termes     : nombre de termes, puis pour chacun sa longueur en octets et son texte UTF-8
+#   contenu    : KIND_NODE       -> un arbre
+#                KIND_REQUEST    -> un RequestTree
+#                KIND_POPULATION -> nombre de RequestTree, puis chacun d'eux
+#   arbre      : nombre de nœuds, puis un code par nœud en parcours préfixe
+#   RequestTree: code de la racine, moitié incluse, moitié exclue (le NOT est implicite)
+# Un code vaut 0, 1 ou 2 pour AND, OR, NOT et 3 + i pour le terme i de la table.
+MAGIC = b"ST"
+VERSION = 1
+
+KIND_NODE = 0
+KIND_REQUEST = 1
+KIND_POPULATION = 2
+
+OPERATOR_CODES = {"AND": 0, "OR": 1, "NOT": 2}
+OPERATORS = ["AND", "OR", "NOT"]
+ARITY = [2, 2, 1]
+FIRST_TERM_CODE = len(OPERATORS)
+
+
+
+#################################### CLASSES ####################################
+
+
+
+class Encoder:
+    """ Écrit des arbres dans un buffer, avec une table de termes commune """
+
+    def __init__(self):
+        self.terms: list[str] = []
+        self.term_codes: dict[str, int] = {}
+        self.body = bytearray()
+
+    def write_tree(self, tree: Node):
+        """
+        :pre: tree est une Node valide (ou une vue FlatNode)
+        :return: None
+        """
+        codes = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            children = node.children
+            if children:
+                codes.append(OPERATOR_CODES[node.value])
+                stack.extend(reversed(children))
+            else:
+                code = self.term_codes.get(node.value)
+                if code is None:
+                    code = FIRST_TERM_CODE + len(self.terms)
+                    self.terms.append(node.value)
+                    self.term_codes[node.value] = code
+                codes.append(code)
+        write_varint(self.body, len(codes))
+        for code in codes:
+            write_varint(self.body, code)
+
+    def write_request(self, request: RequestTree):
+        """
+        :pre: request est un RequestTree valide (ou un FlatRequestTree)
+        :return: None
+        """
+        write_varint(self.body, OPERATOR_CODES[request.value])
+        self.write_tree(request.get_include_tree())
+        self.write_tree(request.get_exclude_tree())
+
+    def get_bytes(self, kind: int) -> bytes:
+        """
+        :pre: kind est l'un des KIND_*
+        :return: Le buffer complet (en-tête, table des termes, arbres)
+        """
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        out.append(kind)
+        write_varint(out, len(self.terms))
+        for term in self.terms:
+            encoded = term.encode("utf-8")
+            write_varint(out, len(encoded))
+            out += encoded
+        out += self.body
+        return bytes(out)
+
+
+class Decoder:
+    """ Relit un buffer produit par Encoder """
+
+    def __init__(self, data: bytes):
+        """
+        :pre: data est une sortie de dumps ou dumps_population
+        """
+        if data[:2] != MAGIC or data[2] != VERSION:
+            raise ValueError("Format de données inconnu")
+        self.data = data
+        self.kind = data[3]
+        self.pos = 4
+        nb_terms = self.read_varint()
+        self.terms = []
+        for _ in range(nb_terms):
+            length = self.read_varint()
+            self.terms.append(data[self.pos:self.pos+length].decode("utf-8"))
+            self.pos += length
+
+    def read_varint(self) -> int:
+        value, self.pos = read_varint(self.data, self.pos)
+        return value
+
+    def read_tree(self, vocabulary: Vocabulary) -> Node:
+        """
+        Reconstruit un arbre en temps linéaire : on parcourt les codes à l'envers,
+        chaque opération récupère ses enfants sur une pile.
+        :pre: la position courante est le début d'un arbre
+        :return: L'arbre lu
+        """
+        nb_nodes = self.read_varint()
+        codes = [self.read_varint() for _ in range(nb_nodes)]
+        terms = self.terms
+        stack = []
+        for code in reversed(codes):
+            if code >= FIRST_TERM_CODE:
+                stack.append(Node(terms[code - FIRST_TERM_CODE], [], vocabulary))
+            else:
+                children = [stack.pop() for _ in range(ARITY[code])]
+                stack.append(Node(OPERATORS[code], children, vocabulary))
+        return stack.pop()
+
+    def read_request(self, include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary) -> RequestTree:
+        """
+        :pre: la position courante est le début d'un RequestTree
+        :return: Le RequestTree lu
+        """
+        root_value = OPERATORS[self.read_varint()]
+        include = self.read_tree(include_vocabulary)
+        exclude = self.read_tree(exclude_vocabulary)
+        request = RequestTree(include, exclude)
+        request.value = root_value
+        return request
+
+
+
+#################################### FUNCTIONS ####################################
+
+
+
+def write_varint(out: bytearray, value: int):
+    """
+    :pre: value est un int >= 0
+    :return: None
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """
+    :pre: data[pos:] commence par un varint
+    :return: La valeur lue et la position qui suit
+    """
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def dumps(tree: Node) -> bytes:
+    """
+    :pre: tree est une Node ou un RequestTree valide
+    :return: La représentation binaire de l'arbre
+    """
+    encoder = Encoder()
+    if hasattr(tree, "get_exclude_tree"):
+        encoder.write_request(tree)
+        return encoder.get_bytes(KIND_REQUEST)
+    encoder.write_tree(tree)
+    return encoder.get_bytes(KIND_NODE)
+
+def loads(data: bytes, vocabulary: Vocabulary, exclude_vocabulary: Vocabulary=None) -> Node:
+    """
+    :pre: data est une sortie de dumps. Pour un RequestTree, vocabulary est le vocabulaire de la moitié incluse
+    et exclude_vocabulary celui de la moitié exclue.
+    :return: L'arbre donné à dumps
+    """
+    decoder = Decoder(data)
+    if decoder.kind == KIND_REQUEST:
+        return decoder.read_request(vocabulary, exclude_vocabulary or vocabulary)
+    if decoder.kind != KIND_NODE:
+        raise ValueError("Les données ne contiennent pas un arbre unique")
+    return decoder.read_tree(vocabulary)
+
+def dumps_population(population: list[RequestTree]) -> bytes:
+    """
+    :pre: population est une liste de RequestTree valides
+    :return: La représentation binaire de toute la population, avec une seule table de termes
+    """
+    encoder = Encoder()
+    write_varint(encoder.body, len(population))
+    for request in population:
+        encoder.write_request(request)
+    return encoder.get_bytes(KIND_POPULATION)
+
+def loads_population(data: bytes, include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary) -> list[RequestTree]:
+    """
+    :pre: data est une sortie de dumps_population
+    :return: La population donnée à dumps_population
+    """
+    decoder = Decoder(data)
+    if decoder.kind != KIND_POPULATION:
+        raise ValueError("Les données ne contiennent pas une population")
+    return [decoder.read_request(include_vocabulary, exclude_vocabulary) for _ in range(decoder.read_varint())]
+
+def save_population(population: list[RequestTree], path: str):
+    """
+    :pre: path est un chemin de fichier
+    :return: None
+    """
+    with open(path, "wb") as file:
+        file.write(dumps_population(population))
+
+def load_population(path: str, include_vocabulary: Vocabulary, exclude_vocabulary: Vocabulary) -> list[RequestTree]:
+    """
+    :pre: path est un fichier écrit par save_population
+    :return: La population enregistrée
+    """
+    with open(path, "rb") as file:
+        return loads_population(file.read(), include_vocabulary, exclude_vocabulary)
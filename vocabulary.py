@@ -1,13 +1,43 @@
 import json
+import random
+import sys
 
 class Vocabulary:
     def __init__(self, content: dict[str, list[str]]={}):
         """
         :pre: words est un dictionnaire. Chaque élément contient une catégorie et une liste de mots similaires. Chaque liste contient le nom de la catégorie.
+        content ne doit plus être modifié ensuite (les index sont calculés ici).
         """
         self.content = content
         self.n_words = sum(len(content[category]) for category in content.keys())
         assert self.is_valid()
+        self.build_index()
+
+    def build_index(self):
+        """
+        Précalcule les structures qui rendent les recherches et les tirages en O(1) :
+        - words : les mots distincts (internés), word_indices : mot -> position dans words
+        - categories : mot -> catégorie (la première qui le contient)
+        - grouped_words : les mots rangés catégorie par catégorie, category_slices : catégorie -> (début, fin)
+        :pre: -
+        :return: None
+        """
+        words, grouped_words = [], []
+        self.word_indices: dict[str, int] = {}
+        self.categories: dict[str, str] = {}
+        self.category_slices: dict[str, tuple[int, int]] = {}
+        for category, category_words in self.content.items():
+            start = len(grouped_words)
+            for word in dict.fromkeys(category_words):
+                word = sys.intern(word)
+                grouped_words.append(word)
+                if word not in self.word_indices:
+                    self.word_indices[word] = len(words)
+                    self.categories[word] = category
+                    words.append(word)
+            self.category_slices[category] = (start, len(grouped_words))
+        self.words: tuple[str] = tuple(words)
+        self.grouped_words: tuple[str] = tuple(grouped_words)
 
     def is_valid(self):
         """
@@ -27,19 +57,16 @@ class Vocabulary:
     def get_words(self)->list[str]:
         """
         :pre: -
-        :return: La liste de tous les mots du vocabulaire.
+        :return: La liste de tous les mots (distincts) du vocabulaire.
         """
-        return [word for words in self.content.values() for word in words]
+        return list(self.words)
     
     def get_categorie(self, word:str)->str:
         """
         :pre: word est un str.
         :return: La catégorie du mot word.
         """
-        for category, words in self.content.items():
-            if word in words:
-                return category
-        return None
+        return self.categories.get(word)
     
     def get_similar_words(self, word:str, log=False)->list[str]:
         """
@@ -49,13 +76,36 @@ class Vocabulary:
         if log:
             print("word", word)
             print("content", self.content)
-        for words in self.content.values():
-            if word in words:
-                if log:
-                    print("words", words)
-                    print("Type", type(words))
-                return words
+        category = self.categories.get(word)
+        if category is not None:
+            if log:
+                print("words", self.content[category])
+            return self.content[category]
         Exception(f"Il n'y a pas de mot similaire à '{word}' dans le vocabulaire.")
+
+    def sample_other(self, word:str)->str:
+        """
+        Tire uniformément un mot du vocabulaire différent de word, en O(1).
+        :pre: le vocabulaire contient au moins un mot différent de word.
+        :return: Un mot aléatoire différent de word.
+        """
+        index = self.word_indices.get(word)
+        if index is None:
+            return random.choice(self.words)
+        other = random.randrange(len(self.words) - 1)
+        return self.words[other + 1 if other >= index else other]
+
+    def sample_synonym(self, word:str)->str:
+        """
+        Tire uniformément un mot de la catégorie de word (word lui-même compris), en O(1).
+        :pre: word appartient au vocabulaire.
+        :return: Un mot similaire à word.
+        """
+        category = self.categories.get(word)
+        if category is None:
+            raise ValueError(f"Il n'y a pas de mot similaire à '{word}' dans le vocabulaire.")
+        start, stop = self.category_slices[category]
+        return self.grouped_words[random.randrange(start, stop)]
     
     def save(self, path: str):
         """